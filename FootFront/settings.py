@@ -49,11 +49,12 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
+    'utils.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'utils.middleware.PanelMessagesMiddleware',
     'store.middleware.BlockedUserMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -71,6 +72,7 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
                 'utils.context_processors.panel_messages_processor',
+                'utils.context_processors.catalog_page_csrf',
             ],
         },
     },
@@ -97,6 +99,37 @@ DATABASES = {
 }
 
 
+# Cache
+# Shared Redis cache when REDIS_URL is set (required for page cache invalidation across instances),
+# otherwise a per-process in-memory cache for local development.
+
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ.get('REDIS_URL'),
+            'KEY_PREFIX': 'footfront',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'footfront',
+        }
+    }
+
+# Sessions
+# Any of utils.sessions.db, utils.sessions.cache_db or utils.sessions.signed_cookies (see
+# utils/sessions). cache_db needs the shared Redis cache, so it is only the default with one.
+SESSION_ENGINE = os.environ.get(
+    'SESSION_ENGINE',
+    'utils.sessions.cache_db' if os.environ.get('REDIS_URL') else 'utils.sessions.db',
+)
+# cache_db writes a session to the database at most this often
+SESSION_WRITE_BEHIND_SECONDS = int(os.environ.get('SESSION_WRITE_BEHIND_SECONDS', 60))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -169,6 +202,12 @@ else:
 
 # Firebase Admin SDK configuration
 FIREBASE_ADMIN_CONFIG = os.path.join(BASE_DIR, 'firebase-config.json')
+# ID tokens are checked against this project; defaults to the service account's project
+FIREBASE_PROJECT_ID = os.environ.get('FIREBASE_PROJECT_ID')
+# Google's token signing keys; point at a local key server in tests
+FIREBASE_CERTS_URL = os.environ.get('FIREBASE_CERTS_URL', 'https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com')
+# Fetch the signing keys at startup instead of on the first login
+FIREBASE_PREFETCH_KEYS = os.environ.get('FIREBASE_PREFETCH_KEYS', 'False') == 'True'
 
 # Email Configuration
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
@@ -179,6 +218,11 @@ EMAIL_HOST_USER = os.environ.get('EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD')
 DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', EMAIL_HOST_USER)
 
+# Razorpay
+RAZORPAY_KEY_ID = os.environ.get('RAZORPAY_KEY_ID')
+RAZORPAY_KEY_SECRET = os.environ.get('RAZORPAY_KEY_SECRET')
+RAZORPAY_WEBHOOK_SECRET = os.environ.get('RAZORPAY_WEBHOOK_SECRET', '')
+
 # Debug Email Configuration (Safe to keep in dev)
 # if DEBUG:
     # print(f"DEBUG: Email Config Loaded? User: {'YES' if EMAIL_HOST_USER else 'NO'}, Password: {'YES' if EMAIL_HOST_PASSWORD else 'NO'}")
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Cart, CartItem, Wishlist, Order, OrderItem, Shipment, Payment, TransferLog
+from .models import Cart, CartItem, Wishlist, Order, OrderItem, Shipment, Payment, PaymentEvent, TransferLog
 
 # Register your models here.
 admin.site.register(Cart)
@@ -9,4 +9,5 @@ admin.site.register(Order)
 admin.site.register(OrderItem)
 admin.site.register(Shipment)
 admin.site.register(Payment)
+admin.site.register(PaymentEvent)
 admin.site.register(TransferLog)
@@ -0,0 +1,112 @@
+"""
+Guest cart: anonymous visitors build their bag in a signed cookie ("12:2,31:1", variant id and
+quantity pairs) so browsing never writes to the database. On login or registration the cookie
+is folded into the customer's Cart with one bulk upsert and cleared.
+"""
+from django.core import signing
+from django.db import transaction
+
+from store.models import ProductVariant
+from .models import CartItem
+from .operations import add_cart_lines, get_active_cart_id
+from .summary import invalidate_cart_summary, summarize_lines, summary_line
+
+GUEST_CART_COOKIE = 'guest_cart'
+GUEST_CART_SALT = 'cart.guest'
+GUEST_CART_MAX_AGE = 60 * 60 * 24 * 30
+# Keeps the cookie far below the 4KB browser limit
+MAX_GUEST_LINES = 50
+
+
+def _decode(value):
+    lines = {}
+    for pair in value.split(','):
+        variant_id, _, quantity = pair.partition(':')
+        if variant_id.isdigit() and quantity.isdigit() and int(quantity) > 0:
+            lines[int(variant_id)] = int(quantity)
+    return lines
+
+
+def get_guest_cart(request):
+    """{variant_id: quantity} from the request's cookie; a missing or tampered cookie is an empty cart."""
+    if not hasattr(request, '_guest_cart'):
+        try:
+            value = request.get_signed_cookie(GUEST_CART_COOKIE, default='', salt=GUEST_CART_SALT, max_age=GUEST_CART_MAX_AGE)
+        except signing.BadSignature:
+            value = ''
+        request._guest_cart = _decode(value)
+    return request._guest_cart
+
+
+def save_guest_cart(request, response, lines):
+    request._guest_cart = lines
+    request.__dict__.pop('_guest_cart_summary', None)
+    if not lines:
+        response.delete_cookie(GUEST_CART_COOKIE)
+        return
+    value = ','.join(f'{variant_id}:{quantity}' for variant_id, quantity in lines.items())
+    response.set_signed_cookie(
+        GUEST_CART_COOKIE, value, salt=GUEST_CART_SALT, max_age=GUEST_CART_MAX_AGE, httponly=True, samesite='Lax',
+    )
+
+
+def add_to_guest_cart(request, variant, quantity):
+    """
+    Adds to the guest cart held on the request, returning the new lines for save_guest_cart().
+    Raises ValueError when the result exceeds sellable stock or the line limit.
+    """
+    lines = dict(get_guest_cart(request))
+    new_quantity = lines.get(variant.pk, 0) + quantity
+    if new_quantity > variant.available_stock:
+        raise ValueError(f'Only {variant.available_stock} left in stock.')
+    if variant.pk not in lines and len(lines) >= MAX_GUEST_LINES:
+        raise ValueError('Your bag is full. Please log in to add more items.')
+    lines[variant.pk] = new_quantity
+    request._guest_cart = lines
+    request.__dict__.pop('_guest_cart_summary', None)
+    return lines
+
+
+def get_guest_cart_summary(request):
+    """Same shape as get_cart_summary(), from one batched variant lookup per request."""
+    if not hasattr(request, '_guest_cart_summary'):
+        lines = get_guest_cart(request)
+        variants = ProductVariant.objects.filter(
+            pk__in=lines, is_deleted=False, product__is_deleted=False,
+        ).select_related('product', 'color', 'size').in_bulk() if lines else {}
+        request._guest_cart_summary = summarize_lines(
+            summary_line(None, variants[variant_id], quantity)
+            for variant_id, quantity in lines.items() if variant_id in variants
+        )
+    return request._guest_cart_summary
+
+
+def merge_guest_cart(request, response, user):
+    """
+    Folds the guest cookie into the user's active cart, quantities adding up and capped at
+    sellable stock, then clears the cookie. Does nothing for users without a customer profile.
+    """
+    lines = get_guest_cart(request)
+    if not lines:
+        return
+    customer = getattr(user, 'customer_profile', None)
+    if customer is not None:
+        variants = ProductVariant.objects.filter(pk__in=lines, is_deleted=False, product__is_deleted=False).in_bulk()
+        with transaction.atomic():
+            cart_id = get_active_cart_id(customer.pk)
+            # What the user already has in their bag counts against the cap too
+            in_cart = dict(
+                CartItem.objects.select_for_update()
+                .filter(cart_id=cart_id, product_variant_id__in=variants, is_deleted=False)
+                .values_list('product_variant_id', 'quantity')
+            )
+            merged = []
+            for variant_id, quantity in lines.items():
+                if variant_id in variants:
+                    quantity = min(quantity, variants[variant_id].available_stock - in_cart.get(variant_id, 0))
+                    if quantity > 0:
+                        merged.append((variant_id, quantity))
+            if merged:
+                add_cart_lines(cart_id, merged)
+                invalidate_cart_summary(user.pk)
+    save_guest_cart(request, response, {})
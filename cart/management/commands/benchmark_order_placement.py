@@ -0,0 +1,76 @@
+import time
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from store.models import Customer, ProductVariant
+from cart.models import CartItem
+from cart.operations import get_active_cart_id
+from cart.orders import place_order
+from cart.reservations import hold_cart
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Places orders of growing size and checks that placement costs the same number of queries'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1, 5, 25, 100], help='Cart line counts to try')
+        parser.add_argument('--customer', type=int, help='Customer to place the orders as (default: the first one)')
+
+    def handle(self, *args, **options):
+        # With its user, as the checkout view has it (request.user.customer_profile); the confirmation email needs it
+        customers = Customer.objects.select_related('user')
+        customer = customers.filter(pk=options['customer']).first() if options['customer'] else customers.first()
+        if customer is None:
+            raise CommandError('At least one customer is needed to place orders.')
+        variants = list(
+            ProductVariant.objects.filter(is_deleted=False, product__is_deleted=False, stock__gt=0)
+            .order_by('pk').values_list('pk', flat=True)[:max(options['sizes'])]
+        )
+
+        self.stdout.write(f"Placing orders as customer #{customer.pk} ({len(variants)} sellable variants)...")
+        counts = {}
+        for size in options['sizes']:
+            if size > len(variants):
+                self.stdout.write(self.style.WARNING(f"  {size} lines: skipped, only {len(variants)} variants have stock"))
+                continue
+            counts[size] = self._measure(customer, variants[:size])
+
+        if len(set(counts.values())) > 1:
+            raise CommandError(f"Placement cost grows with the cart: {counts}")
+        self.stdout.write(self.style.SUCCESS('Placement runs in a constant number of queries.'))
+
+    def _measure(self, customer, variant_ids):
+        # Everything happens in a transaction that is rolled back, so the database is left as it was
+        try:
+            with transaction.atomic():
+                cart_id = get_active_cart_id(customer.pk)
+                CartItem.objects.filter(cart_id=cart_id).delete()
+                CartItem.objects.bulk_create([CartItem(cart_id=cart_id, product_variant_id=pk) for pk in variant_ids])
+                # What the checkout page does before the customer submits
+                hold_cart(customer, [(pk, 1) for pk in variant_ids])
+
+                address = {'address_line1': '1 Bench St', 'address_line2': '', 'city': 'Bench', 'state': '', 'postal_code': '000000'}
+                with CaptureQueriesContext(connection) as queries:
+                    started = time.perf_counter()
+                    order, created = place_order(customer, uuid.uuid4().hex, address)
+                    elapsed = (time.perf_counter() - started) * 1000
+                with CaptureQueriesContext(connection) as replay_queries:
+                    replayed, replay_created = place_order(customer, order.idempotency_key, address)
+
+                if not created or replay_created or replayed.pk != order.pk:
+                    raise CommandError('Replaying an idempotency key placed a second order.')
+                self.stdout.write(
+                    f"  {len(variant_ids)} lines: {len(queries)} queries, {elapsed:.1f}ms "
+                    f"(replay: {len(replay_queries)} queries)"
+                )
+                raise _Rollback
+        except _Rollback:
+            pass
+        return len(queries)
@@ -0,0 +1,178 @@
+import hashlib
+import hmac
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.request import Request, urlopen
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from cart.models import Payment
+
+
+class FakeRazorpay:
+    """In-memory Razorpay: creates orders and, when one is paid, delivers a signed webhook."""
+
+    def __init__(self, webhook_url, secret):
+        self.webhook_url = webhook_url
+        self.secret = secret
+        self.orders = {}
+        self.lock = threading.Lock()
+
+    def create_order(self, amount, currency='INR', receipt='', notes=None):
+        order = {
+            'id': f'order_{uuid.uuid4().hex[:14]}',
+            'entity': 'order',
+            'amount': amount,
+            'currency': currency,
+            'receipt': receipt,
+            'notes': notes or {},
+            'status': 'created',
+            'created_at': int(time.time()),
+        }
+        with self.lock:
+            self.orders[order['id']] = order
+        return order
+
+    def pay(self, order_id, event='payment.captured'):
+        """Marks the order paid and builds the webhook Razorpay would send. Returns (event_id, body)."""
+        with self.lock:
+            order = self.orders[order_id]
+            order['status'] = 'paid' if event == 'payment.captured' else order['status']
+        payment = {
+            'id': f'pay_{uuid.uuid4().hex[:14]}',
+            'entity': 'payment',
+            'amount': order['amount'],
+            'currency': order['currency'],
+            'status': 'captured' if event == 'payment.captured' else 'failed',
+            'order_id': order_id,
+            'notes': order['notes'],
+        }
+        body = {
+            'entity': 'event',
+            'event': event,
+            'contains': ['payment'],
+            'payload': {'payment': {'entity': payment}},
+            'created_at': int(time.time()),
+        }
+        return f'evt_{uuid.uuid4().hex[:14]}', json.dumps(body).encode()
+
+    def deliver(self, event_id, body):
+        """POSTs a webhook the way Razorpay does. Returns the HTTP status."""
+        signature = hmac.new(self.secret.encode(), body, hashlib.sha256).hexdigest()
+        request = Request(self.webhook_url, data=body, method='POST', headers={
+            'Content-Type': 'application/json',
+            'X-Razorpay-Signature': signature,
+            'X-Razorpay-Event-Id': event_id,
+        })
+        try:
+            with urlopen(request, timeout=10) as response:
+                return response.status
+        except OSError as e:
+            return getattr(e, 'code', 0)
+
+
+class Command(BaseCommand):
+    help = 'Runs a local stand-in for the Razorpay API and webhooks, or load-tests the webhook with it'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--port', type=int, default=8765, help='Port to serve the fake API on')
+        parser.add_argument('--webhook-url', default='http://127.0.0.1:8000/payments/razorpay/webhook/')
+        parser.add_argument('--secret', help='Webhook secret (default: RAZORPAY_WEBHOOK_SECRET)')
+        parser.add_argument('--load', type=int, help='Instead of serving, pay this many pending payments through the webhook')
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--redeliver', type=float, default=0.2, help='Share of events delivered twice, as Razorpay may')
+
+    def handle(self, *args, **options):
+        secret = options['secret'] or settings.RAZORPAY_WEBHOOK_SECRET
+        if not secret:
+            raise CommandError('Set RAZORPAY_WEBHOOK_SECRET or pass --secret; unsigned webhooks are rejected.')
+        fake = FakeRazorpay(options['webhook_url'], secret)
+        if options['load']:
+            self.load(fake, options)
+        else:
+            self.serve(fake, options['port'])
+
+    def serve(self, fake, port):
+        class Handler(BaseHTTPRequestHandler):
+            def _reply(self, status, body):
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self):
+                parts = self.path.strip('/').split('/')
+                if len(parts) == 3 and parts[:2] == ['v1', 'orders'] and parts[2] in fake.orders:
+                    return self._reply(200, fake.orders[parts[2]])
+                self._reply(404, {'error': {'code': 'BAD_REQUEST_ERROR', 'description': 'The id provided does not exist'}})
+
+            def do_POST(self):
+                parts = self.path.strip('/').split('/')
+                length = int(self.headers.get('Content-Length') or 0)
+                data = json.loads(self.rfile.read(length) or b'{}')
+                if parts == ['v1', 'orders']:
+                    return self._reply(200, fake.create_order(data['amount'], data.get('currency', 'INR'), data.get('receipt', ''), data.get('notes')))
+                # Not part of Razorpay's API: stands in for the customer completing payment
+                if len(parts) == 4 and parts[:2] == ['v1', 'orders'] and parts[3] in ('pay', 'fail') and parts[2] in fake.orders:
+                    event = 'payment.captured' if parts[3] == 'pay' else 'payment.failed'
+                    event_id, body = fake.pay(parts[2], event)
+                    return self._reply(200, {'event_id': event_id, 'webhook_status': fake.deliver(event_id, body)})
+                self._reply(404, {'error': {'code': 'BAD_REQUEST_ERROR', 'description': 'Unknown endpoint'}})
+
+        server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self.stdout.write(f'Fake Razorpay on http://127.0.0.1:{port}, webhooks to {fake.webhook_url}')
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+
+    def load(self, fake, options):
+        payments = list(Payment.objects.filter(status='pending').order_by('pk')[:options['load']])
+        if not payments:
+            raise CommandError('No pending payments to pay; place some orders first.')
+
+        deliveries = []
+        for payment in payments:
+            order = fake.create_order(int(payment.amount * 100), receipt=str(payment.order_id), notes={'order_id': str(payment.order_id)})
+            event_id, body = fake.pay(order['id'])
+            deliveries.append((event_id, body))
+            if random.random() < options['redeliver']:
+                deliveries.append((event_id, body))
+        random.shuffle(deliveries)
+
+        self.stdout.write(f'Delivering {len(deliveries)} webhooks for {len(payments)} payments on {options["threads"]} threads...')
+        lock = threading.Lock()
+        timings, failures = [], []
+
+        def worker(chunk):
+            for event_id, body in chunk:
+                started = time.perf_counter()
+                status = fake.deliver(event_id, body)
+                with lock:
+                    timings.append(time.perf_counter() - started)
+                    if status != 200:
+                        failures.append(status)
+
+        threads = [threading.Thread(target=worker, args=(deliveries[i::options['threads']],)) for i in range(options['threads'])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall = time.perf_counter() - started
+
+        timings.sort()
+        p50 = timings[len(timings) // 2] * 1000
+        p99 = timings[max(int(len(timings) * 0.99) - 1, 0)] * 1000
+        self.stdout.write(f'{len(deliveries) / wall:.0f} webhooks/s, ack p50 {p50:.1f}ms, p99 {p99:.1f}ms, {len(failures)} failed')
+        if failures:
+            raise CommandError(f'Webhook deliveries failed with statuses {sorted(set(failures))}.')
+        self.stdout.write(self.style.SUCCESS('All webhooks acknowledged. Run process_payment_events to apply them.'))
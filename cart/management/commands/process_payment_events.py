@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+from cart.payments import process_batch
+
+
+class Command(BaseCommand):
+    help = 'Applies queued Razorpay webhook events to payments and orders (run with --loop as a worker)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--loop', action='store_true', help='Keep polling instead of exiting when the queue is empty')
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds to sleep when the queue is empty')
+
+    def handle(self, *args, **options):
+        self.stdout.write('Processing payment events...')
+        total = 0
+        while True:
+            claimed = process_batch(options['batch_size'])
+            total += claimed
+            if claimed:
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+        self.stdout.write(self.style.SUCCESS(f'Processed {total} payment events.'))
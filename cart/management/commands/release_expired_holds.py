@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from cart.reservations import release_expired
+
+
+class Command(BaseCommand):
+    help = 'Releases checkout stock holds that have passed their expiry (run every minute from cron)'
+
+    def handle(self, *args, **kwargs):
+        count = release_expired()
+        self.stdout.write(self.style.SUCCESS(f'Released {count} expired holds.'))
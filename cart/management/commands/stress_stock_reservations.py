@@ -0,0 +1,98 @@
+import math
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, OperationalError
+
+from store.models import Customer, ProductVariant
+from cart.models import StockReservation
+from cart.reservations import InsufficientStock, hold, release
+
+
+class Command(BaseCommand):
+    help = 'Hammers one variant with concurrent holds and checks that stock is never oversold'
+
+    def add_arguments(self, parser):
+        parser.add_argument('variant', type=int, help='Variant to hold stock on')
+        parser.add_argument('--threads', type=int, default=32)
+        parser.add_argument('--attempts', type=int, default=10, help='Holds attempted per thread')
+        parser.add_argument('--quantity', type=int, default=1, help='Units per hold')
+        parser.add_argument('--max-hold-ms', type=float, default=500, help='Fail if any single hold takes longer')
+        parser.add_argument('--keep', action='store_true', help='Keep the holds instead of releasing them afterwards')
+
+    def handle(self, *args, **options):
+        try:
+            variant = ProductVariant.objects.get(pk=options['variant'], is_deleted=False)
+        except ProductVariant.DoesNotExist:
+            raise CommandError(f"Variant #{options['variant']} not found.")
+        customer = Customer.objects.first()
+        if customer is None:
+            raise CommandError('At least one customer is needed to own the holds.')
+
+        available = variant.stock - variant.reserved
+        quantity = options['quantity']
+        self.stdout.write(f"Variant #{variant.pk}: stock {variant.stock}, reserved {variant.reserved}, "
+                          f"{options['threads']} threads x {options['attempts']} holds of {quantity}")
+
+        start_gate = threading.Barrier(options['threads'])
+        results_lock = threading.Lock()
+        held, refused, errors, timings = [], [0], [], []
+
+        def worker():
+            try:
+                start_gate.wait()
+                for _ in range(options['attempts']):
+                    started = time.perf_counter()
+                    try:
+                        reservation = hold(customer, variant.pk, quantity)
+                    except InsufficientStock:
+                        with results_lock:
+                            refused[0] += 1
+                    except OperationalError as e:
+                        with results_lock:
+                            errors.append(str(e))
+                    else:
+                        with results_lock:
+                            held.append(reservation.pk)
+                    with results_lock:
+                        timings.append(time.perf_counter() - started)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=worker) for _ in range(options['threads'])]
+        wall_started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall = time.perf_counter() - wall_started
+
+        variant.refresh_from_db()
+        held_units = len(held) * quantity
+        recorded_units = sum(StockReservation.objects.filter(pk__in=held).values_list('quantity', flat=True))
+        timings.sort()
+        # Nearest rank: the smallest timing with at least 99% of the samples at or below it
+        p99 = timings[math.ceil(len(timings) * 0.99) - 1] * 1000 if timings else 0
+        worst = timings[-1] * 1000 if timings else 0
+
+        self.stdout.write(f"Held {len(held)} ({held_units} units), refused {refused[0]}, errors {len(errors)} in {wall:.2f}s")
+        self.stdout.write(f"Hold latency p99 {p99:.1f}ms, max {worst:.1f}ms")
+        for error in errors[:5]:
+            self.stdout.write(self.style.WARNING(f"  {error}"))
+
+        if not options['keep']:
+            release(held)
+
+        failures = []
+        if held_units > available:
+            failures.append(f"oversold: held {held_units} units with only {available} available")
+        if recorded_units != held_units:
+            failures.append(f"reservation rows hold {recorded_units} units, callers were granted {held_units}")
+        if variant.reserved > variant.stock:
+            failures.append(f"reserved {variant.reserved} exceeds stock {variant.stock}")
+        if worst > options['max_hold_ms']:
+            failures.append(f"slowest hold took {worst:.1f}ms (limit {options['max_hold_ms']}ms)")
+        if failures:
+            raise CommandError('; '.join(failures))
+        self.stdout.write(self.style.SUCCESS('No oversell: every granted hold is backed by stock.'))
@@ -0,0 +1,22 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from cart.sweeper import CHUNK_SIZE, IDLE_AFTER, sweep
+
+
+class Command(BaseCommand):
+    help = 'Deletes abandoned carts and removed cart lines and releases lapsed stock holds, in small chunks (run nightly from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--idle-days', type=int, default=IDLE_AFTER.days, help='Carts untouched this long are abandoned')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+        parser.add_argument('--pause', type=float, default=0.05, help='Seconds to sleep between chunks')
+
+    def handle(self, *args, **options):
+        self.stdout.write('Sweeping carts...')
+        metrics = sweep(timedelta(days=options['idle_days']), options['chunk_size'], options['pause'])
+        self.stdout.write(
+            f"Released {metrics['holds_released']} holds, deleted {metrics['lines_deleted']} lines and "
+            f"{metrics['carts_deleted']} carts in {metrics['chunks']} chunks ({metrics['seconds']}s)"
+        )
+        self.stdout.write(self.style.SUCCESS('Cart sweep complete.'))
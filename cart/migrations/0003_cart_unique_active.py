@@ -0,0 +1,56 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:07
+
+from django.db import migrations, models
+
+
+def merge_duplicates(apps, schema_editor):
+    """Folds duplicate active carts and duplicate lines left by the old get_or_create races."""
+    Cart = apps.get_model('cart', 'Cart')
+    CartItem = apps.get_model('cart', 'CartItem')
+
+    Cart.objects.filter(is_deleted=True).update(active=None)
+
+    keep = {}
+    for cart in Cart.objects.filter(is_deleted=False).order_by('created_at', 'pk'):
+        if cart.customer_id not in keep:
+            keep[cart.customer_id] = cart.pk
+            continue
+        CartItem.objects.filter(cart_id=cart.pk).update(cart_id=keep[cart.customer_id])
+        Cart.objects.filter(pk=cart.pk).update(is_deleted=True, active=None)
+
+    seen = {}
+    for item in CartItem.objects.order_by('is_deleted', 'pk'):
+        key = (item.cart_id, item.product_variant_id)
+        if key not in seen:
+            seen[key] = item
+            continue
+        survivor = seen[key]
+        if not item.is_deleted:
+            survivor.quantity += item.quantity
+            survivor.save(update_fields=['quantity'])
+        item.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cart', '0002_stockreservation'),
+        ('store', '0015_productvariant_reserved'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cart',
+            name='active',
+            field=models.BooleanField(default=True, editable=False, null=True),
+        ),
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='cart',
+            constraint=models.UniqueConstraint(fields=('customer', 'active'), name='one_active_cart_per_customer'),
+        ),
+        migrations.AddConstraint(
+            model_name='cartitem',
+            constraint=models.UniqueConstraint(fields=('cart', 'product_variant'), name='one_line_per_variant'),
+        ),
+    ]
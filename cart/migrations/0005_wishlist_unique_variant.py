@@ -0,0 +1,30 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:20
+
+from django.db import migrations, models
+
+
+def drop_duplicates(apps, schema_editor):
+    """Keeps one wishlist row per customer and variant, preferring a live one."""
+    Wishlist = apps.get_model('cart', 'Wishlist')
+    seen = set()
+    for row in Wishlist.objects.order_by('is_deleted', '-added_at', 'pk'):
+        key = (row.customer_id, row.product_variant_id)
+        if key in seen:
+            row.delete()
+        else:
+            seen.add(key)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cart', '0004_order_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='wishlist',
+            constraint=models.UniqueConstraint(fields=('customer', 'product_variant'), name='one_wishlist_row_per_variant'),
+        ),
+    ]
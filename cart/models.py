@@ -7,15 +7,36 @@ from vendor.models import Vendor
 class Cart(SoftDeleteModel):
     customer = models.ForeignKey(Customer, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Last time the cart was written to, see cart/sweeper.py
+    updated_at = models.DateTimeField(auto_now=True)
+    # True while the cart is live, NULL once soft-deleted. Unique together with the customer, so a
+    # customer has at most one active cart while any number of deleted ones (NULLs never collide).
+    # Stands in for a partial unique index, which MySQL lacks.
+    active = models.BooleanField(null=True, default=True, editable=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['customer', 'active'], name='one_active_cart_per_customer'),
+        ]
 
     def __str__(self):
         return f"Cart for {self.customer.user.email}"
 
+    def save(self, *args, **kwargs):
+        self.active = None if self.is_deleted else True
+        super(Cart, self).save(*args, **kwargs)
+
 class CartItem(SoftDeleteModel):
     cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name='items')
     product_variant = models.ForeignKey(ProductVariant, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(default=1)
 
+    class Meta:
+        constraints = [
+            # A removed line is soft-deleted and revived on re-add, so it never needs a twin
+            models.UniqueConstraint(fields=['cart', 'product_variant'], name='one_line_per_variant'),
+        ]
+
     def __str__(self):
         return f"{self.quantity} x {self.product_variant.product.name} ({self.product_variant.size}, {self.product_variant.color})"
 
@@ -23,11 +44,41 @@ class CartItem(SoftDeleteModel):
     def sub_total(self):
         return self.product_variant.price * self.quantity
 
+class StockReservation(models.Model):
+    """A time-limited hold on variant stock taken at checkout, see cart/reservations.py."""
+    STATUS_CHOICES = (
+        ('held', 'Held'),
+        ('committed', 'Committed'),
+        ('released', 'Released'),
+    )
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='stock_reservations')
+    product_variant = models.ForeignKey(ProductVariant, on_delete=models.CASCADE, related_name='reservations')
+    quantity = models.PositiveIntegerField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='held')
+    order = models.ForeignKey('Order', on_delete=models.SET_NULL, null=True, blank=True, related_name='stock_reservations')
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            # The sweeper's scan: held rows past their expiry
+            models.Index(fields=['status', 'expires_at'], name='reservation_expiry_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product_variant_id} for customer #{self.customer_id} ({self.status})"
+
 class Wishlist(SoftDeleteModel):
     customer = models.ForeignKey(Customer, on_delete=models.CASCADE)
     product_variant = models.ForeignKey(ProductVariant, on_delete=models.CASCADE)
     added_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        constraints = [
+            # Removing soft-deletes the row and saving again revives it, see cart/wishlist.py
+            models.UniqueConstraint(fields=['customer', 'product_variant'], name='one_wishlist_row_per_variant'),
+        ]
+
     def __str__(self):
         return f"Wishlist item: {self.product_variant.product.name} for {self.customer.user.email}"
 
@@ -36,6 +87,13 @@ class Order(SoftDeleteModel):
     order_date = models.DateTimeField(auto_now_add=True)
     total_amount = models.DecimalField(max_digits=10, decimal_places=2)
     shipping_address = models.ForeignKey(ShippingAddress, on_delete=models.SET_NULL, null=True)
+    # Client-generated per checkout attempt, see cart/orders.py
+    idempotency_key = models.CharField(max_length=64, null=True, blank=True, editable=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['customer', 'idempotency_key'], name='one_order_per_idempotency_key'),
+        ]
 
     def __str__(self):
         return f"Order #{self.pk} by {self.customer.user.email}"
@@ -84,6 +142,35 @@ class Payment(SoftDeleteModel):
     def __str__(self):
         return f"Payment for Order #{self.order.pk}"
 
+class PaymentEvent(models.Model):
+    """A verified Razorpay webhook delivery waiting for, or done with, the worker, see cart/payments.py."""
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('processed', 'Processed'),
+        ('failed', 'Failed'),
+    )
+    # Razorpay's X-Razorpay-Event-Id; redeliveries of one event share it
+    event_id = models.CharField(max_length=100, unique=True)
+    event = models.CharField(max_length=50)
+    payload = models.JSONField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    claim = models.CharField(max_length=32, blank=True)
+    received_at = models.DateTimeField(auto_now_add=True)
+    process_after = models.DateTimeField()
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # The worker's scan: due pending rows, oldest first
+            models.Index(fields=['status', 'process_after'], name='payment_event_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.event} {self.event_id} ({self.status})"
+
 class TransferLog(SoftDeleteModel):
     vendor = models.ForeignKey(Vendor, on_delete=models.CASCADE)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
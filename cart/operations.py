@@ -0,0 +1,185 @@
+from django.db import connection, transaction
+from django.utils import timezone
+
+from store.models import ProductVariant
+from utils.upsert import upsert_sql
+from .models import Cart, CartItem, Wishlist
+from .summary import get_cart_summary, invalidate_cart_summary
+from .wishlist import invalidate_wishlist
+
+# wishlist_remove drops a saved variant from the wishlist, e.g. after moving it to the bag
+OPERATIONS = ('add', 'set', 'remove', 'wishlist_remove')
+MAX_OPERATIONS = 100
+
+
+class InvalidOperations(ValueError):
+    pass
+
+
+def get_active_cart_id(customer_id):
+    """Returns the id of the customer's active cart, creating it if needed, in one race-free statement."""
+    quote = connection.ops.quote_name
+    sql = upsert_sql(
+        Cart._meta.db_table,
+        ['customer_id', 'is_deleted', 'active', 'created_at', 'updated_at'],
+        conflict=['customer_id', 'active'],
+        # LAST_INSERT_ID(id) makes MySQL report the existing row's id on a duplicate. Every call
+        # is cart activity, so it also refreshes updated_at for the abandoned-cart sweeper.
+        update_mysql=f"{quote('id')} = LAST_INSERT_ID({quote('id')}), {quote('updated_at')} = new.{quote('updated_at')}",
+        update_other=f"{quote('updated_at')} = excluded.{quote('updated_at')}",
+        returning='id',
+    )
+    now = timezone.now()
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [customer_id, False, True, now, now])
+        if connection.vendor == 'mysql':
+            return cursor.lastrowid
+        return cursor.fetchone()[0]
+
+
+def add_cart_line(cart_id, variant_id, quantity):
+    """
+    Adds `quantity` of a variant to a cart in one INSERT ... ON DUPLICATE KEY UPDATE (ON CONFLICT
+    elsewhere): a new line is inserted, a live line is incremented and a removed line is revived
+    with just the new quantity. Double clicks can no longer create twin lines.
+    """
+    add_cart_lines(cart_id, [(variant_id, quantity)])
+
+
+def add_cart_lines(cart_id, lines):
+    """add_cart_line for many (variant_id, quantity) pairs at once, still a single statement."""
+    if not lines:
+        return
+    quote = connection.ops.quote_name
+    table = quote(CartItem._meta.db_table)
+    qty, deleted = quote('quantity'), quote('is_deleted')
+    sql = upsert_sql(
+        CartItem._meta.db_table,
+        ['cart_id', 'product_variant_id', 'quantity', 'is_deleted'],
+        conflict=['cart_id', 'product_variant_id'],
+        # MySQL applies assignments left to right, so quantity still sees the old is_deleted
+        update_mysql=f"{qty} = IF({deleted}, new.{qty}, {qty} + new.{qty}), {deleted} = 0",
+        update_other=(
+            f"{qty} = CASE WHEN {table}.{deleted} THEN excluded.{qty} ELSE {table}.{qty} + excluded.{qty} END, "
+            f"{deleted} = excluded.{deleted}"
+        ),
+        rows=len(lines),
+    )
+    params = []
+    for variant_id, quantity in lines:
+        params += [cart_id, variant_id, quantity, False]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def _parse(raw_ops):
+    """Validates the request payload into (op, variant_id, quantity) tuples."""
+    if not isinstance(raw_ops, list) or not raw_ops:
+        raise InvalidOperations("'ops' must be a non-empty list.")
+    if len(raw_ops) > MAX_OPERATIONS:
+        raise InvalidOperations(f"At most {MAX_OPERATIONS} operations per request.")
+
+    ops = []
+    for index, raw in enumerate(raw_ops):
+        try:
+            op = raw['op']
+            variant_id = int(raw['variant_id'])
+            quantity = int(raw.get('quantity', 1 if op == 'add' else 0))
+        except (KeyError, TypeError, ValueError):
+            raise InvalidOperations(f"Operation {index} is malformed.")
+        if op not in OPERATIONS:
+            raise InvalidOperations(f"Operation {index}: unknown op '{op}'.")
+        if quantity < 0 or (op == 'add' and quantity == 0):
+            raise InvalidOperations(f"Operation {index}: invalid quantity.")
+        ops.append((op, variant_id, quantity))
+    return ops
+
+
+def apply_cart_operations(user, raw_ops):
+    """
+    Applies a batch of add / set / remove operations to the user's active cart in one transaction
+    and a constant number of queries, however many operations there are.
+
+    Operations are folded in memory first, so [add 1, add 1, set 5] on one variant is a single
+    write. An operation that cannot be honoured (unknown variant, not enough sellable stock) is
+    skipped and reported; the rest still apply. A wishlist_remove is skipped along with a
+    rejected cart operation on the same variant, so [add, wishlist_remove] moves an item to the
+    bag or leaves it saved, never neither.
+
+    Returns {'lines': [...], 'removed': [variant ids], 'wishlist_removed': [variant ids],
+    'rejected': [...], 'cart_count', 'cart_total'} where 'lines' holds only the lines this batch touched.
+    """
+    parsed = _parse(raw_ops)
+    ops = [(index, op, variant_id, quantity) for index, (op, variant_id, quantity) in enumerate(parsed) if op != 'wishlist_remove']
+    unsave = {variant_id for op, variant_id, _ in parsed if op == 'wishlist_remove'}
+    variant_ids = {variant_id for _, _, variant_id, _ in ops}
+    customer = user.customer_profile
+
+    with transaction.atomic():
+        cart_id = get_active_cart_id(customer.pk)
+        variants = ProductVariant.objects.filter(pk__in=variant_ids, is_deleted=False).in_bulk()
+        # Soft-deleted lines are included so a re-added variant revives its old row. The rows are
+        # locked so a concurrent single add cannot slip in between this read and the write below.
+        lines = {
+            line.product_variant_id: line
+            for line in CartItem.objects.select_for_update().filter(cart_id=cart_id, product_variant_id__in=variant_ids)
+        }
+
+        quantities = {variant_id: (0 if line.is_deleted else line.quantity) for variant_id, line in lines.items()}
+        rejected = []
+        for index, op, variant_id, quantity in ops:
+            current = quantities.get(variant_id, 0)
+            new = current + quantity if op == 'add' else (quantity if op == 'set' else 0)
+            variant = variants.get(variant_id)
+            if new > current and variant is None:
+                rejected.append({'index': index, 'variant_id': variant_id, 'message': 'Item is no longer available.'})
+            elif new > current and new > variant.available_stock:
+                rejected.append({'index': index, 'variant_id': variant_id, 'message': f'Only {variant.available_stock} left in stock.'})
+            else:
+                quantities[variant_id] = new
+
+        created, updated, removed = [], [], []
+        for variant_id, quantity in quantities.items():
+            line = lines.get(variant_id)
+            if line is None:
+                if quantity:
+                    created.append(CartItem(cart_id=cart_id, product_variant_id=variant_id, quantity=quantity))
+            elif quantity == 0:
+                if not line.is_deleted:
+                    line.is_deleted = True
+                    updated.append(line)
+                    removed.append(variant_id)
+            elif line.is_deleted or line.quantity != quantity:
+                line.quantity, line.is_deleted = quantity, False
+                updated.append(line)
+
+        if created:
+            # A line inserted concurrently since the read above is overwritten rather than duplicated
+            unique_fields = ['cart', 'product_variant'] if connection.features.supports_update_conflicts_with_target else None
+            CartItem.objects.bulk_create(
+                created, update_conflicts=True, unique_fields=unique_fields, update_fields=['quantity', 'is_deleted'],
+            )
+        if updated:
+            CartItem.objects.bulk_update(updated, ['quantity', 'is_deleted'])
+        if created or updated:
+            invalidate_cart_summary(user.pk)
+
+        unsave -= {rejection['variant_id'] for rejection in rejected}
+        wishlist_removed = []
+        if unsave:
+            saved = Wishlist.objects.filter(customer=customer, product_variant_id__in=unsave, is_deleted=False)
+            wishlist_removed = list(saved.values_list('product_variant_id', flat=True))
+            if wishlist_removed:
+                saved.update(is_deleted=True)
+                invalidate_wishlist(user.pk)
+
+    summary = get_cart_summary(user)
+    changed = {line.product_variant_id for line in created + updated} - set(removed)
+    return {
+        'lines': [line for line in summary['items'] if line['variant_id'] in changed],
+        'removed': removed,
+        'wishlist_removed': wishlist_removed,
+        'rejected': rejected,
+        'cart_count': summary['count'],
+        'cart_total': summary['total'],
+    }
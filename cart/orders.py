@@ -0,0 +1,155 @@
+"""
+Order placement: turns the customer's active cart into Order, OrderItem, Shipment and Payment
+rows in one transaction and a fixed number of queries, however many lines the cart has.
+
+Stock is not decremented here. The checkout page already holds it (cart/reservations.py); the
+holds are attached to the order and committed when the payment is confirmed. Each placement
+carries a client-generated idempotency key, so a retried POST returns the order the first
+attempt created instead of placing, and charging for, a second one.
+"""
+from decimal import Decimal, InvalidOperation
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from store import mail
+from store.models import ShippingAddress
+from .models import Cart, CartItem, Order, OrderItem, Payment, Shipment, StockReservation
+from .reservations import hold_cart
+from .summary import invalidate_cart_summary
+
+
+class PlacementError(Exception):
+    pass
+
+
+class EmptyCart(PlacementError):
+    pass
+
+
+class PriceChanged(PlacementError):
+    def __init__(self, total):
+        self.total = total
+        super().__init__(f"Prices in your bag changed, the new total is ₹{total}. Please review your order.")
+
+
+class ItemUnavailable(PlacementError):
+    pass
+
+
+def _cart_lines(customer, now):
+    """
+    The cart lines with everything placement needs, in one query: live price and stock of each
+    variant, its vendor, and how many units this customer still holds on it.
+    """
+    held = StockReservation.objects.filter(
+        customer=customer, product_variant=OuterRef('product_variant'), status='held', expires_at__gt=now, order__isnull=True,
+    ).values('product_variant').annotate(units=Sum('quantity')).values('units')
+    return list(
+        CartItem.objects.filter(cart__customer=customer, cart__is_deleted=False, is_deleted=False)
+        .annotate(held=Coalesce(Subquery(held, output_field=IntegerField()), Value(0)))
+        .values(
+            'pk', 'cart_id', 'quantity', 'held', 'product_variant_id',
+            'product_variant__price', 'product_variant__stock', 'product_variant__reserved',
+            'product_variant__is_deleted', 'product_variant__product__is_deleted',
+            'product_variant__product__vendor_id', 'product_variant__product__name',
+        )
+    )
+
+
+def place_order(customer, idempotency_key, address, expected_total=None, payment_method='Razorpay'):
+    """
+    Places an order for the customer's active cart and returns (order, created).
+
+    `address` holds ShippingAddress fields. If `expected_total` (the total the customer was
+    shown) is given and the cart now costs something else, PriceChanged is raised and nothing
+    is written. Replaying a key returns the original order with created=False.
+    """
+    existing = Order.objects.filter(customer=customer, idempotency_key=idempotency_key).first()
+    if existing is not None:
+        return existing, False
+
+    if expected_total is not None:
+        # Posted back by the checkout form, so it may be anything
+        try:
+            expected_total = Decimal(expected_total)
+        except (InvalidOperation, TypeError, ValueError):
+            raise PlacementError("We could not read your order total. Please review your order.")
+
+    try:
+        with transaction.atomic():
+            return _place(customer, idempotency_key, address, expected_total, payment_method), True
+    except IntegrityError:
+        # A concurrent retry with the same key committed first; the unique key rolled us back
+        existing = Order.objects.filter(customer=customer, idempotency_key=idempotency_key).first()
+        if existing is None:
+            raise
+        return existing, False
+
+
+def _place(customer, idempotency_key, address, expected_total, payment_method):
+    now = timezone.now()
+    lines = _cart_lines(customer, now)
+    if not lines:
+        raise EmptyCart("Your bag is empty.")
+
+    total = Decimal('0')
+    for line in lines:
+        if line['product_variant__is_deleted'] or line['product_variant__product__is_deleted']:
+            raise ItemUnavailable("An item in your bag is no longer sold.")
+        # Units this customer holds are already counted in reserved, so they are sellable to them
+        sellable = line['product_variant__stock'] - line['product_variant__reserved'] + line['held']
+        if line['quantity'] > sellable:
+            raise ItemUnavailable("An item in your bag just sold out in the quantity you picked.")
+        total += line['product_variant__price'] * line['quantity']
+    if expected_total is not None and expected_total != total:
+        raise PriceChanged(total)
+
+    # The checkout page normally left exactly one hold per line. If one lapsed, or the bag changed
+    # since, take the holds again; only this fallback costs a query per line.
+    if any(line['quantity'] != line['held'] for line in lines):
+        hold_cart(customer, [(line['product_variant_id'], line['quantity']) for line in lines])
+
+    shipping_address = ShippingAddress.objects.create(customer=customer, **address)
+    order = Order.objects.create(
+        customer=customer,
+        total_amount=total,
+        shipping_address=shipping_address,
+        idempotency_key=idempotency_key,
+    )
+    items = OrderItem.objects.bulk_create([
+        OrderItem(
+            order=order,
+            product_variant_id=line['product_variant_id'],
+            quantity=line['quantity'],
+            price=line['product_variant__price'],
+        )
+        for line in lines
+    ])
+    if not connection.features.can_return_rows_from_bulk_insert:
+        items = list(OrderItem.objects.filter(order=order).order_by('pk'))
+
+    # One shipment per line, owned by the vendor who sells it, so each vendor fulfils its own share
+    vendors = {line['product_variant_id']: line['product_variant__product__vendor_id'] for line in lines}
+    Shipment.objects.bulk_create([
+        Shipment(order_item=item, vendor_id=vendors[item.product_variant_id], tracking_number='', courier_name='')
+        for item in items
+    ])
+    Payment.objects.create(order=order, amount=total, payment_method=payment_method)
+    # Queued in this transaction, so the confirmation goes out exactly when the order exists
+    mail.enqueue_template(
+        f"Your FootFront order #{order.pk}", 'order_confirmation_email.txt',
+        {'order': order, 'lines': lines, 'address': shipping_address, 'site_name': 'FootFront'},
+        [customer.user.email],
+    )
+
+    StockReservation.objects.filter(
+        customer=customer, status='held', expires_at__gt=now, order__isnull=True, product_variant_id__in=vendors,
+    ).update(order=order)
+    CartItem.objects.filter(pk__in=[line['pk'] for line in lines]).update(is_deleted=True)
+    # update() skips Cart.save(), so clear the active marker by hand
+    Cart.objects.filter(pk=lines[0]['cart_id']).update(is_deleted=True, active=None)
+    invalidate_cart_summary(customer.user_id)
+    return order
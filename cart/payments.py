@@ -0,0 +1,154 @@
+"""
+Razorpay webhook ingestion.
+
+The webhook view only verifies the signature and appends the delivery to the PaymentEvent
+table, one INSERT that ignores redeliveries, so Razorpay gets its 200 within milliseconds.
+The worker (manage.py process_payment_events) claims due events in batches and applies them to
+Payment and the order's stock holds. Every write is a conditional status flip, so an event
+applied twice, or two events for one payment, change things exactly once. Failures are retried
+with exponential backoff up to MAX_ATTEMPTS.
+"""
+import hashlib
+import hmac
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Payment, PaymentEvent
+from .reservations import ReservationExpired, commit, release
+
+MAX_ATTEMPTS = 6
+# A claimed batch not finished in this long is assumed lost with its worker and is reclaimed
+CLAIM_TIMEOUT = timedelta(minutes=5)
+
+CAPTURED_EVENTS = ('payment.captured', 'order.paid')
+FAILED_EVENTS = ('payment.failed',)
+
+
+class PaymentEventError(Exception):
+    """An event that can never apply (e.g. amount mismatch); it is failed without retries."""
+
+
+def verify_signature(body, signature, secret=None):
+    """Razorpay signs the raw request body with HMAC-SHA256 under the webhook secret."""
+    secret = settings.RAZORPAY_WEBHOOK_SECRET if secret is None else secret
+    if not secret or not signature:
+        return False
+    expected = hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature)
+
+
+def enqueue_event(event_id, body):
+    """Stores a verified delivery. A redelivery of a stored event is a no-op."""
+    PaymentEvent.objects.bulk_create(
+        [PaymentEvent(event_id=event_id, event=body.get('event', ''), payload=body, process_after=timezone.now())],
+        ignore_conflicts=True,
+    )
+
+
+def _payment_entity(event):
+    return (event.payload.get('payload') or {}).get('payment', {}).get('entity') or {}
+
+
+def _our_order_id(entity):
+    order_id = (entity.get('notes') or {}).get('order_id')
+    return int(order_id) if str(order_id or '').isdigit() else None
+
+
+def _claim(batch_size, now):
+    token = uuid.uuid4().hex
+    due = list(
+        PaymentEvent.objects.filter(status__in=('pending', 'processing'), process_after__lte=now)
+        .order_by('process_after', 'pk').values_list('pk', flat=True)[:batch_size]
+    )
+    if not due:
+        return []
+    # Only rows still due are taken, so two workers racing for one batch split it between them
+    PaymentEvent.objects.filter(
+        pk__in=due, status__in=('pending', 'processing'), process_after__lte=now
+    ).update(status='processing', claim=token, process_after=now + CLAIM_TIMEOUT)
+    return list(PaymentEvent.objects.filter(claim=token, status='processing').order_by('pk'))
+
+
+def _apply(event, payment):
+    """Applies one event to its payment. Returns a note worth keeping on the event, or ''."""
+    entity = _payment_entity(event)
+    if event.event in CAPTURED_EVENTS:
+        if Decimal(entity.get('amount', 0)) != payment.amount * 100:
+            raise PaymentEventError(f"Captured {entity.get('amount')} paise, order #{payment.order_id} is for {payment.amount}.")
+        won = Payment.objects.filter(pk=payment.pk, status='pending').update(
+            status='completed',
+            razorpay_payment_id=entity.get('id', ''),
+            razorpay_order_id=entity.get('order_id') or payment.razorpay_order_id,
+        )
+        if not won:
+            return ''
+        holds = list(payment.order.stock_reservations.filter(status='held').values_list('pk', flat=True))
+        try:
+            commit(holds, order=payment.order)
+        except ReservationExpired:
+            # The money is in; the order must be fulfilled or refunded by hand
+            return f"Paid after the stock holds of order #{payment.order_id} lapsed; check stock before shipping."
+    elif event.event in FAILED_EVENTS:
+        if Payment.objects.filter(pk=payment.pk, status='pending').update(status='failed'):
+            release(payment.order.stock_reservations.filter(status='held').values_list('pk', flat=True))
+    return ''
+
+
+def process_batch(batch_size=100):
+    """Claims and applies up to batch_size due events. Returns how many were claimed."""
+    now = timezone.now()
+    events = _claim(batch_size, now)
+    if not events:
+        return 0
+
+    # Every payment the batch touches, in one query
+    entities = [_payment_entity(event) for event in events]
+    razorpay_ids = {entity.get('order_id') for entity in entities if entity.get('order_id')}
+    order_ids = {_our_order_id(entity) for entity in entities} - {None}
+    payments = list(
+        Payment.objects.filter(Q(razorpay_order_id__in=razorpay_ids) | Q(order_id__in=order_ids)).select_related('order')
+    )
+    by_razorpay_id = {payment.razorpay_order_id: payment for payment in payments if payment.razorpay_order_id}
+    by_order_id = {payment.order_id: payment for payment in payments}
+
+    processed, notes = [], {}
+    for event, entity in zip(events, entities):
+        try:
+            if event.event not in CAPTURED_EVENTS + FAILED_EVENTS:
+                processed.append(event.pk)
+                continue
+            payment = by_razorpay_id.get(entity.get('order_id')) or by_order_id.get(_our_order_id(entity))
+            if payment is None:
+                raise LookupError(f"No payment for Razorpay order {entity.get('order_id')!r}.")
+            with transaction.atomic():
+                note = _apply(event, payment)
+            processed.append(event.pk)
+            if note:
+                notes[event.pk] = note
+        except Exception as e:
+            _retry(event, e, now)
+
+    PaymentEvent.objects.filter(pk__in=processed, claim=events[0].claim).update(
+        status='processed', processed_at=timezone.now(), claim='',
+    )
+    for pk, note in notes.items():
+        PaymentEvent.objects.filter(pk=pk).update(last_error=note)
+    return len(events)
+
+
+def _retry(event, error, now):
+    event.attempts += 1
+    permanent = isinstance(error, PaymentEventError) or event.attempts >= MAX_ATTEMPTS
+    PaymentEvent.objects.filter(pk=event.pk, claim=event.claim).update(
+        status='failed' if permanent else 'pending',
+        attempts=event.attempts,
+        last_error=str(error),
+        claim='',
+        process_after=now + timedelta(seconds=2 ** event.attempts),
+    )
@@ -0,0 +1,119 @@
+"""
+Checkout stock holds.
+
+A hold moves units from sellable to `ProductVariant.reserved` with a single conditional
+UPDATE (... SET reserved = reserved + n WHERE stock - reserved >= n), so two buyers can never
+both get the last pair and no row lock is held past that one statement. A hold is later either
+committed on payment (stock and reserved both drop by n) or released, by the buyer or by the
+expiry sweeper (reserved drops by n). Every transition first flips the reservation's status
+with another conditional UPDATE, so a payment racing the sweeper applies exactly once.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from store.models import ProductVariant
+from .models import StockReservation
+
+HOLD_TTL = timedelta(minutes=15)
+
+
+class InsufficientStock(Exception):
+    def __init__(self, variant_id, requested):
+        self.variant_id = variant_id
+        self.requested = requested
+        super().__init__(f"Not enough stock to hold {requested} of variant #{variant_id}.")
+
+
+class ReservationExpired(Exception):
+    pass
+
+
+def _transition(reservation_ids, from_status, to_status, **extra):
+    """Moves reservations between states. Returns the rows this call actually won."""
+    won = []
+    for reservation in StockReservation.objects.filter(pk__in=reservation_ids, status=from_status):
+        if StockReservation.objects.filter(pk=reservation.pk, status=from_status).update(status=to_status, **extra):
+            won.append(reservation)
+    return won
+
+
+def hold(customer, variant_id, quantity, ttl=HOLD_TTL):
+    """Holds `quantity` units of a variant for the customer, or raises InsufficientStock."""
+    with transaction.atomic():
+        updated = ProductVariant.objects.filter(
+            pk=variant_id, is_deleted=False, stock__gte=F('reserved') + quantity
+        ).update(reserved=F('reserved') + quantity)
+        if not updated:
+            raise InsufficientStock(variant_id, quantity)
+        return StockReservation.objects.create(
+            customer=customer,
+            product_variant_id=variant_id,
+            quantity=quantity,
+            expires_at=timezone.now() + ttl,
+        )
+
+
+def hold_cart(customer, lines, ttl=HOLD_TTL):
+    """
+    Replaces the customer's open holds with one hold per (variant_id, quantity) line, all or
+    nothing. Lines are taken in variant order so concurrent checkouts cannot deadlock. Holds
+    already attached to a placed order stay until that order is paid or fails.
+    """
+    with transaction.atomic():
+        release(StockReservation.objects.filter(customer=customer, status='held', order__isnull=True).values_list('pk', flat=True))
+        return [hold(customer, variant_id, quantity, ttl) for variant_id, quantity in sorted(lines)]
+
+
+def keep_cart_held(customer, lines, ttl=HOLD_TTL):
+    """
+    hold_cart() for a page that gets reloaded: when the customer's open holds are all live and
+    cover exactly these lines they are returned as they are, so a reload costs one query and
+    neither churns `reserved` nor moves the expiry the customer was shown.
+    """
+    lines = sorted(lines)
+    now = timezone.now()
+    open_holds = list(StockReservation.objects.filter(customer=customer, status='held', order__isnull=True))
+    if open_holds and all(reservation.expires_at > now for reservation in open_holds):
+        if sorted((reservation.product_variant_id, reservation.quantity) for reservation in open_holds) == lines:
+            return open_holds
+    return hold_cart(customer, lines, ttl)
+
+
+def commit(reservation_ids, order=None):
+    """Turns held reservations into stock decrements on payment. Raises ReservationExpired if any was already released."""
+    reservation_ids = list(reservation_ids)
+    with transaction.atomic():
+        won = _transition(reservation_ids, 'held', 'committed', order=order)
+        if len(won) != len(reservation_ids):
+            raise ReservationExpired("Some items in your order are no longer reserved.")
+        for reservation in won:
+            ProductVariant.objects.filter(pk=reservation.product_variant_id).update(
+                stock=F('stock') - reservation.quantity,
+                reserved=F('reserved') - reservation.quantity,
+            )
+    return won
+
+
+def release(reservation_ids):
+    """Gives held units back to the sellable pool. Already committed or released rows are skipped."""
+    with transaction.atomic():
+        won = _transition(list(reservation_ids), 'held', 'released')
+        for reservation in won:
+            ProductVariant.objects.filter(pk=reservation.product_variant_id).update(
+                reserved=F('reserved') - reservation.quantity,
+            )
+    return len(won)
+
+
+def release_expired(now=None, batch_size=500):
+    """Sweeper: releases every held reservation past its expiry. Returns how many were released."""
+    now = now or timezone.now()
+    released = 0
+    while True:
+        ids = list(StockReservation.objects.filter(status='held', expires_at__lt=now).values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return released
+        released += release(ids)
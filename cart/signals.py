@@ -0,0 +1,39 @@
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from store import mail
+from store.models import Color, Product, ProductVariant, Size
+from .models import Shipment
+from .summary import invalidate_all_cart_summaries
+
+# Statuses the customer is told about
+NOTIFY_STATUSES = ('in_transit', 'delivered')
+
+
+@receiver(pre_save, sender=Shipment)
+def shipment_about_to_change(sender, instance, **kwargs):
+    # Remember the current status so only a real change sends an email
+    if instance.pk:
+        instance._previous_status = Shipment.objects.filter(pk=instance.pk).values_list('status', flat=True).first()
+
+
+@receiver(post_save, sender=Shipment)
+def shipment_changed(sender, instance, created, **kwargs):
+    if instance.status not in NOTIFY_STATUSES or instance.status == getattr(instance, '_previous_status', None):
+        return
+    item = instance.order_item
+    mail.enqueue_template(
+        f"Order #{item.order_id}: {instance.get_status_display()}", 'shipment_update_email.txt',
+        {'shipment': instance, 'item': item, 'site_name': 'FootFront'},
+        [item.order.customer.user.email],
+    )
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=ProductVariant)
+@receiver(post_delete, sender=ProductVariant)
+@receiver(post_save, sender=Color)
+@receiver(post_save, sender=Size)
+def summary_line_changed(sender, instance, **kwargs):
+    # Names, images, sizes, colors and prices are copied into cached cart summaries
+    invalidate_all_cart_summaries()
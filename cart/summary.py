@@ -0,0 +1,124 @@
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import DecimalField, F, Sum, Window
+
+from .models import CartItem
+
+CART_SUMMARY_TIMEOUT = 60 * 60 * 24
+
+
+def _summary_key(user_id):
+    return f'cart_summary:{user_id}'
+
+
+def _generation_key(user_id):
+    return f'cart_summary_gen:{user_id}'
+
+
+# Summaries copy product names, images and prices. Any product or variant change bumps this
+# (cart/signals.py), which orphans every cached summary at once.
+CATALOG_GENERATION_KEY = 'cart_summary_catalog_gen'
+
+
+def _generation(cached, key):
+    generation = cached.get(key)
+    if generation is None:
+        # Seeded from the clock so an evicted counter never rewinds onto an older entry
+        cache.add(key, int(time.time()), None)
+        generation = cache.get(key)
+    return generation
+
+
+def _bump(key, fallback_key=None):
+    def bump():
+        try:
+            cache.incr(key)
+        except ValueError:
+            # No generation yet means no summary was cached under one
+            if fallback_key:
+                cache.delete(fallback_key)
+    transaction.on_commit(bump)
+
+
+def _build_summary(user_id):
+    """Snapshot of the user's active cart: item count, total and the lines the mini cart renders."""
+    items = CartItem.objects.filter(
+        cart__customer__user_id=user_id, cart__is_deleted=False, is_deleted=False
+    ).select_related('product_variant__product', 'product_variant__color', 'product_variant__size')
+
+    return summarize_lines(summary_line(item.pk, item.product_variant, item.quantity) for item in items)
+
+
+def summary_line(line_id, variant, quantity):
+    return {
+        'id': line_id,
+        'variant_id': variant.pk,
+        'name': variant.product.name,
+        'image': variant.image.url if variant.image else '',
+        'size': str(variant.size),
+        'color': str(variant.color),
+        'quantity': quantity,
+        'price': variant.price,
+        'sub_total': variant.price * quantity,
+    }
+
+
+def summarize_lines(lines):
+    lines = list(lines)
+    return {
+        'count': sum(line['quantity'] for line in lines),
+        'total': sum((line['sub_total'] for line in lines), 0),
+        'items': lines,
+    }
+
+
+def get_cart_lines(customer):
+    """
+    The customer's live cart lines for the cart and checkout pages, with everything the templates
+    touch joined in and the cart total computed by the database, in a single query.
+
+    Returns (items, total).
+    """
+    items = list(
+        CartItem.objects.filter(cart__customer=customer, cart__is_deleted=False, is_deleted=False)
+        .select_related('product_variant__product', 'product_variant__color', 'product_variant__size')
+        # A window over every row repeats the cart total on each line, so no second aggregate query
+        .annotate(cart_total=Window(Sum(
+            F('quantity') * F('product_variant__price'), output_field=DecimalField(max_digits=12, decimal_places=2),
+        )))
+        .order_by('pk')
+    )
+    return items, (items[0].cart_total if items else 0)
+
+
+def get_cart_summary(user):
+    """
+    Returns the cached cart summary of an authenticated user, building it with one query on a miss.
+
+    Entries are tagged with the user's cart generation and the catalog generation. A mutation
+    bumps one of them, which atomically orphans every older entry, including one a concurrent
+    request is still building from pre-mutation rows.
+    """
+    summary_key, generation_key = _summary_key(user.pk), _generation_key(user.pk)
+    cached = cache.get_many([summary_key, generation_key, CATALOG_GENERATION_KEY])
+    generation = (_generation(cached, generation_key), _generation(cached, CATALOG_GENERATION_KEY))
+
+    entry = cached.get(summary_key)
+    if entry is not None and entry[0] == generation:
+        return entry[1]
+
+    summary = _build_summary(user.pk)
+    cache.set(summary_key, (generation, summary), CART_SUMMARY_TIMEOUT)
+    return summary
+
+
+def invalidate_cart_summary(user_id):
+    """Call after any change to the user's cart; takes effect when the surrounding transaction commits."""
+    _bump(_generation_key(user_id), _summary_key(user_id))
+
+
+def invalidate_all_cart_summaries():
+    """Call after a change to anything a summary line shows; takes effect on commit."""
+    _bump(CATALOG_GENERATION_KEY)
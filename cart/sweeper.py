@@ -0,0 +1,73 @@
+"""
+Abandoned-cart sweeper.
+
+Keeps the hot cart tables small: removed (soft-deleted) lines, carts idle past the threshold
+and soft-deleted carts are hard-deleted, and lapsed stock holds are released. All work walks
+the tables by primary key in bounded chunks, each its own short transaction, so no lock is
+held for longer than one chunk and a run can stop and resume anywhere.
+"""
+import time
+from datetime import timedelta
+from functools import partial
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Cart, CartItem
+from .reservations import release_expired
+from .summary import invalidate_cart_summary
+
+IDLE_AFTER = timedelta(days=30)
+CHUNK_SIZE = 500
+LAST_RUN_KEY = 'cart_sweeper:last_run'
+
+
+def _chunks(queryset, chunk_size):
+    """Yields lists of primary keys from queryset, walking the key upwards (keyset pagination)."""
+    last = 0
+    while True:
+        ids = list(queryset.filter(pk__gt=last).order_by('pk').values_list('pk', flat=True)[:chunk_size])
+        if not ids:
+            return
+        yield ids
+        last = ids[-1]
+
+
+def sweep(idle_after=IDLE_AFTER, chunk_size=CHUNK_SIZE, pause=0, now=None):
+    """
+    Runs one sweep and returns its metrics, which are also kept in the cache under LAST_RUN_KEY.
+    `pause` seconds are slept between chunks to leave room for live traffic.
+    """
+    started = time.perf_counter()
+    now = now or timezone.now()
+    metrics = {'holds_released': release_expired(now), 'lines_deleted': 0, 'carts_deleted': 0, 'chunks': 0}
+
+    # Removed lines of live carts. Re-adding a variant inserts a fresh line, so nothing needs them.
+    for ids in _chunks(CartItem.objects.filter(is_deleted=True), chunk_size):
+        with transaction.atomic():
+            metrics['lines_deleted'] += CartItem.objects.filter(pk__in=ids, is_deleted=True).delete()[0]
+        metrics['chunks'] += 1
+        time.sleep(pause)
+
+    # Carts nobody touched since the cutoff, whether still live or already checked out
+    for ids in _chunks(Cart.objects.filter(updated_at__lt=now - idle_after), chunk_size):
+        with transaction.atomic():
+            # Re-checked and locked, so a cart touched since the scan survives and one being touched waits
+            carts = list(
+                Cart.objects.select_for_update().filter(pk__in=ids, updated_at__lt=now - idle_after)
+                .values_list('pk', 'is_deleted', 'customer__user_id')
+            )
+            cart_ids = [pk for pk, _, _ in carts]
+            metrics['lines_deleted'] += CartItem.objects.filter(cart_id__in=cart_ids).delete()[0]
+            metrics['carts_deleted'] += Cart.objects.filter(pk__in=cart_ids).delete()[1].get(Cart._meta.label, 0)
+            for user_id in {user_id for _, is_deleted, user_id in carts if not is_deleted}:
+                # Runs once the chunk has committed, so no reader rebuilds a summary from the doomed rows
+                transaction.on_commit(partial(invalidate_cart_summary, user_id))
+        metrics['chunks'] += 1
+        time.sleep(pause)
+
+    metrics['seconds'] = round(time.perf_counter() - started, 3)
+    metrics['finished_at'] = timezone.now().isoformat()
+    cache.set(LAST_RUN_KEY, metrics, None)
+    return metrics
@@ -1,3 +1,395 @@
-from django.test import TestCase
+import hashlib
+import hmac
+import json
+import threading
+from datetime import timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from store.models import Category
+from utils.testing import STATIC_STORAGES, create_customer, create_variants, race
+from .guest import GUEST_CART_COOKIE, merge_guest_cart, save_guest_cart
+from .models import Cart, CartItem, Order, Payment, PaymentEvent, StockReservation
+from .operations import add_cart_line, add_cart_lines, get_active_cart_id
+from .orders import ItemUnavailable, PlacementError, PriceChanged, place_order
+from .payments import process_batch
+from .reservations import InsufficientStock, hold_cart, release_expired
+from .summary import _generation_key, _summary_key, get_cart_lines, get_cart_summary
+from .sweeper import IDLE_AFTER, sweep
+from .wishlist import _wishlist_key
+
+# Session, user, customer profile, the cart lines, the menubar's cart summary and its two
+# category lists, and the wishlist membership. None of these may grow with the number of lines.
+# Account status comes from the session (store/account_status.py), so it costs nothing here.
+CART_PAGE_QUERY_BUDGET = 8
+
+ADDRESS = {'address_line1': '1 Main Street', 'address_line2': '', 'city': 'Pune', 'state': '', 'postal_code': '411001'}
+
+
+@override_settings(STORAGES=STATIC_STORAGES)
+class CartPageQueryBudgetTests(TestCase):
+    """The cart page must cost the same number of queries whatever the size of the cart."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.variants = create_variants(10, category=Category.objects.create(name='Running', slug='running'))
+        cls.customer = create_customer()
+        cls.user = cls.customer.user
+        cls.cart = Cart.objects.create(customer=cls.customer)
+
+    def setUp(self):
+        cache.clear()
+
+    def fill_cart(self, lines):
+        CartItem.objects.bulk_create([
+            CartItem(cart=self.cart, product_variant=variant, quantity=2) for variant in self.variants[:lines]
+        ])
+
+    def test_cart_lines_are_one_query(self):
+        self.fill_cart(10)
+        with self.assertNumQueries(1):
+            items, total = get_cart_lines(self.customer)
+            for item in items:
+                str(item.product_variant.product.name), str(item.product_variant.size), str(item.product_variant.color)
+        self.assertEqual(len(items), 10)
+        self.assertEqual(total, sum(2 * variant.price for variant in self.variants))
+
+    def test_empty_cart_total_is_zero(self):
+        with self.assertNumQueries(1):
+            items, total = get_cart_lines(self.customer)
+        self.assertEqual((items, total), ([], 0))
+
+    def test_cart_page_budget_does_not_grow_with_lines(self):
+        self.client.force_login(self.user)
+        for lines in (1, 10):
+            with self.subTest(lines=lines):
+                CartItem.objects.filter(cart=self.cart).delete()
+                self.fill_cart(lines)
+                # A warm session, but the cart's own caches cold
+                self.client.get(reverse('cart_detail'))
+                cache.delete_many([_summary_key(self.user.pk), _generation_key(self.user.pk), _wishlist_key(self.user.pk)])
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(reverse('cart_detail'))
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.context['items']), lines)
+                self.assertLessEqual(len(queries), CART_PAGE_QUERY_BUDGET, [q['sql'] for q in queries])
+
+
+class HoldCartRaceTests(TransactionTestCase):
+    """Checkouts racing for the last pairs may be refused, but never oversell."""
+
+    CHECKOUTS = 8
+    STOCK = 3
+
+    def setUp(self):
+        self.variant, = create_variants(stock=self.STOCK)
+        self.customers = [create_customer() for _ in range(self.CHECKOUTS)]
+
+    def test_concurrent_holds_never_exceed_stock(self):
+        lock = threading.Lock()
+        granted = []
+
+        def checkout(customer):
+            try:
+                reservations = hold_cart(customer, [(self.variant.pk, 1)])
+            except InsufficientStock:
+                return
+            with lock:
+                granted.extend(reservations)
+
+        race([lambda customer=customer: checkout(customer) for customer in self.customers])
+
+        self.variant.refresh_from_db()
+        held = StockReservation.objects.filter(product_variant=self.variant, status='held')
+        self.assertEqual(len(granted), self.STOCK)
+        self.assertLessEqual(self.variant.reserved, self.variant.stock)
+        self.assertEqual(self.variant.reserved, sum(reservation.quantity for reservation in granted))
+        self.assertEqual(self.variant.reserved, sum(held.values_list('quantity', flat=True)))
+
+
+class OrderPlacementTests(TestCase):
+    """Placing an order is all or nothing, and a retried submit never places a second one."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.variant, = create_variants(price=Decimal('1200'), stock=2)
+        cls.customer, cls.other_customer = create_customer(), create_customer()
+
+    def setUp(self):
+        cache.clear()
+
+    def fill_cart(self, quantity, customer=None):
+        customer = customer or self.customer
+        add_cart_line(get_active_cart_id(customer.pk), self.variant.pk, quantity)
+
+    def test_replayed_key_returns_the_same_order(self):
+        self.fill_cart(2)
+        hold_cart(self.customer, [(self.variant.pk, 2)])
+        order, created = place_order(self.customer, 'key-1', ADDRESS, expected_total='2400')
+        self.assertTrue(created)
+        self.assertEqual(order.total_amount, Decimal('2400'))
+
+        # The first attempt emptied the bag, so only the key can lead back to the order
+        self.assertEqual(place_order(self.customer, 'key-1', ADDRESS, expected_total='2400'), (order, False))
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(Payment.objects.count(), 1)
+        self.assertEqual(StockReservation.objects.get(customer=self.customer).order, order)
+
+    def test_mismatched_expected_total_is_rejected(self):
+        self.fill_cart(1)
+        with self.assertRaises(PriceChanged) as raised:
+            place_order(self.customer, 'key-1', ADDRESS, expected_total='1000')
+        self.assertEqual(raised.exception.total, Decimal('1200'))
+        with self.assertRaises(PlacementError):
+            place_order(self.customer, 'key-2', ADDRESS, expected_total='a lot')
+        self.assertFalse(Order.objects.exists())
+        self.assertTrue(CartItem.objects.filter(cart__customer=self.customer, is_deleted=False).exists())
+
+    def test_expired_hold_taken_by_someone_else_fails_cleanly(self):
+        self.fill_cart(2)
+        hold_cart(self.customer, [(self.variant.pk, 2)], ttl=timedelta(seconds=-1))
+        release_expired()
+        hold_cart(self.other_customer, [(self.variant.pk, 1)])
+
+        with self.assertRaises(ItemUnavailable):
+            place_order(self.customer, 'key-1', ADDRESS)
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(StockReservation.objects.filter(customer=self.customer, status='held').exists())
+        self.assertTrue(CartItem.objects.filter(cart__customer=self.customer, is_deleted=False).exists())
+
+    def test_hold_smaller_than_the_bag_fails_cleanly(self):
+        hold_cart(self.customer, [(self.variant.pk, 1)])
+        hold_cart(self.other_customer, [(self.variant.pk, 1)])
+        # The bag grew after checkout took its holds, and the rest of the stock is held elsewhere
+        self.fill_cart(2)
+
+        with self.assertRaises(ItemUnavailable):
+            place_order(self.customer, 'key-1', ADDRESS)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(StockReservation.objects.get(customer=self.customer).quantity, 1)
+
+    def test_unknown_payment_method_is_a_form_error(self):
+        self.fill_cart(1)
+        self.client.force_login(self.customer.user)
+        response = self.client.post(reverse('checkout'), {
+            'address': '1 Main Street', 'city': 'Pune', 'zipcode': '411001',
+            'payment_method': 'crypto', 'idempotency_key': 'key-1',
+        })
+        self.assertRedirects(response, reverse('checkout'), fetch_redirect_response=False)
+        self.assertFalse(Order.objects.exists())
+
+
+@override_settings(RAZORPAY_WEBHOOK_SECRET='webhook-secret')
+class PaymentEventTests(TestCase):
+    """Webhook deliveries are stored once and applied by the worker, with retries on failure."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.variant, = create_variants(price=Decimal('1200'), stock=2)
+        cls.customer = create_customer()
+
+    def setUp(self):
+        cache.clear()
+        add_cart_line(get_active_cart_id(self.customer.pk), self.variant.pk, 1)
+        hold_cart(self.customer, [(self.variant.pk, 1)])
+        self.order, _ = place_order(self.customer, 'key-1', ADDRESS)
+
+    def deliver(self, body, event_id='evt_1'):
+        body = json.dumps(body).encode()
+        signature = hmac.new(b'webhook-secret', body, hashlib.sha256).hexdigest()
+        return self.client.post(
+            reverse('razorpay_webhook'), body, content_type='application/json',
+            headers={'X-Razorpay-Signature': signature, 'X-Razorpay-Event-Id': event_id},
+        )
+
+    def captured(self, **entity):
+        entity = {'id': 'pay_1', 'amount': 120000, 'notes': {'order_id': str(self.order.pk)}, **entity}
+        return {'event': 'payment.captured', 'payload': {'payment': {'entity': entity}}}
+
+    def test_redelivered_event_is_stored_once(self):
+        for _ in range(2):
+            self.assertEqual(self.deliver(self.captured()).status_code, 200)
+        self.assertEqual(PaymentEvent.objects.filter(event_id='evt_1').count(), 1)
+
+    def test_signed_body_that_is_not_an_object_is_rejected(self):
+        self.assertEqual(self.deliver(['payment.captured']).status_code, 400)
+        self.assertFalse(PaymentEvent.objects.exists())
+
+    def test_captured_event_completes_the_payment_and_takes_the_stock(self):
+        self.deliver(self.captured())
+        self.assertEqual(process_batch(), 1)
+
+        payment = Payment.objects.get(order=self.order)
+        self.assertEqual((payment.status, payment.razorpay_payment_id), ('completed', 'pay_1'))
+        self.variant.refresh_from_db()
+        self.assertEqual((self.variant.stock, self.variant.reserved), (1, 0))
+        self.assertEqual(StockReservation.objects.get(order=self.order).status, 'committed')
+        self.assertEqual(PaymentEvent.objects.get().status, 'processed')
+        # Nothing left to do
+        self.assertEqual(process_batch(), 0)
+
+    def test_failing_event_is_recorded_and_retried(self):
+        # Keyed only by a Razorpay order id this payment does not know about yet
+        self.deliver(self.captured(order_id='order_rzp', notes={}))
+        process_batch()
+        event = PaymentEvent.objects.get()
+        self.assertEqual((event.status, event.attempts), ('pending', 1))
+        self.assertIn('order_rzp', event.last_error)
+        self.assertGreater(event.process_after, timezone.now())
+        self.assertEqual(Payment.objects.get(order=self.order).status, 'pending')
+
+        Payment.objects.filter(order=self.order).update(razorpay_order_id='order_rzp')
+        PaymentEvent.objects.update(process_after=timezone.now())
+        self.assertEqual(process_batch(), 1)
+        self.assertEqual(PaymentEvent.objects.get().status, 'processed')
+        self.assertEqual(Payment.objects.get(order=self.order).status, 'completed')
+
+
+class CartUpsertTests(TestCase):
+    """The single-statement cart writes: one active cart per customer, one line per variant."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.variants = create_variants(2)
+        cls.customer = create_customer()
+
+    def test_active_cart_is_reused(self):
+        cart_id = get_active_cart_id(self.customer.pk)
+        self.assertEqual(get_active_cart_id(self.customer.pk), cart_id)
+        self.assertEqual(Cart.objects.filter(customer=self.customer).count(), 1)
+
+    def test_duplicate_add_increments_the_line(self):
+        cart_id = get_active_cart_id(self.customer.pk)
+        add_cart_line(cart_id, self.variants[0].pk, 1)
+        add_cart_line(cart_id, self.variants[0].pk, 2)
+        line = CartItem.objects.get(cart_id=cart_id, product_variant=self.variants[0])
+        self.assertEqual((line.quantity, line.is_deleted), (3, False))
+
+    def test_add_revives_a_removed_line_with_the_new_quantity(self):
+        cart_id = get_active_cart_id(self.customer.pk)
+        add_cart_line(cart_id, self.variants[0].pk, 4)
+        CartItem.objects.filter(cart_id=cart_id).update(is_deleted=True)
+        add_cart_lines(cart_id, [(self.variants[0].pk, 1), (self.variants[1].pk, 2)])
+        lines = dict(CartItem.objects.filter(cart_id=cart_id, is_deleted=False).values_list('product_variant_id', 'quantity'))
+        self.assertEqual(lines, {self.variants[0].pk: 1, self.variants[1].pk: 2})
+
+
+class GuestCartMergeTests(TestCase):
+    """Logging in folds the guest cookie into the customer's bag without overselling."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.variant, cls.deleted_variant = create_variants(2, stock=5)
+        cls.deleted_variant.is_deleted = True
+        cls.deleted_variant.save()
+        cls.customer = create_customer()
+
+    def setUp(self):
+        cache.clear()
+        self.cart_id = get_active_cart_id(self.customer.pk)
+
+    def guest_request(self, lines):
+        request = RequestFactory().get('/')
+        response = HttpResponse()
+        save_guest_cart(request, response, lines)
+        return RequestFactory().get('/', HTTP_COOKIE=response.cookies.output(header='', sep=';'))
+
+    def merge(self, request):
+        response = HttpResponse()
+        merge_guest_cart(request, response, self.customer.user)
+        return response
+
+    def cart_lines(self):
+        return dict(CartItem.objects.filter(cart_id=self.cart_id, is_deleted=False).values_list('product_variant_id', 'quantity'))
+
+    def test_quantities_add_to_the_existing_line(self):
+        add_cart_line(self.cart_id, self.variant.pk, 1)
+        response = self.merge(self.guest_request({self.variant.pk: 2}))
+        self.assertEqual(self.cart_lines(), {self.variant.pk: 3})
+        # The cookie is cleared once merged
+        self.assertEqual(response.cookies[GUEST_CART_COOKIE].value, '')
+
+    def test_merged_quantity_is_capped_at_available_stock(self):
+        add_cart_line(self.cart_id, self.variant.pk, 2)
+        hold_cart(create_customer(), [(self.variant.pk, 1)])
+        self.merge(self.guest_request({self.variant.pk: 4}))
+        self.assertEqual(self.cart_lines(), {self.variant.pk: 4})
+
+    def test_deleted_variants_are_dropped(self):
+        self.merge(self.guest_request({self.deleted_variant.pk: 1, self.variant.pk: 1}))
+        self.assertEqual(self.cart_lines(), {self.variant.pk: 1})
+
+    def test_bad_cookie_signature_is_ignored(self):
+        request = self.guest_request({self.variant.pk: 2})
+        request.COOKIES[GUEST_CART_COOKIE] = request.COOKIES[GUEST_CART_COOKIE].replace(':2', ':5')
+        self.merge(request)
+        self.assertEqual(self.cart_lines(), {})
+
+
+class ConcurrentCartUpsertTests(TransactionTestCase):
+    """Simultaneous first adds (double clicks, two tabs) must land in one cart and one line."""
+
+    REQUESTS = 8
+
+    def setUp(self):
+        self.variant, = create_variants()
+        self.customer = create_customer()
+
+    def test_concurrent_adds_share_one_cart_and_line(self):
+        lock = threading.Lock()
+        cart_ids = []
+
+        def add():
+            cart_id = get_active_cart_id(self.customer.pk)
+            add_cart_line(cart_id, self.variant.pk, 1)
+            with lock:
+                cart_ids.append(cart_id)
+
+        race([add] * self.REQUESTS)
+
+        self.assertEqual(len(cart_ids), self.REQUESTS)
+        self.assertEqual(len(set(cart_ids)), 1)
+        self.assertEqual(Cart.objects.filter(customer=self.customer, is_deleted=False).count(), 1)
+        line = CartItem.objects.get(cart_id=cart_ids[0], product_variant=self.variant)
+        self.assertEqual(line.quantity, self.REQUESTS)
+
+
+class CartSweeperTests(TestCase):
+    """The sweeper removes idle carts and removed lines, and nothing a customer is still using."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.variants = create_variants(2)
+        cls.idle_customer, cls.active_customer = create_customer(), create_customer()
+        cls.idle_user = cls.idle_customer.user
+
+    def setUp(self):
+        cache.clear()
+
+    def test_sweep_deletes_idle_carts_and_removed_lines(self):
+        now = timezone.now()
+        idle_cart = Cart.objects.create(customer=self.idle_customer)
+        CartItem.objects.create(cart=idle_cart, product_variant=self.variants[0], quantity=1)
+        # update() skips auto_now, so the cart really looks untouched since then
+        Cart.objects.filter(pk=idle_cart.pk).update(updated_at=now - IDLE_AFTER - timedelta(days=1))
+
+        active_cart = Cart.objects.create(customer=self.active_customer)
+        kept = CartItem.objects.create(cart=active_cart, product_variant=self.variants[0], quantity=2)
+        CartItem.objects.create(cart=active_cart, product_variant=self.variants[1], quantity=1, is_deleted=True)
+
+        self.assertEqual(get_cart_summary(self.idle_user)['count'], 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            metrics = sweep(now=now)
+
+        self.assertEqual((metrics['carts_deleted'], metrics['lines_deleted']), (1, 2))
+        self.assertEqual(list(Cart.objects.values_list('pk', flat=True)), [active_cart.pk])
+        self.assertEqual(list(CartItem.objects.values_list('pk', flat=True)), [kept.pk])
+        # The idle customer's cached summary went with the cart
+        self.assertEqual(get_cart_summary(self.idle_user)['count'], 0)
@@ -8,5 +8,7 @@ urlpatterns = [
     path('remove-from-cart/<int:item_id>/', views.remove_from_cart, name='remove_from_cart'),
     path('wishlist/', views.wishlist_detail, name='wishlist_detail'),
     path('add-ajax/', views.add_to_cart_ajax, name='add_to_cart_ajax'),
+    path('cart/ops/', views.cart_operations, name='cart_operations'),
     path('checkout/', views.checkout, name='checkout'),
+    path('payments/razorpay/webhook/', views.razorpay_webhook, name='razorpay_webhook'),
 ]
@@ -1,22 +1,28 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
+from django.contrib import messages
 from django.http import JsonResponse
-from django.db.models import Sum
 from django.template.loader import render_to_string
+import hashlib
 import json
+import uuid
 from .models import Cart, CartItem, Wishlist
-from store.models import Product, ProductVariant
+from .summary import get_cart_lines, get_cart_summary, invalidate_cart_summary
+from .reservations import InsufficientStock, keep_cart_held
+from .orders import PlacementError, place_order
+from .guest import add_to_guest_cart, get_guest_cart_summary, save_guest_cart
+from .operations import MAX_OPERATIONS, InvalidOperations, add_cart_line, apply_cart_operations, get_active_cart_id
+from .payments import enqueue_event, verify_signature
+from django.views.decorators.http import require_POST
+from django.views.decorators.csrf import csrf_exempt
+from store.models import Product, ProductVariant, ShippingAddress
+
+# Checkout form value -> gateway recorded on the payment
+PAYMENT_METHODS = {'card': 'Razorpay', 'paypal': 'PayPal'}
 
 @login_required(login_url='login')
 def cart_detail(request):
-    try:
-        cart = Cart.objects.get(customer=request.user.customer_profile, is_deleted=False)
-        items = cart.items.filter(is_deleted=False)
-        total = sum(item.product_variant.price * item.quantity for item in items)
-    except Cart.DoesNotExist:
-        items = []
-        total = 0
-        
+    items, total = get_cart_lines(request.user.customer_profile)
     context = {
         'items': items,
         'total': total
@@ -24,6 +30,8 @@ def cart_detail(request):
     return render(request, 'cart.html', context)
 
 def add_to_cart_ajax(request):
+    if request.method == 'POST' and not request.user.is_authenticated:
+        return add_to_guest_cart_ajax(request)
     if not request.user.is_authenticated:
         return JsonResponse({'success': False, 'message': 'login_required'})
     
@@ -32,25 +40,22 @@ def add_to_cart_ajax(request):
             data = json.loads(request.body)
             variant_id = data.get('variant_id')
             quantity = int(data.get('quantity', 1))
+            if quantity < 1:
+                return JsonResponse({'success': False, 'message': 'Quantity must be at least 1.'})
             
             variant = get_object_or_404(ProductVariant, id=variant_id)
             
-            # Stock check
-            if variant.stock < quantity:
-                return JsonResponse({'success': False, 'message': f'Only {variant.stock} left in stock.'})
-            
-            cart, created = Cart.objects.get_or_create(customer=request.user.customer_profile, is_deleted=False)
-            cart_item, item_created = CartItem.objects.get_or_create(cart=cart, product_variant=variant)
+            # Stock check (units held by other checkouts are not for sale)
+            if variant.available_stock < quantity:
+                return JsonResponse({'success': False, 'message': f'Only {variant.available_stock} left in stock.'})
             
-            if not item_created:
-                cart_item.quantity += quantity
-            else:
-                cart_item.quantity = quantity
-            
-            cart_item.save()
+            # Two statements, both upserts: safe under double clicks and concurrent tabs
+            cart_id = get_active_cart_id(request.user.customer_profile.pk)
+            add_cart_line(cart_id, variant.pk, quantity)
+            invalidate_cart_summary(request.user.pk)
             
             # Count items in cart (quantities sum)
-            cart_count = cart.items.filter(is_deleted=False).aggregate(total=Sum('quantity'))['total'] or 0
+            cart_count = get_cart_summary(request.user)['count']
             
             # Render updated mini cart HTML
             cart_html = render_to_string('includes/mini_cart_content.html', request=request)
@@ -65,6 +70,27 @@ def add_to_cart_ajax(request):
             
     return JsonResponse({'success': False, 'message': 'Invalid request'})
 
+def add_to_guest_cart_ajax(request):
+    """Anonymous add to cart: the bag lives in a signed cookie until the visitor logs in."""
+    try:
+        data = json.loads(request.body)
+        quantity = int(data.get('quantity', 1))
+        if quantity < 1:
+            return JsonResponse({'success': False, 'message': 'Quantity must be at least 1.'})
+        variant = ProductVariant.objects.get(id=data.get('variant_id'), is_deleted=False)
+        lines = add_to_guest_cart(request, variant, quantity)
+    except (ValueError, TypeError, ProductVariant.DoesNotExist) as e:
+        message = 'Item not found.' if isinstance(e, ProductVariant.DoesNotExist) else str(e)
+        return JsonResponse({'success': False, 'message': message})
+
+    response = JsonResponse({
+        'success': True,
+        'cart_count': get_guest_cart_summary(request)['count'],
+        'cart_html': render_to_string('includes/mini_cart_content.html', request=request),
+    })
+    save_guest_cart(request, response, lines)
+    return response
+
 @login_required(login_url='login')
 def add_to_cart(request, product_id):
     # Simplified logic: just grab first variant for now or assume post data
@@ -76,43 +102,136 @@ def add_to_cart(request, product_id):
     if not variant:
         return redirect('shop') # Error handling needed
 
-    cart, created = Cart.objects.get_or_create(customer=request.user.customer_profile, is_deleted=False)
-    cart_item, item_created = CartItem.objects.get_or_create(cart=cart, product_variant=variant)
-    
-    if not item_created:
-        cart_item.quantity += 1
-        cart_item.save()
+    cart_id = get_active_cart_id(request.user.customer_profile.pk)
+    add_cart_line(cart_id, variant.pk, 1)
+    invalidate_cart_summary(request.user.pk)
         
     return redirect('cart_detail')
 
+@require_POST
 @login_required(login_url='login')
 def remove_from_cart(request, item_id):
-    from django.http import JsonResponse
-    item = get_object_or_404(CartItem, id=item_id, cart__customer=request.user.customer_profile)
-    item.delete()
+    item = get_object_or_404(CartItem, id=item_id, cart__customer=request.user.customer_profile, is_deleted=False)
+    apply_cart_operations(request.user, [{'op': 'remove', 'variant_id': item.product_variant_id}])
     
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
         return JsonResponse({'success': True})
         
     return redirect('cart_detail')
 
+@require_POST
+def cart_operations(request):
+    """
+    Applies a batch of cart operations in one round trip, e.g.
+    {"ops": [{"op": "add", "variant_id": 3, "quantity": 1}, {"op": "set", "variant_id": 4, "quantity": 2}, {"op": "remove", "variant_id": 5}]}
+    and answers with only the lines that changed plus the new totals. {"op": "wishlist_remove"} next
+    to an add moves a saved item to the bag.
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({'success': False, 'message': 'login_required'}, status=401)
+    if not hasattr(request.user, 'customer_profile'):
+        return JsonResponse({'success': False, 'message': 'Only customers have a cart.'}, status=403)
+
+    try:
+        ops = json.loads(request.body).get('ops')
+        result = apply_cart_operations(request.user, ops)
+    except (ValueError, AttributeError) as e:
+        # InvalidOperations and malformed JSON are both ValueErrors
+        message = str(e) if isinstance(e, InvalidOperations) else 'Invalid request'
+        return JsonResponse({'success': False, 'message': message}, status=400)
+
+    return JsonResponse({'success': True, **result})
+
 @login_required(login_url='login')
 def wishlist_detail(request):
-    wishlist_items = Wishlist.objects.filter(customer=request.user.customer_profile, is_deleted=False)
-    return render(request, 'wishlist.html', {'items': wishlist_items})
+    wishlist_items = Wishlist.objects.filter(
+        customer=request.user.customer_profile, is_deleted=False
+    ).select_related('product_variant__product__category', 'product_variant__size', 'product_variant__color').order_by('-added_at')
+    # Moving everything to the bag takes two operations per item
+    return render(request, 'wishlist.html', {'items': wishlist_items, 'max_operations': MAX_OPERATIONS})
 
 @login_required(login_url='login')
 def checkout(request):
-    try:
-        cart = Cart.objects.get(customer=request.user.customer_profile, is_deleted=False)
-        items = cart.items.filter(is_deleted=False)
-        total = sum(item.product_variant.price * item.quantity for item in items)
-    except Cart.DoesNotExist:
-        items = []
-        total = 0
+    customer = request.user.customer_profile
+    if request.method == 'POST':
+        return place_order_view(request, customer)
+    items, total = get_cart_lines(customer)
+
+    # Hold the stock while the customer pays; holds lapse on their own if checkout is abandoned.
+    # A reload keeps the live holds rather than releasing and taking them again.
+    reservations = []
+    if items:
+        lines = {}
+        for item in items:
+            lines[item.product_variant_id] = lines.get(item.product_variant_id, 0) + item.quantity
+        try:
+            reservations = keep_cart_held(customer, lines.items())
+        except InsufficientStock as e:
+            variant = ProductVariant.objects.filter(pk=e.variant_id).first()
+            messages.error(request, f"Sorry, {variant or 'an item in your bag'} just sold out in the quantity you picked.")
+            return redirect('cart_detail')
     
     context = {
         'items': items,
-        'total': total
+        'total': total,
+        'hold_expires_at': min((r.expires_at for r in reservations), default=None),
+        # Sent back with the form so a retried submit maps onto the same order
+        'idempotency_key': uuid.uuid4().hex,
     }
     return render(request, 'checkout.html', context)
+
+def place_order_view(request, customer):
+    from django.core.exceptions import ValidationError
+
+    address = {
+        'address_line1': request.POST.get('address', '').strip(),
+        'address_line2': '',
+        'city': request.POST.get('city', '').strip(),
+        'state': request.POST.get('state', '').strip(),
+        'postal_code': request.POST.get('zipcode', '').strip(),
+    }
+    try:
+        ShippingAddress(customer=customer, **address).full_clean(exclude=['address_line2', 'state'])
+    except ValidationError:
+        messages.error(request, "Please check your shipping address.")
+        return redirect('checkout')
+
+    payment_method = PAYMENT_METHODS.get(request.POST.get('payment_method'))
+    if payment_method is None:
+        messages.error(request, "Please choose a payment method.")
+        return redirect('checkout')
+
+    idempotency_key = request.POST.get('idempotency_key', '')[:64] or uuid.uuid4().hex
+    try:
+        order, created = place_order(
+            customer, idempotency_key, address,
+            expected_total=request.POST.get('expected_total') or None,
+            payment_method=payment_method,
+        )
+    except (PlacementError, InsufficientStock) as e:
+        messages.error(request, str(e) if isinstance(e, PlacementError) else "Sorry, an item in your bag just sold out.")
+        return redirect('cart_detail')
+
+    messages.success(request, f"Order #{order.pk} placed. Complete the payment to confirm it.")
+    return redirect('cart_detail')
+
+@csrf_exempt
+@require_POST
+def razorpay_webhook(request):
+    """
+    Razorpay webhook receiver. Verifies the signature, queues the event and answers at once;
+    the process_payment_events worker applies it to the order.
+    """
+    if not verify_signature(request.body, request.headers.get('X-Razorpay-Signature', '')):
+        return JsonResponse({'status': 'error', 'message': 'Invalid signature'}, status=400)
+    try:
+        body = json.loads(request.body)
+    except ValueError:
+        body = None
+    # Signed is not the same as well formed: an event is always a JSON object
+    if not isinstance(body, dict):
+        return JsonResponse({'status': 'error', 'message': 'Invalid payload'}, status=400)
+
+    event_id = request.headers.get('X-Razorpay-Event-Id') or hashlib.sha256(request.body).hexdigest()
+    enqueue_event(event_id[:100], body)
+    return JsonResponse({'status': 'ok'})
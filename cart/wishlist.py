@@ -0,0 +1,79 @@
+"""
+Wishlist membership: the sets of variant and product ids a customer has saved, loaded with one
+query, cached per user and memoized on the request, so a page of product cards can mark its
+hearts without a query per card.
+"""
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.utils import timezone
+
+from utils.upsert import upsert_sql
+from .models import Wishlist
+
+WISHLIST_TIMEOUT = 60 * 60 * 24
+EMPTY_WISHLIST = {'variants': frozenset(), 'products': frozenset()}
+
+
+def _wishlist_key(user_id):
+    return f'wishlist:{user_id}'
+
+
+def _load(customer_id):
+    rows = Wishlist.objects.filter(
+        customer_id=customer_id, is_deleted=False
+    ).values_list('product_variant_id', 'product_variant__product_id')
+    return {
+        'variants': frozenset(variant_id for variant_id, _ in rows),
+        'products': frozenset(product_id for _, product_id in rows),
+    }
+
+
+def get_wishlist(request):
+    """The current user's wishlist membership, {'variants': ids, 'products': ids}. Empty for guests."""
+    if not hasattr(request, '_wishlist'):
+        customer = getattr(request.user, 'customer_profile', None) if request.user.is_authenticated else None
+        if customer is None:
+            request._wishlist = EMPTY_WISHLIST
+        else:
+            key = _wishlist_key(request.user.pk)
+            membership = cache.get(key)
+            if membership is None:
+                membership = _load(customer.pk)
+                cache.set(key, membership, WISHLIST_TIMEOUT)
+            request._wishlist = membership
+    return request._wishlist
+
+
+def invalidate_wishlist(user_id):
+    """Call after any change to the user's wishlist; takes effect when the surrounding transaction commits."""
+    transaction.on_commit(lambda: cache.delete(_wishlist_key(user_id)))
+
+
+def toggle_wishlist(customer, variant_id):
+    """
+    Saves the variant to the customer's wishlist, or removes it if already saved. Returns
+    'added' or 'removed'.
+
+    One upsert flips the row's soft-delete flag (a first save inserts it), so rapid double
+    clicks toggle twice instead of racing get_or_create into duplicate rows.
+    """
+    quote = connection.ops.quote_name
+    table = quote(Wishlist._meta.db_table)
+    deleted, added_at = quote('is_deleted'), quote('added_at')
+    sql = upsert_sql(
+        Wishlist._meta.db_table,
+        ['customer_id', 'product_variant_id', 'is_deleted', 'added_at'],
+        conflict=['customer_id', 'product_variant_id'],
+        # added_at is assigned first so MySQL still sees the old flag; re-saving restamps the row
+        update_mysql=f"{added_at} = IF({deleted}, new.{added_at}, {added_at}), {deleted} = NOT {deleted}",
+        update_other=(
+            f"{added_at} = CASE WHEN {table}.{deleted} THEN excluded.{added_at} ELSE {table}.{added_at} END, "
+            f"{deleted} = NOT {table}.{deleted}"
+        ),
+    )
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [customer.pk, variant_id, False, timezone.now()])
+        is_deleted = Wishlist.objects.filter(customer=customer, product_variant_id=variant_id).values_list('is_deleted', flat=True).get()
+        invalidate_wishlist(customer.user_id)
+    return 'removed' if is_deleted else 'added'
@@ -8,7 +8,10 @@ from store.decorators import admin_required
 from datetime import datetime, timedelta
 import firebase_admin
 from firebase_admin import auth
-from django.core.paginator import Paginator
+from django.db.models import Value, DecimalField
+from django.db.models.functions import Coalesce
+from decimal import Decimal
+from utils.pagination import KeysetPaginator
 from utils import panel_messages
 
 
@@ -45,7 +48,7 @@ def dashboard(request):
     }
     return render(request, 'dashboard/admin_dashboard.html', context)
 
-from store.models import Customer, Category, Product, ProductVariant, Size, Color, AttributeRequest, Review
+from store.models import Customer, Category, Product, ProductVariant, Size, Color, AttributeRequest, Review, ProductRatingSummary
 from store.forms import CategoryForm, ProductForm, SizeForm, ColorForm, CustomerAdminForm, VendorAdminForm
 from vendor.models import Vendor
 
@@ -327,7 +330,10 @@ def detail_vendor(request, pk):
 
 @admin_required
 def manage_categories(request):
-    categories = Category.objects.filter(is_deleted=False).select_related('parent_category')
+    # Tree order from the materialized path; product counts come from one GROUP BY instead of a query per row
+    categories = Category.objects.filter(is_deleted=False).select_related('parent_category').annotate(
+        product_count=Count('product')
+    ).order_by('path')
     return render(request, 'dashboard/manage_categories.html', {'categories': categories})
 
 @admin_required
@@ -408,21 +414,20 @@ def manage_products(request):
     if query:
         products = products.filter(Q(name__icontains=query) | Q(description__icontains=query))
 
-    # Sort
+    # Sort (each ordering ends in pk so it can be used as a keyset)
     sort_by = request.GET.get('sort')
-    if sort_by == 'price_low':
-        products = products.annotate(min_price=Min('productvariant__price')).order_by('min_price')
-    elif sort_by == 'price_high':
-        products = products.annotate(min_price=Min('productvariant__price')).order_by('-min_price')
+    if sort_by in ('price_low', 'price_high'):
+        # Min active price comes from the one-to-one listing row: no GROUP BY over variants
+        products = products.annotate(min_price=Coalesce('listing__min_price', Value(Decimal('0')), output_field=DecimalField()))
+        ordering = ('min_price', 'pk') if sort_by == 'price_low' else ('-min_price', '-pk')
     elif sort_by == 'date_oldest':
-        products = products.order_by('created_at')
+        ordering = ('created_at', 'pk')
     else: # Default: Newest first
-        products = products.order_by('-created_at')
+        ordering = ('-created_at', '-pk')
 
-    # Pagination
-    paginator = Paginator(products, 10)
-    page_number = request.GET.get('page')
-    products_page = paginator.get_page(page_number)
+    # Pagination (cursor based, with a cached approximate total instead of an exact COUNT per page)
+    paginator = KeysetPaginator(products, ordering, 10, approximate_count=True)
+    products_page = paginator.page(request.GET.get('cursor'))
 
     context = {
         'products': products_page,
@@ -755,8 +760,10 @@ def delete_review(request, pk):
     try:
         if request.method == "POST":
             review = get_object_or_404(Review, pk=pk)
-            review.is_deleted = True
-            review.save()
+            if not review.is_deleted:
+                review.is_deleted = True
+                review.save()
+                ProductRatingSummary.remove_rating(review.product_id, review.rating)
             messages.success(request, "Review deleted successfully.")
             return redirect('view_reviews')
         return redirect('view_reviews')
@@ -0,0 +1,67 @@
+"""
+Account status (role, blocked, deleted) kept in the session, so BlockedUserMiddleware and the
+role decorators need no profile queries on an ordinary request.
+
+The session copy carries a version stamp. The current stamp lives in the cache under the user's
+id and is replaced whenever the user, their customer profile or their vendor profile is saved
+(see store.signals); a session holding any other stamp reloads the status with one query. A
+missing stamp (evicted, or a cold cache) counts as a change, so the worst case is a reload.
+"""
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import User
+
+SESSION_KEY = '_account_status'
+
+
+def _version_key(user_id):
+    return f'account_status:{user_id}'
+
+
+def _current_version(user_id):
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        # add() so concurrent requests agree on one stamp
+        cache.add(key, uuid.uuid4().hex, None)
+        version = cache.get(key)
+    return version
+
+
+def _load(user_id):
+    row = User.objects.filter(pk=user_id).values(
+        'role',
+        'customer_profile__pk', 'customer_profile__is_blocked', 'customer_profile__is_deleted',
+        'vendor_profile__pk', 'vendor_profile__is_blocked', 'vendor_profile__is_deleted',
+    ).first() or {}
+    customer = row.get('customer_profile__pk') is not None
+    vendor = row.get('vendor_profile__pk') is not None
+    return {
+        'role': row.get('role'),
+        'customer': {'blocked': row['customer_profile__is_blocked'], 'deleted': row['customer_profile__is_deleted']} if customer else None,
+        'vendor': {'blocked': row['vendor_profile__is_blocked'], 'deleted': row['vendor_profile__is_deleted']} if vendor else None,
+    }
+
+
+def get_account_status(request):
+    """
+    The logged-in user's {'role', 'customer', 'vendor'}, where a profile is None or
+    {'blocked', 'deleted'}. Memoized on the request.
+    """
+    if not hasattr(request, '_account_status'):
+        user_id = request.user.pk
+        version = _current_version(user_id)
+        stored = request.session.get(SESSION_KEY)
+        if not stored or stored.get('user') != user_id or stored.get('version') != version:
+            stored = {'user': user_id, 'version': version, **_load(user_id)}
+            request.session[SESSION_KEY] = stored
+        request._account_status = stored
+    return request._account_status
+
+
+def invalidate_account_status(user_id):
+    """Call after changing a user's role or profile flags; takes effect when the surrounding transaction commits."""
+    transaction.on_commit(lambda: cache.delete(_version_key(user_id)))
@@ -54,3 +54,4 @@ admin.site.register(ShippingAddress)
 admin.site.register(Review, ReviewAdmin)
 admin.site.register(Complaint)
 admin.site.register(AttributeRequest)
+admin.site.register(OutboundEmail)
@@ -1,6 +1,24 @@
+import logging
+
 from django.apps import AppConfig
 
+logger = logging.getLogger(__name__)
+
 
 class StoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'store'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from django.conf import settings
+        from . import firebase
+
+        # Build the Firebase app once per process rather than on each login
+        try:
+            firebase.initialize()
+        except Exception as e:
+            # No credentials here (e.g. local dev); the first login retries
+            logger.warning('Firebase app not initialized at startup: %r', e)
+        if settings.FIREBASE_PREFETCH_KEYS:
+            firebase.keys.start()
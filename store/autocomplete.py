@@ -0,0 +1,243 @@
+import bisect
+import heapq
+import threading
+
+from django.urls import reverse
+
+from vendor.models import Vendor
+from .models import Category, ProductListing
+from .page_cache import get_catalog_version
+from .search import TOKEN_RE
+
+# Popularity bonuses on top of the review signal
+TRENDING_BONUS = 5.0
+OUT_OF_STOCK_FACTOR = 0.5
+
+# Slices longer than this are not ranked key by key; entries are walked from the most popular
+# down instead, which keeps lookups for very short prefixes flat without dropping the best matches
+MAX_SCAN = 2000
+
+# Results for prefixes this short match large slices and repeat across users, so they are memoized
+MEMO_PREFIX_LENGTH = 3
+
+
+def normalize(text):
+    return ' '.join(TOKEN_RE.findall((text or '').lower()))
+
+
+def _phrase_keys(text):
+    """'Air Max 90' -> ['air max 90', 'max 90', '90'] so a query can start at any word."""
+    words = normalize(text).split()
+    return [' '.join(words[i:]) for i in range(len(words))]
+
+
+def _product_weight(review_count, avg_rating, is_trending, in_stock):
+    weight = 1.0 + review_count * float(avg_rating or 0) / 5
+    if is_trending:
+        weight += TRENDING_BONUS
+    if not in_stock:
+        weight *= OUT_OF_STOCK_FACTOR
+    return weight
+
+
+class AutocompleteIndex:
+    """
+    Sorted-array prefix index over product names, category names and vendor shop names.
+    `keys` holds (phrase, entry id) pairs in order, so all phrases starting with a prefix
+    form one contiguous slice found with two bisections. Entries carry the suggestion
+    payload and a popularity weight; the best `limit` entries in the slice are returned.
+    """
+
+    def __init__(self):
+        self.keys = []
+        self.entries = {}
+        # entry id -> (weight, -label length), the sort key used by lookups
+        self.ranks = {}
+        self.memo = {}
+        # Entry ids ordered by rank, best first; rebuilt lazily after any change
+        self.by_rank = None
+        self.version = None
+        # Products per category / vendor, which is the popularity of those suggestions
+        self.product_counts = {}
+        self.bulk_loading = False
+        self.lock = threading.RLock()
+        self.build_lock = threading.Lock()
+
+    # --- building -------------------------------------------------------
+
+    def _add(self, entry_id, label, entry):
+        entry['label'] = label
+        entry['phrases'] = _phrase_keys(label)
+        self.entries[entry_id] = entry
+        self.ranks[entry_id] = (entry['weight'], -len(label))
+        self.memo.clear()
+        self.by_rank = None
+        for phrase in entry['phrases']:
+            if self.bulk_loading:
+                self.keys.append((phrase, entry_id))
+            else:
+                bisect.insort(self.keys, (phrase, entry_id))
+
+    def _remove(self, entry_id):
+        entry = self.entries.pop(entry_id, None)
+        if entry is None:
+            return None
+        del self.ranks[entry_id]
+        self.memo.clear()
+        self.by_rank = None
+        for phrase in entry['phrases']:
+            pos = bisect.bisect_left(self.keys, (phrase, entry_id))
+            if pos < len(self.keys) and self.keys[pos] == (phrase, entry_id):
+                del self.keys[pos]
+        return entry
+
+    def _count(self, group_id, delta):
+        if group_id[1] is None:
+            return
+        self.product_counts[group_id] = self.product_counts.get(group_id, 0) + delta
+        entry = self.entries.get(group_id)
+        if entry is not None:
+            entry['weight'] = float(self.product_counts[group_id])
+            self.ranks[group_id] = (entry['weight'], -len(entry['label']))
+            self.by_rank = None
+
+    def _add_product(self, row):
+        pk, name, slug, category_id, vendor_id, category_name, review_count, avg_rating, is_trending, in_stock, price, image = row
+        self._add(('product', pk), name, {
+            'type': 'product',
+            'url': reverse('product_detail', args=[slug]),
+            'category': category_name,
+            'price': float(price) if price is not None else 0,
+            'image': image,
+            'weight': _product_weight(review_count, avg_rating, is_trending, in_stock),
+            'groups': (('category', category_id), ('vendor', vendor_id)),
+        })
+        for group_id in self.entries[('product', pk)]['groups']:
+            self._count(group_id, 1)
+
+    def _remove_product(self, pk):
+        entry = self._remove(('product', pk))
+        if entry is not None:
+            for group_id in entry['groups']:
+                self._count(group_id, -1)
+
+    def rebuild(self):
+        """Loads the whole index from the listing, category and vendor tables (three queries)."""
+        version = get_catalog_version()
+        products = ProductListing.objects.values_list(
+            'pk', 'name', 'slug', 'category_id', 'vendor_id', 'category_name',
+            'review_count', 'avg_rating', 'is_trending', 'in_stock', 'min_price', 'image_url',
+        )
+        categories = Category.objects.filter(is_deleted=False).values_list('pk', 'name', 'slug')
+        vendors = Vendor.objects.filter(is_deleted=False, is_blocked=False).values_list('pk', 'shopName')
+
+        with self.lock:
+            self.keys = []
+            self.entries = {}
+            self.ranks = {}
+            self.memo = {}
+            self.by_rank = None
+            self.product_counts = {}
+            self.bulk_loading = True
+            for row in products:
+                self._add_product(row)
+            shop_url = reverse('shop')
+            for pk, name, slug in categories:
+                self._add(('category', pk), name, {
+                    'type': 'category',
+                    'url': f"{shop_url}?category={slug}",
+                    'weight': float(self.product_counts.get(('category', pk), 0)),
+                })
+            vendor_url = reverse('vendor_shop')
+            for pk, shop_name in vendors:
+                self._add(('vendor', pk), shop_name, {
+                    'type': 'vendor',
+                    'url': f"{vendor_url}?id={pk}",
+                    'weight': float(self.product_counts.get(('vendor', pk), 0)),
+                })
+            # Appending then sorting once beats an insort per key on a full load
+            self.keys.sort()
+            self.bulk_loading = False
+            self.version = version
+
+    # --- incremental updates --------------------------------------------
+
+    def update_product(self, product_id, listing):
+        """Replaces a product's suggestion with its fresh listing row, or drops it when `listing` is None."""
+        with self.lock:
+            if self.version is None:
+                return
+            self._remove_product(product_id)
+            if listing is not None:
+                self._add_product((
+                    listing.pk, listing.name, listing.slug, listing.category_id, listing.vendor_id,
+                    listing.category_name, listing.review_count, listing.avg_rating,
+                    listing.is_trending, listing.in_stock, listing.min_price, listing.image_url,
+                ))
+
+    def advance_version(self, version):
+        """
+        Marks the index current for `version` when the only change since the version it was
+        built from has already been applied incrementally in this process.
+        """
+        with self.lock:
+            if self.version is not None and self.version == version - 1:
+                self.version = version
+
+    # --- lookups --------------------------------------------------------
+
+    def suggest(self, query, limit=8):
+        prefix = normalize(query)
+        if not prefix:
+            return []
+
+        if self.version != get_catalog_version():
+            with self.build_lock:
+                # Whoever waited on the lock finds the index already rebuilt by the first thread
+                if self.version != get_catalog_version():
+                    self.rebuild()
+
+        with self.lock:
+            memo_key = (prefix, limit)
+            if memo_key in self.memo:
+                return self.memo[memo_key]
+
+            start = bisect.bisect_left(self.keys, (prefix,))
+            # Every phrase beginning with `prefix` sorts before prefix + U+FFFF
+            end = bisect.bisect_left(self.keys, (prefix + '\uffff',), start)
+            if end - start <= MAX_SCAN:
+                matched = {entry_id for _, entry_id in self.keys[start:end]}
+                best = heapq.nlargest(limit, matched, key=self.ranks.__getitem__)
+            else:
+                best = self._most_popular(prefix, limit)
+            result = [self._payload(self.entries[entry_id]) for entry_id in best]
+            if len(prefix) <= MEMO_PREFIX_LENGTH:
+                self.memo[memo_key] = result
+            return result
+
+    def _most_popular(self, prefix, limit):
+        """Top `limit` entries with a phrase starting with `prefix`, for prefixes that match a large slice."""
+        if self.by_rank is None:
+            self.by_rank = sorted(self.ranks, key=self.ranks.__getitem__, reverse=True)
+        best = []
+        for entry_id in self.by_rank:
+            if any(phrase.startswith(prefix) for phrase in self.entries[entry_id]['phrases']):
+                best.append(entry_id)
+                if len(best) == limit:
+                    break
+        return best
+
+    @staticmethod
+    def _payload(entry):
+        payload = {'label': entry['label'], 'type': entry['type'], 'url': entry['url']}
+        if entry['type'] == 'product':
+            payload.update(category=entry['category'], price=entry['price'], image=entry['image'])
+        return payload
+
+
+# One index per process, filled lazily on the first lookup
+index = AutocompleteIndex()
+
+
+def suggest(query, limit=8):
+    return index.suggest(query, limit)
@@ -0,0 +1,121 @@
+import bisect
+from collections import defaultdict
+from decimal import Decimal
+
+from django.core.cache import cache
+
+from .models import ProductListing
+
+FACET_INDEX_CACHE_KEY = 'facet_index'
+
+# Fixed price buckets for the sidebar: (lower bound inclusive, upper bound exclusive or None)
+PRICE_BUCKETS = (
+    (0, 2500),
+    (2500, 5000),
+    (5000, 10000),
+    (10000, 20000),
+    (20000, None),
+)
+
+FACETS = ('category', 'color', 'size', 'gender', 'price')
+
+# Prices are stored to the paisa, so [low, high) is the same set of prices as [low, high - PRICE_STEP]
+PRICE_STEP = Decimal('0.01')
+
+
+def bucket_max_price(high):
+    """The inclusive max_price that selects exactly the bucket ending (exclusively) at `high`."""
+    return None if high is None else Decimal(high) - PRICE_STEP
+
+
+def price_bucket(price):
+    for index, (low, high) in enumerate(PRICE_BUCKETS):
+        if price >= low and (high is None or price < high):
+            return index
+    return None
+
+
+class FacetIndex:
+    """
+    Per-facet-value bitmaps over listing rows. Each listing gets a bit position, and every
+    facet value maps to a Python int whose set bits are the products carrying that value.
+    Counting a facet under a filter set is then an AND plus a popcount per value.
+    """
+
+    def __init__(self, rows):
+        self.positions = {}
+        self.bitmaps = {facet: defaultdict(int) for facet in FACETS}
+        prices = []
+        for pos, (pk, category_id, color_ids, size_ids, gender, min_price) in enumerate(rows):
+            bit = 1 << pos
+            self.positions[pk] = pos
+            if category_id:
+                self.bitmaps['category'][category_id] |= bit
+            for color_id in ProductListing.decode_ids(color_ids):
+                self.bitmaps['color'][color_id] |= bit
+            for size_id in ProductListing.decode_ids(size_ids):
+                self.bitmaps['size'][size_id] |= bit
+            self.bitmaps['gender'][gender] |= bit
+            if min_price is not None:
+                self.bitmaps['price'][price_bucket(min_price)] |= bit
+                prices.append((min_price, pos))
+        prices.sort()
+        self.prices = [price for price, _ in prices]
+        self.price_positions = [pos for _, pos in prices]
+        self.universe = (1 << len(self.positions)) - 1
+
+    @classmethod
+    def load(cls):
+        """Returns the cached index, building it from the listing table with a single query on a miss."""
+        index = cache.get(FACET_INDEX_CACHE_KEY)
+        if index is None:
+            rows = ProductListing.objects.order_by('pk').values_list(
+                'pk', 'category_id', 'color_ids', 'size_ids', 'gender', 'min_price'
+            )
+            index = cls(list(rows))
+            cache.set(FACET_INDEX_CACHE_KEY, index, None)
+        return index
+
+    @staticmethod
+    def invalidate():
+        cache.delete(FACET_INDEX_CACHE_KEY)
+
+    def ids_mask(self, product_ids):
+        mask = 0
+        for pk in product_ids:
+            pos = self.positions.get(pk)
+            if pos is not None:
+                mask |= 1 << pos
+        return mask
+
+    def values_mask(self, facet, values):
+        mask = 0
+        for value in values:
+            mask |= self.bitmaps[facet].get(value, 0)
+        return mask
+
+    def price_mask(self, min_price=None, max_price=None):
+        low = bisect.bisect_left(self.prices, Decimal(min_price)) if min_price is not None else 0
+        high = bisect.bisect_right(self.prices, Decimal(max_price)) if max_price is not None else len(self.prices)
+        mask = 0
+        for pos in self.price_positions[low:high]:
+            mask |= 1 << pos
+        return mask
+
+    def counts(self, filters):
+        """
+        Computes counts for every facet value under `filters`, a dict of facet -> mask built with
+        the helpers above (plus an optional 'ids' mask for search results). Each facet is counted
+        against all active filters except its own, so sibling options stay selectable.
+        """
+        result = {}
+        for facet in FACETS:
+            mask = self.universe
+            for name, filter_mask in filters.items():
+                if name != facet:
+                    mask &= filter_mask
+            result[facet] = {
+                value: (bitmap & mask).bit_count()
+                for value, bitmap in self.bitmaps[facet].items()
+            }
+        return result
@@ -0,0 +1,196 @@
+"""
+Firebase bootstrap and ID-token verification for the login and registration views.
+
+The Admin SDK app is built once per process (store.apps calls initialize() at startup) instead
+of re-parsing FIREBASE_SERVICE_ACCOUNT on every login POST. Tokens are verified against
+Google's signing keys held in memory by a KeyRing, which refetches them in the background
+before their Cache-Control max-age runs out, so a login never waits on a key download.
+Verified claims are kept in a bounded LRU keyed by the token's hash until the token's own
+`exp`, so the retry storm after a flaky login costs one signature check.
+
+FIREBASE_CERTS_URL points the KeyRing at another key server; tests use a local fake one.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from urllib.request import urlopen
+
+import firebase_admin
+from django.conf import settings
+from firebase_admin import auth, credentials
+from google.auth import transport
+from google.oauth2 import id_token as google_id_token
+
+ISSUER_PREFIX = 'https://securetoken.google.com/'
+MAX_CACHED_TOKENS = 4096
+# Keys are refetched once this share of their max-age has passed
+REFRESH_AT = 0.8
+DEFAULT_MAX_AGE = 60 * 60
+
+logger = logging.getLogger(__name__)
+_init_lock = threading.Lock()
+
+
+def initialize():
+    """Returns the default Firebase app, creating it from the service account on first use."""
+    try:
+        return firebase_admin.get_app()
+    except ValueError:
+        pass
+    with _init_lock:
+        try:
+            return firebase_admin.get_app()
+        except ValueError:
+            firebase_config_json = os.environ.get('FIREBASE_SERVICE_ACCOUNT')
+            if firebase_config_json:
+                cred = credentials.Certificate(json.loads(firebase_config_json))
+            else:
+                # Fallback to file (will fail in production if file missing)
+                cred = credentials.Certificate(settings.FIREBASE_ADMIN_CONFIG)
+            return firebase_admin.initialize_app(cred)
+
+
+class _Response(transport.Response):
+    def __init__(self, data):
+        self._data = data
+
+    @property
+    def status(self):
+        return 200
+
+    @property
+    def headers(self):
+        return {'content-type': 'application/json'}
+
+    @property
+    def data(self):
+        return self._data
+
+
+class KeyRing(transport.Request):
+    """
+    Google's token signing keys, fetched ahead of need. Doubles as the google-auth transport
+    handed to verify_token(), answering its certificate request from memory.
+    """
+
+    def __init__(self, url):
+        self.url = url
+        self.lock = threading.Lock()
+        self.fetch_lock = threading.Lock()
+        self.body = None
+        self.expires_at = 0
+        self.refresh_at = 0
+        self.refresher = None
+
+    def _fetch(self, force=False):
+        # One fetch at a time; whoever waited behind it finds the keys fresh and skips its own
+        with self.fetch_lock:
+            if not force and time.time() < self.expires_at:
+                return
+            with urlopen(self.url, timeout=10) as response:
+                body = response.read()
+                match = re.search(r'max-age=(\d+)', response.headers.get('Cache-Control', ''))
+            max_age = int(match.group(1)) if match else DEFAULT_MAX_AGE
+            now = time.time()
+            with self.lock:
+                self.body, self.expires_at = body, now + max_age
+                self.refresh_at = now + max_age * REFRESH_AT
+
+    def _refresh_forever(self):
+        while True:
+            try:
+                if time.time() >= self.refresh_at:
+                    self._fetch(force=True)
+                time.sleep(max(self.refresh_at - time.time(), 1))
+            except Exception:
+                logger.exception('Firebase key refresh from %s failed', self.url)
+                time.sleep(30)
+
+    def start(self):
+        """Starts the background refresher; safe to call more than once."""
+        with self.lock:
+            if self.refresher is not None:
+                return
+            self.refresher = threading.Thread(target=self._refresh_forever, name='firebase-keys', daemon=True)
+        self.refresher.start()
+
+    def __call__(self, url, method='GET', body=None, headers=None, timeout=None, **kwargs):
+        if time.time() >= self.expires_at:
+            # Cold start, or the refresher is behind: fetch inline this once
+            self._fetch()
+        with self.lock:
+            return _Response(self.body)
+
+
+class ClaimsCache:
+    """Bounded LRU of verified claims keyed by token hash; an entry dies with its token's exp."""
+
+    def __init__(self, max_size=MAX_CACHED_TOKENS):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key(token):
+        return hashlib.sha256(token.encode() if isinstance(token, str) else token).hexdigest()
+
+    def get(self, token):
+        key = self.key(token)
+        with self.lock:
+            claims = self.entries.get(key)
+            if claims is None:
+                return None
+            if claims['exp'] <= time.time():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return claims
+
+    def put(self, token, claims):
+        key = self.key(token)
+        with self.lock:
+            self.entries[key] = claims
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+keys = KeyRing(settings.FIREBASE_CERTS_URL)
+claims_cache = ClaimsCache()
+
+
+def verify_id_token(token):
+    """
+    Drop-in for firebase_admin.auth.verify_id_token(): returns the decoded claims with 'uid' set,
+    raising auth.ExpiredIdTokenError or auth.InvalidIdTokenError like the SDK does.
+    """
+    claims = claims_cache.get(token)
+    if claims is not None:
+        return claims
+
+    project_id = settings.FIREBASE_PROJECT_ID or initialize().project_id
+    keys.start()
+    try:
+        claims = dict(google_id_token.verify_token(token, keys, audience=project_id, certs_url=keys.url))
+    except ValueError as e:
+        if 'Token expired' in str(e):
+            raise auth.ExpiredIdTokenError('The Firebase ID token is expired.', cause=e)
+        raise auth.InvalidIdTokenError(f'Invalid Firebase ID token: {e}', cause=e)
+    if claims.get('iss') != ISSUER_PREFIX + project_id:
+        raise auth.InvalidIdTokenError('Firebase ID token has an incorrect "iss" (issuer) claim.')
+    subject = claims.get('sub')
+    if not isinstance(subject, str) or not subject or len(subject) > 128:
+        raise auth.InvalidIdTokenError('Firebase ID token has an invalid "sub" (subject) claim.')
+
+    claims['uid'] = subject
+    claims_cache.put(token, claims)
+    return claims
@@ -138,6 +138,8 @@ class CategoryForm(forms.ModelForm):
         parent = self.cleaned_data.get('parent_category')
         if parent and self.instance.pk and parent.pk == self.instance.pk:
             raise forms.ValidationError("A category cannot be its own parent.")
+        if parent and self.instance.pk and parent.is_descendant_of(self.instance):
+            raise forms.ValidationError("A category cannot be moved under one of its own subcategories.")
         return parent
 
 
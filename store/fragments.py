@@ -0,0 +1,101 @@
+import threading
+import time
+
+from django.core.cache import cache
+from django.db import connections
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from .models import Category, ProductListing, Review
+from .page_cache import get_catalog_version
+
+# A fragment is served as-is for this long; after that (or once the catalog version moves on)
+# it is still served, but the first visitor to see it stale kicks off a background rebuild
+FRAGMENT_FRESH_FOR = 60 * 10
+# How long a rebuild may hold the per-fragment lock before another one may start
+REFRESH_LOCK_TIMEOUT = 30
+
+
+def _home_categories():
+    return {'categories': list(Category.objects.filter(is_deleted=False))}
+
+
+def _home_trending():
+    return {'trending_products': list(ProductListing.objects.filter(is_trending=True).order_by('-created_at')[:10])}
+
+
+def _home_new_arrivals():
+    return {'all_products': list(ProductListing.objects.order_by('-created_at')[:10])}
+
+
+def _home_reviews():
+    # Top rated, latest 5
+    reviews = Review.objects.filter(is_deleted=False, rating__gte=4).select_related('customer__user', 'product')
+    return {'featured_reviews': list(reviews.order_by('-created_at')[:5])}
+
+
+# name -> (template, context builder)
+FRAGMENTS = {
+    'home_categories': ('includes/home_categories.html', _home_categories),
+    'home_trending': ('includes/home_trending.html', _home_trending),
+    'home_new_arrivals': ('includes/home_new_arrivals.html', _home_new_arrivals),
+    'home_reviews': ('includes/home_reviews.html', _home_reviews),
+}
+
+
+def _fragment_key(name):
+    return f'fragment:{name}'
+
+
+def build_fragment(name):
+    """Renders a fragment and stores it along with the catalog version it reflects."""
+    version = get_catalog_version()
+    template_name, builder = FRAGMENTS[name]
+    html = render_to_string(template_name, builder())
+    cache.set(_fragment_key(name), {'html': html, 'version': version, 'built_at': time.time()}, None)
+    return html
+
+
+def _refresh_in_background(names):
+    def run():
+        try:
+            for name in names:
+                try:
+                    build_fragment(name)
+                finally:
+                    cache.delete(_fragment_key(name) + ':lock')
+        finally:
+            # The thread opened its own connections, release them before it exits
+            connections.close_all()
+    threading.Thread(target=run, daemon=True).start()
+
+
+def refresh_fragments(names=None):
+    """Rebuilds the given fragments (all by default) off the request path, skipping any already being rebuilt."""
+    claimed = [
+        name for name in (names or FRAGMENTS)
+        if cache.add(_fragment_key(name) + ':lock', 1, REFRESH_LOCK_TIMEOUT)
+    ]
+    if claimed:
+        _refresh_in_background(claimed)
+
+
+def get_fragment(name, request=None):
+    """
+    Returns the rendered fragment, stale-while-revalidate: a stale copy is returned immediately
+    while a background thread rebuilds it. Only a cold cache renders on the request path.
+
+    A copy built before the latest catalog change marks `request` so store.page_cache does not
+    store the page under the new version; the next request after the rebuild caches it instead.
+    """
+    entry = cache.get(_fragment_key(name))
+    if entry is None:
+        return mark_safe(build_fragment(name))
+
+    if entry['version'] != get_catalog_version():
+        if request is not None:
+            request.skip_page_cache = True
+        refresh_fragments([name])
+    elif time.time() - entry['built_at'] > FRAGMENT_FRESH_FOR:
+        refresh_fragments([name])
+    return mark_safe(entry['html'])
@@ -0,0 +1,102 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Avg, Count
+
+from .models import Product, ProductVariant, ProductListing, Review
+
+
+def _image_url(name):
+    # Accepts a FieldFile or the raw stored name returned by values_list()
+    name = getattr(name, 'name', name)
+    return default_storage.url(name) if name else ''
+
+
+def _build_listing(product, variants, review_stats):
+    """
+    Builds an unsaved ProductListing from a product, its active variant rows
+    (price, stock, color_id, size_id, image) and its review aggregate.
+    """
+    prices = [v[0] for v in variants]
+    total_stock = sum(max(v[1], 0) for v in variants)
+
+    image_url = _image_url(product.product_image)
+    if not image_url:
+        image_url = next((_image_url(v[4]) for v in variants if v[4]), '')
+
+    review_count = review_stats.get('count') or 0
+    avg_rating = review_stats.get('avg') or 0
+
+    return ProductListing(
+        product=product,
+        vendor_id=product.vendor_id,
+        category_id=product.category_id,
+        category_name=product.category.name if product.category else '',
+        name=product.name,
+        slug=product.slug,
+        gender=product.gender,
+        is_trending=product.is_trending,
+        created_at=product.created_at,
+        min_price=min(prices) if prices else None,
+        max_price=max(prices) if prices else None,
+        total_stock=total_stock,
+        in_stock=total_stock > 0,
+        color_ids=ProductListing.encode_ids(v[2] for v in variants),
+        size_ids=ProductListing.encode_ids(v[3] for v in variants),
+        review_count=review_count,
+        avg_rating=round(Decimal(avg_rating), 2),
+        image_url=image_url,
+    )
+
+
+def refresh_product_listing(product_id):
+    """
+    Recomputes the listing row of a single product.
+    Removes the row when the product is gone or soft-deleted.
+    """
+    product = Product.objects.select_related('category').filter(pk=product_id, is_deleted=False).first()
+    if product is None:
+        ProductListing.objects.filter(pk=product_id).delete()
+        return None
+
+    variants = list(ProductVariant.objects.filter(product_id=product_id, is_deleted=False).values_list(
+        'price', 'stock', 'color_id', 'size_id', 'image'
+    ))
+    review_stats = Review.objects.filter(product_id=product_id, is_deleted=False).aggregate(
+        count=Count('id'), avg=Avg('rating')
+    )
+
+    listing = _build_listing(product, variants, review_stats)
+    listing.save()
+    return listing
+
+
+def rebuild_product_listings():
+    """
+    Rebuilds every listing row from scratch in a constant number of queries.
+    Returns the number of listings written.
+    """
+    variants = defaultdict(list)
+    for row in ProductVariant.objects.filter(is_deleted=False, product__is_deleted=False).values_list(
+        'product_id', 'price', 'stock', 'color_id', 'size_id', 'image'
+    ):
+        variants[row[0]].append(row[1:])
+
+    review_stats = {
+        row['product_id']: row
+        for row in Review.objects.filter(is_deleted=False).values('product_id').annotate(
+            count=Count('id'), avg=Avg('rating')
+        )
+    }
+
+    listings = [
+        _build_listing(product, variants.get(product.pk, []), review_stats.get(product.pk, {}))
+        for product in Product.objects.filter(is_deleted=False).select_related('category')
+    ]
+
+    with transaction.atomic():
+        ProductListing.objects.all().delete()
+        ProductListing.objects.bulk_create(listings, batch_size=500)
+    return len(listings)
@@ -0,0 +1,106 @@
+"""
+Outbound email queue.
+
+Views never talk to SMTP. enqueue() adds a row to the OutboundEmail table, inside the caller's
+transaction, so an order confirmation exists exactly when its order does and a request never
+waits on an SMTP handshake. The worker (manage.py send_queued_email) claims due messages in
+batches and sends each batch over one SMTP connection. Failures are retried on the RETRY_DELAYS
+schedule, which spans most of a day so a relay outage does not drop mail; the claim scheme is
+the one cart/payments.py uses for webhooks.
+
+manage.py fake_smtp runs a local SMTP server that writes each message to a file, for tests.
+"""
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from .models import OutboundEmail
+
+# Wait before each retry: quick ones for a flaky relay, then hours for an outage (about 21h in all)
+RETRY_DELAYS = (
+    timedelta(minutes=1), timedelta(minutes=5), timedelta(minutes=15), timedelta(hours=1),
+    timedelta(hours=2), timedelta(hours=6), timedelta(hours=12),
+)
+MAX_ATTEMPTS = len(RETRY_DELAYS) + 1
+# A claimed batch not finished in this long is assumed lost with its worker and is reclaimed
+CLAIM_TIMEOUT = timedelta(minutes=5)
+
+
+def enqueue(subject, body, to, from_email=None):
+    """Queues one plain-text message to the addresses in `to`."""
+    return OutboundEmail.objects.create(
+        subject=subject,
+        body=body,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL or '',
+        to=list(to),
+        send_after=timezone.now(),
+    )
+
+
+def enqueue_template(subject, template_name, context, to, from_email=None):
+    """Renders a text template now, so the worker needs none of the objects behind it."""
+    return enqueue(subject, render_to_string(template_name, context), to, from_email)
+
+
+def _claim(batch_size, now):
+    token = uuid.uuid4().hex
+    due = list(
+        OutboundEmail.objects.filter(status__in=('pending', 'sending'), send_after__lte=now)
+        .order_by('send_after', 'pk').values_list('pk', flat=True)[:batch_size]
+    )
+    if not due:
+        return []
+    # Only rows still due are taken, so two workers racing for one batch split it between them
+    OutboundEmail.objects.filter(
+        pk__in=due, status__in=('pending', 'sending'), send_after__lte=now
+    ).update(status='sending', claim=token, send_after=now + CLAIM_TIMEOUT)
+    return list(OutboundEmail.objects.filter(claim=token, status='sending').order_by('pk'))
+
+
+def send_batch(batch_size=50):
+    """Claims and sends up to batch_size due messages over one connection. Returns how many were claimed."""
+    now = timezone.now()
+    emails = _claim(batch_size, now)
+    if not emails:
+        return 0
+
+    connection = get_connection()
+    try:
+        connection.open()
+    except Exception as e:
+        # Nothing went out; the whole batch tries again later
+        for email in emails:
+            _retry(email, e, now)
+        return len(emails)
+
+    sent = []
+    try:
+        for email in emails:
+            message = EmailMessage(email.subject, email.body, email.from_email or None, email.to, connection=connection)
+            try:
+                message.send()
+                sent.append(email.pk)
+            except Exception as e:
+                _retry(email, e, now)
+    finally:
+        connection.close()
+
+    OutboundEmail.objects.filter(pk__in=sent, claim=emails[0].claim).update(
+        status='sent', sent_at=timezone.now(), claim='',
+    )
+    return len(emails)
+
+
+def _retry(email, error, now):
+    email.attempts += 1
+    OutboundEmail.objects.filter(pk=email.pk, claim=email.claim).update(
+        status='failed' if email.attempts >= MAX_ATTEMPTS else 'pending',
+        attempts=email.attempts,
+        last_error=str(error),
+        claim='',
+        send_after=now + RETRY_DELAYS[min(email.attempts, len(RETRY_DELAYS)) - 1],
+    )
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+from store.models import Review, ProductRatingSummary
+
+
+class Command(BaseCommand):
+    help = 'Recomputes per-product rating summaries from active reviews'
+
+    def handle(self, *args, **kwargs):
+        self.stdout.write('Backfilling rating summaries...')
+
+        summaries = {}
+        rows = Review.objects.filter(is_deleted=False).values('product_id', 'rating').annotate(count=Count('id'))
+        for row in rows:
+            summary = summaries.setdefault(row['product_id'], ProductRatingSummary(product_id=row['product_id']))
+            setattr(summary, f"count_{row['rating']}", row['count'])
+            summary.review_count += row['count']
+            summary.rating_total += row['count'] * row['rating']
+
+        with transaction.atomic():
+            ProductRatingSummary.objects.all().delete()
+            ProductRatingSummary.objects.bulk_create(summaries.values(), batch_size=500)
+
+        self.stdout.write(self.style.SUCCESS(f'Backfilled {len(summaries)} rating summaries.'))
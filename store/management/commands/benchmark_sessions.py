@@ -0,0 +1,76 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from store.models import Customer, Product
+
+ENGINES = [
+    'django.contrib.sessions.backends.db',
+    'utils.sessions.db',
+    'utils.sessions.cache_db',
+    'utils.sessions.signed_cookies',
+]
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Compares requests/sec and session queries of a logged-in browse flow across session engines'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--engines', nargs='+', default=ENGINES, help='SESSION_ENGINE values to compare')
+        parser.add_argument('--rounds', type=int, default=20, help='Times to walk the browse flow per engine')
+        parser.add_argument('--customer', type=int, help='Customer to browse as (default: the first one)')
+
+    def handle(self, *args, **options):
+        customer = Customer.objects.filter(pk=options['customer']).first() if options['customer'] else Customer.objects.select_related('user').first()
+        if customer is None:
+            raise CommandError('At least one customer is needed to browse as.')
+        product = Product.objects.filter(is_deleted=False).order_by('pk').first()
+        flow = [reverse('home'), reverse('shop'), reverse('cart_detail'), reverse('wishlist_detail'), reverse('profile')]
+        if product is not None:
+            flow.insert(2, reverse('product_detail', args=[product.slug]))
+
+        self.stdout.write(f"Browsing {len(flow)} pages x {options['rounds']} rounds as customer #{customer.pk}...")
+        for engine in options['engines']:
+            self._measure(engine, customer.user, flow, options['rounds'])
+        self.stdout.write(self.style.SUCCESS('Done.'))
+
+    def _measure(self, engine, user, flow, rounds):
+        # Sessions written during the run are rolled back with everything else
+        try:
+            with transaction.atomic(), override_settings(SESSION_ENGINE=engine):
+                client = Client()
+                client.force_login(user)
+                for url in flow:
+                    client.get(url)
+
+                with CaptureQueriesContext(connection) as queries:
+                    started = time.perf_counter()
+                    for _ in range(rounds):
+                        for url in flow:
+                            response = client.get(url)
+                            if response.status_code != 200:
+                                raise CommandError(f'{url} answered {response.status_code} under {engine}.')
+                    elapsed = time.perf_counter() - started
+
+                if engine == 'utils.sessions.cache_db':
+                    from utils.sessions.cache_db import flush_pending
+                    flush_pending()
+                requests = rounds * len(flow)
+                session_sql = [q['sql'] for q in queries.captured_queries if 'django_session' in q['sql']]
+                reads = sum(sql.startswith('SELECT') for sql in session_sql)
+                self.stdout.write(
+                    f"  {engine}: {requests / elapsed:.0f} req/s, "
+                    f"{reads / requests:.2f} session reads and {(len(session_sql) - reads) / requests:.2f} writes per request, "
+                    f"{len(queries) / requests:.1f} queries per request"
+                )
+                raise _Rollback
+        except _Rollback:
+            pass
@@ -0,0 +1,102 @@
+import os
+import socketserver
+import threading
+import uuid
+
+from django.core.management.base import BaseCommand
+
+
+class FakeSMTPHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP for Django's SMTP backend (no TLS, no AUTH); each message becomes one .eml file."""
+
+    def reply(self, line):
+        self.wfile.write(f'{line}\r\n'.encode())
+
+    def handle(self):
+        self.reply('220 fake-smtp ready')
+        sender, recipients = None, []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode('utf-8', 'replace').strip()
+            verb = command.split(' ', 1)[0].upper()
+            if verb == 'EHLO':
+                self.wfile.write(b'250-fake-smtp\r\n250-8BITMIME\r\n250 SMTPUTF8\r\n')
+            elif verb == 'HELO':
+                self.reply('250 fake-smtp')
+            elif verb == 'MAIL':
+                sender, recipients = command[10:].strip(), []
+                self.reply('250 OK')
+            elif verb == 'RCPT':
+                recipients.append(command[8:].strip())
+                self.reply('250 OK')
+            elif verb == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                data = []
+                while True:
+                    chunk = self.rfile.readline()
+                    if chunk in (b'.\r\n', b'.\n', b''):
+                        break
+                    # Undo SMTP dot-stuffing
+                    data.append(chunk[1:] if chunk.startswith(b'..') else chunk)
+                self.server.store(sender, recipients, b''.join(data))
+                sender, recipients = None, []
+                self.reply('250 OK queued')
+            elif verb == 'RSET':
+                sender, recipients = None, []
+                self.reply('250 OK')
+            elif verb == 'NOOP':
+                self.reply('250 OK')
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Command not implemented')
+
+
+class FakeSMTPServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, address, directory):
+        super().__init__(address, FakeSMTPHandler)
+        self.directory = directory
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.messages = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def process_request(self, request, client_address):
+        with self.lock:
+            self.connections += 1
+        super().process_request(request, client_address)
+
+    def store(self, sender, recipients, data):
+        path = os.path.join(self.directory, f'{uuid.uuid4().hex}.eml')
+        with open(path, 'wb') as f:
+            f.write(f'X-Envelope-From: {sender}\r\nX-Envelope-To: {", ".join(recipients)}\r\n'.encode() + data)
+        with self.lock:
+            self.messages += 1
+
+
+class Command(BaseCommand):
+    help = 'Runs a local SMTP server that writes every message it receives to a directory, for tests'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--port', type=int, default=1025, help='Port to listen on')
+        parser.add_argument('--dir', default='sent_mail', help='Directory to write .eml files to')
+
+    def handle(self, *args, **options):
+        server = FakeSMTPServer(('127.0.0.1', options['port']), options['dir'])
+        self.stdout.write(
+            f"Fake SMTP on 127.0.0.1:{options['port']}, writing to {os.path.abspath(options['dir'])}. "
+            f"Point the app at it with EMAIL_HOST=127.0.0.1 EMAIL_PORT={options['port']} EMAIL_USE_TLS=False."
+        )
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            self.stdout.write(self.style.SUCCESS(f'Received {server.messages} messages over {server.connections} connections.'))
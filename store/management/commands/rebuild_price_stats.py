@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from store.price_stats import rebuild_price_stats
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the per-category price statistics behind the shop price slider'
+
+    def handle(self, *args, **kwargs):
+        self.stdout.write('Rebuilding price statistics...')
+        count = rebuild_price_stats()
+        self.stdout.write(self.style.SUCCESS(f'Wrote price stats for {count} categories.'))
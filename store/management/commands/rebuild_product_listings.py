@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from store.listing import rebuild_product_listings
+from store.facets import FacetIndex
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the denormalized ProductListing table used by storefront listings'
+
+    def handle(self, *args, **kwargs):
+        self.stdout.write('Rebuilding product listings...')
+        count = rebuild_product_listings()
+        FacetIndex.invalidate()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} product listings.'))
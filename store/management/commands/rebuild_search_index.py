@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from store.search import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the product search index from scratch'
+
+    def handle(self, *args, **kwargs):
+        self.stdout.write('Rebuilding search index...')
+        count = rebuild_search_index()
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} products.'))
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+from store.mail import send_batch
+
+
+class Command(BaseCommand):
+    help = 'Sends queued outbound email over pooled SMTP connections (run with --loop as a worker)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50, help='Messages sent per SMTP connection')
+        parser.add_argument('--loop', action='store_true', help='Keep polling instead of exiting when the queue is empty')
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds to sleep when the queue is empty')
+
+    def handle(self, *args, **options):
+        self.stdout.write('Sending queued email...')
+        total = 0
+        while True:
+            claimed = send_batch(options['batch_size'])
+            total += claimed
+            if claimed:
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+        self.stdout.write(self.style.SUCCESS(f'Processed {total} queued emails.'))
@@ -1,7 +1,7 @@
 from django.shortcuts import redirect
 from django.contrib import messages
 from django.contrib.auth import logout
-from .models import Customer
+from .account_status import get_account_status
 
 class BlockedUserMiddleware:
     def __init__(self, get_response):
@@ -9,31 +9,29 @@ class BlockedUserMiddleware:
 
     def __call__(self, request):
         if request.user.is_authenticated:
-            try:
-                # Assuming the user has a linked customer profile
-                if hasattr(request.user, 'customer_profile'):
-                    customer = request.user.customer_profile
-                    if customer.is_blocked:
-                         logout(request)
-                         messages.error(request, 'Your account has been suspended. Please contact support.')
-                         return redirect('login')
-                    
-                    if customer.is_deleted:
-                        logout(request)
-                        messages.error(request, 'Account not found.')
-                        return redirect('login')
+            # Served from the session; see store/account_status.py
+            status = get_account_status(request)
+
+            customer = status['customer']
+            if customer:
+                if customer['blocked']:
+                     logout(request)
+                     messages.error(request, 'Your account has been suspended. Please contact support.')
+                     return redirect('login')
 
-            except Customer.DoesNotExist:
-                pass
+                if customer['deleted']:
+                    logout(request)
+                    messages.error(request, 'Account not found.')
+                    return redirect('login')
 
             # Vendor Blocking Check
-            if hasattr(request.user, 'vendor_profile'):
-                vendor = request.user.vendor_profile
-                if vendor.is_blocked:
+            vendor = status['vendor']
+            if vendor:
+                if vendor['blocked']:
                         logout(request)
                         messages.error(request, 'Your vendor account has been suspended.')
                         return redirect('vendor_login')
-                if vendor.is_deleted:
+                if vendor['deleted']:
                         logout(request)
                         messages.error(request, 'Vendor account not found.')
                         return redirect('vendor_login')
@@ -0,0 +1,101 @@
+# Generated by Django 5.2.5 on 2026-10-18 12:50
+
+from collections import defaultdict
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.core.files.storage import default_storage
+from django.db import migrations, models
+from django.db.models import Avg, Count
+
+
+def _encode_ids(ids):
+    ids = sorted(set(ids))
+    return f",{','.join(str(i) for i in ids)}," if ids else ''
+
+
+def fill_listings(apps, schema_editor):
+    # The storefront reads only from listings, so build them here rather than leave the catalog
+    # empty until rebuild_product_listings runs. Mirrors store.listing with this migration's models.
+    Product = apps.get_model('store', 'Product')
+    ProductVariant = apps.get_model('store', 'ProductVariant')
+    ProductListing = apps.get_model('store', 'ProductListing')
+    Review = apps.get_model('store', 'Review')
+
+    variants = defaultdict(list)
+    for row in ProductVariant.objects.filter(is_deleted=False, product__is_deleted=False).values_list(
+        'product_id', 'price', 'stock', 'color_id', 'size_id', 'image'
+    ):
+        variants[row[0]].append(row[1:])
+    review_stats = {
+        row['product_id']: row
+        for row in Review.objects.filter(is_deleted=False).values('product_id').annotate(count=Count('id'), avg=Avg('rating'))
+    }
+
+    listings = []
+    for product in Product.objects.filter(is_deleted=False).select_related('category'):
+        rows = variants.get(product.pk, [])
+        prices = [v[0] for v in rows]
+        total_stock = sum(max(v[1], 0) for v in rows)
+        image = product.product_image.name or next((v[4] for v in rows if v[4]), '')
+        stats = review_stats.get(product.pk, {})
+        listings.append(ProductListing(
+            product=product,
+            vendor_id=product.vendor_id,
+            category_id=product.category_id,
+            category_name=product.category.name if product.category else '',
+            name=product.name,
+            slug=product.slug,
+            gender=product.gender,
+            is_trending=product.is_trending,
+            created_at=product.created_at,
+            min_price=min(prices) if prices else None,
+            max_price=max(prices) if prices else None,
+            total_stock=total_stock,
+            in_stock=total_stock > 0,
+            color_ids=_encode_ids(v[2] for v in rows),
+            size_ids=_encode_ids(v[3] for v in rows),
+            review_count=stats.get('count') or 0,
+            avg_rating=round(Decimal(stats.get('avg') or 0), 2),
+            image_url=default_storage.url(image) if image else '',
+        ))
+    ProductListing.objects.bulk_create(listings, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0009_alter_review_comment'),
+        ('vendor', '0002_vendor_profile_picture_bankdetail'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductListing',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='listing', serialize=False, to='store.product')),
+                ('category_name', models.CharField(blank=True, max_length=100)),
+                ('name', models.CharField(max_length=150)),
+                ('slug', models.SlugField(max_length=150, unique=True)),
+                ('gender', models.CharField(choices=[('M', 'Men'), ('W', 'Women'), ('U', 'Unisex')], default='U', max_length=1)),
+                ('is_trending', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField()),
+                ('min_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('max_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('total_stock', models.IntegerField(default=0)),
+                ('in_stock', models.BooleanField(default=False)),
+                ('color_ids', models.CharField(blank=True, max_length=255)),
+                ('size_ids', models.CharField(blank=True, max_length=255)),
+                ('review_count', models.IntegerField(default=0)),
+                ('avg_rating', models.DecimalField(decimal_places=2, default=0, max_digits=3)),
+                ('image_url', models.CharField(blank=True, max_length=500)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='store.category')),
+                ('vendor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='vendor.vendor')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-created_at'], name='listing_created_idx'), models.Index(fields=['min_price'], name='listing_price_idx'), models.Index(fields=['category', '-created_at'], name='listing_category_idx'), models.Index(fields=['vendor', '-created_at'], name='listing_vendor_idx'), models.Index(fields=['is_trending', '-created_at'], name='listing_trending_idx')],
+            },
+        ),
+        migrations.RunPython(fill_listings, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 5.2.5 on 2026-10-18 12:51
+
+import re
+from collections import Counter
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Frozen copy of store.search's tokenizer and field weights
+FIELD_WEIGHTS = (('name', 3.0), ('category', 2.0), ('vendor', 2.0), ('description', 1.0))
+STOP_WORDS = {'a', 'an', 'and', 'are', 'for', 'in', 'is', 'of', 'on', 'or', 'the', 'to', 'with'}
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+MAX_TERM_LENGTH = 64
+
+
+def _tokenize(text):
+    return [t[:MAX_TERM_LENGTH] for t in TOKEN_RE.findall((text or '').lower()) if t not in STOP_WORDS]
+
+
+def fill_index(apps, schema_editor):
+    # Search reads only from the index, so build it for the existing catalog rather than leave
+    # search empty until rebuild_search_index runs. Mirrors store.search with this migration's models.
+    Product = apps.get_model('store', 'Product')
+    SearchDocument = apps.get_model('store', 'SearchDocument')
+    SearchTerm = apps.get_model('store', 'SearchTerm')
+
+    documents, postings = [], []
+    for product in Product.objects.filter(is_deleted=False).select_related('category', 'vendor').iterator(chunk_size=500):
+        fields = {
+            'name': product.name,
+            'category': product.category.name if product.category else '',
+            'vendor': product.vendor.shopName if product.vendor else '',
+            'description': product.description,
+        }
+        weights = Counter()
+        length = 0
+        for field, field_weight in FIELD_WEIGHTS:
+            tokens = _tokenize(fields[field])
+            length += len(tokens)
+            for token in tokens:
+                weights[token] += field_weight
+        documents.append(SearchDocument(product_id=product.pk, length=length))
+        postings.extend(
+            SearchTerm(term=term, product_id=product.pk, weight=weight, doc_length=length)
+            for term, weight in weights.items()
+        )
+    SearchDocument.objects.bulk_create(documents, batch_size=1000)
+    SearchTerm.objects.bulk_create(postings, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0010_productlisting'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='store.product')),
+                ('length', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64)),
+                ('weight', models.FloatField()),
+                ('doc_length', models.PositiveIntegerField()),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='store.product')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('term', 'product'), name='unique_search_term_product')],
+            },
+        ),
+        migrations.RunPython(fill_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.5 on 2026-10-18 12:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def fill_summaries(apps, schema_editor):
+    Review = apps.get_model('store', 'Review')
+    ProductRatingSummary = apps.get_model('store', 'ProductRatingSummary')
+
+    summaries = {}
+    rows = Review.objects.filter(is_deleted=False).values('product_id', 'rating').annotate(count=models.Count('id'))
+    for row in rows:
+        summary = summaries.setdefault(row['product_id'], ProductRatingSummary(product_id=row['product_id']))
+        setattr(summary, f"count_{row['rating']}", row['count'])
+        summary.review_count += row['count']
+        summary.rating_total += row['count'] * row['rating']
+    ProductRatingSummary.objects.bulk_create(summaries.values(), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0011_searchdocument_searchterm'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductRatingSummary',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='rating_summary', serialize=False, to='store.product')),
+                ('count_1', models.PositiveIntegerField(default=0)),
+                ('count_2', models.PositiveIntegerField(default=0)),
+                ('count_3', models.PositiveIntegerField(default=0)),
+                ('count_4', models.PositiveIntegerField(default=0)),
+                ('count_5', models.PositiveIntegerField(default=0)),
+                ('review_count', models.PositiveIntegerField(default=0)),
+                ('rating_total', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(fill_summaries, migrations.RunPython.noop),
+    ]
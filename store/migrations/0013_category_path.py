@@ -0,0 +1,44 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:00
+
+from django.db import migrations, models
+
+
+def populate_paths(apps, schema_editor):
+    Category = apps.get_model('store', 'Category')
+    categories = {c.pk: c for c in Category.objects.all()}
+
+    def resolve(category, seen=()):
+        if category.path:
+            return category.path, category.depth
+        parent = categories.get(category.parent_category_id)
+        if parent is None or parent.pk in seen:
+            category.path, category.depth = f'{category.pk:06d}/', 0
+        else:
+            parent_path, parent_depth = resolve(parent, seen + (category.pk,))
+            category.path, category.depth = parent_path + f'{category.pk:06d}/', parent_depth + 1
+        return category.path, category.depth
+
+    for category in categories.values():
+        resolve(category)
+    Category.objects.bulk_update(categories.values(), ['path', 'depth'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0012_productratingsummary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='path',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=255),
+        ),
+        migrations.RunPython(populate_paths, migrations.RunPython.noop),
+    ]
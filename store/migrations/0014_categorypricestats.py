@@ -0,0 +1,57 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, F, Max, Min
+from django.db.models.functions import Floor
+
+# Frozen copy of CategoryPriceStats' histogram layout
+HISTOGRAM_BUCKET_WIDTH = 500
+HISTOGRAM_BUCKETS = 40
+
+
+def fill_price_stats(apps, schema_editor):
+    # The shop's slider and histogram read only these rows, so compute them for the existing
+    # catalog. Mirrors store.price_stats.rebuild_price_stats with this migration's models.
+    ProductVariant = apps.get_model('store', 'ProductVariant')
+    CategoryPriceStats = apps.get_model('store', 'CategoryPriceStats')
+
+    variants = ProductVariant.objects.filter(is_deleted=False, product__is_deleted=False)
+    rows = {
+        row['product__category_id']: CategoryPriceStats(
+            category_id=row['product__category_id'],
+            min_price=row['low'], max_price=row['high'], variant_count=row['count'],
+            histogram=[0] * HISTOGRAM_BUCKETS,
+        )
+        for row in variants.values('product__category_id').annotate(low=Min('price'), high=Max('price'), count=Count('pk'))
+    }
+    buckets = (
+        variants.annotate(bucket=Floor(F('price') / HISTOGRAM_BUCKET_WIDTH))
+        .values('product__category_id', 'bucket').annotate(n=Count('pk'))
+    )
+    for row in buckets:
+        rows[row['product__category_id']].histogram[min(int(row['bucket']), HISTOGRAM_BUCKETS - 1)] += row['n']
+    CategoryPriceStats.objects.bulk_create(rows.values())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0013_category_path'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryPriceStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('min_price', models.DecimalField(decimal_places=2, max_digits=10, null=True)),
+                ('max_price', models.DecimalField(decimal_places=2, max_digits=10, null=True)),
+                ('variant_count', models.PositiveIntegerField(default=0)),
+                ('histogram', models.JSONField(default=list)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('category', models.OneToOneField(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='price_stats', to='store.category')),
+            ],
+        ),
+        migrations.RunPython(fill_price_stats, migrations.RunPython.noop),
+    ]
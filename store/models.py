@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models.functions import Concat, Substr
 from django.utils.text import slugify
 from django.core.validators import MinValueValidator, MaxValueValidator
  
@@ -97,6 +98,11 @@ class Category(SoftDeleteModel):
     slug = models.SlugField(max_length=100, unique=True)
     description = models.TextField(max_length=255, blank=True)
     cat_image = models.ImageField(upload_to='categories', blank=True)
+    # Materialized path: one fixed-width segment per ancestor, ending with this category's own
+    # (e.g. "000001/000004/"). A subtree is then a single indexed prefix range and ordering
+    # by path lists the whole tree depth-first.
+    path = models.CharField(max_length=255, db_index=True, editable=False, default='')
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
 
     class Meta:
         verbose_name = 'category'
@@ -105,10 +111,46 @@ class Category(SoftDeleteModel):
     def __str__(self):
         return self.name
 
+    @staticmethod
+    def path_segment(pk):
+        return f'{pk:06d}/'
+
     def save(self, *args, **kwargs):
         if not self.slug and self.name:
             self.slug = slugify(self.name)
         super(Category, self).save(*args, **kwargs)
+        self._sync_tree()
+
+    def _sync_tree(self):
+        """Keeps path/depth of this category and its subtree in step with parent_category and is_deleted."""
+        parent = self.parent_category
+        path = (parent.path if parent else '') + self.path_segment(self.pk)
+        depth = parent.depth + 1 if parent else 0
+
+        old_path = self.path
+        if path != old_path:
+            if old_path:
+                # Moved: rewrite the prefix of every descendant in one statement
+                Category.objects.filter(path__startswith=old_path).exclude(pk=self.pk).update(
+                    path=Concat(models.Value(path), Substr('path', len(old_path) + 1)),
+                    depth=models.F('depth') + (depth - self.depth),
+                )
+            Category.objects.filter(pk=self.pk).update(path=path, depth=depth)
+            self.path, self.depth = path, depth
+
+        if self.is_deleted:
+            # Soft delete takes the subtree with it, as a hard delete would
+            self.get_descendants().update(is_deleted=True)
+
+    def get_descendants(self, include_self=False):
+        """Active descendants in tree order, resolved with one prefix range scan on the path index."""
+        queryset = Category.objects.filter(path__startswith=self.path, is_deleted=False).order_by('path')
+        if not include_self:
+            queryset = queryset.exclude(pk=self.pk)
+        return queryset
+
+    def is_descendant_of(self, other):
+        return self.pk != other.pk and self.path.startswith(other.path)
 
 
 class Color(models.Model):
@@ -161,11 +203,27 @@ class ProductVariant(SoftDeleteModel):
     color = models.ForeignKey(Color, on_delete=models.PROTECT)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     stock = models.IntegerField()
+    # Units held by open checkout reservations (cart.reservations); sellable stock is stock - reserved
+    reserved = models.PositiveIntegerField(default=0, editable=False)
     image = models.ImageField(upload_to='photos/products')
 
     def __str__(self):
         return f"{self.product.name} - {self.size} - {self.color}"
 
+    @property
+    def available_stock(self):
+        return max(self.stock - self.reserved, 0)
+
+    def save(self, *args, **kwargs):
+        # `reserved` only ever moves through conditional UPDATEs; a full save from a form must
+        # not write back whatever value it happened to read
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'reserved'
+            ]
+        super(ProductVariant, self).save(*args, **kwargs)
+
 class AttributeRequest(models.Model):
     REQUEST_TYPES = (
         ('Category', 'Category'),
@@ -216,4 +274,195 @@ class Complaint(SoftDeleteModel):
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
-        return f"Complaint: {self.subject} by {self.customer.user.email}"
\ No newline at end of file
+        return f"Complaint: {self.subject} by {self.customer.user.email}"
+
+# --- Denormalized Read Models ---
+class ProductListing(models.Model):
+    """
+    Flattened, per-product row used by every storefront listing (shop, home, vendor shop, search).
+    Kept in sync by store.signals, never edited directly. Only active products have a row.
+    """
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='listing')
+    vendor = models.ForeignKey('vendor.Vendor', on_delete=models.CASCADE)
+    category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True)
+    category_name = models.CharField(max_length=100, blank=True)
+    name = models.CharField(max_length=150)
+    slug = models.SlugField(max_length=150, unique=True)
+    gender = models.CharField(max_length=1, choices=Product.GENDER_CHOICES, default='U')
+    is_trending = models.BooleanField(default=False)
+    created_at = models.DateTimeField()
+    min_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    max_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    total_stock = models.IntegerField(default=0)
+    in_stock = models.BooleanField(default=False)
+    # Delimited id sets (",3,7,") so membership is a simple `contains` lookup
+    color_ids = models.CharField(max_length=255, blank=True)
+    size_ids = models.CharField(max_length=255, blank=True)
+    review_count = models.IntegerField(default=0)
+    avg_rating = models.DecimalField(max_digits=3, decimal_places=2, default=0)
+    image_url = models.CharField(max_length=500, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at'], name='listing_created_idx'),
+            models.Index(fields=['min_price'], name='listing_price_idx'),
+            models.Index(fields=['category', '-created_at'], name='listing_category_idx'),
+            models.Index(fields=['vendor', '-created_at'], name='listing_vendor_idx'),
+            models.Index(fields=['is_trending', '-created_at'], name='listing_trending_idx'),
+        ]
+
+    def __str__(self):
+        return f"Listing: {self.name}"
+
+    @property
+    def price(self):
+        # Product cards read `product.price`, the cheapest active variant
+        return self.min_price
+
+    @staticmethod
+    def encode_ids(ids):
+        ids = sorted(set(ids))
+        return f",{','.join(str(i) for i in ids)}," if ids else ''
+
+    @staticmethod
+    def decode_ids(value):
+        return [int(i) for i in value.strip(',').split(',') if i]
+
+
+class SearchDocument(models.Model):
+    """Per-product document length for BM25 normalisation. Maintained by store.search."""
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='search_document')
+    length = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"Search document for product #{self.product_id}"
+
+
+class SearchTerm(models.Model):
+    """Inverted index posting: one row per (term, product) with its field-weighted frequency."""
+    term = models.CharField(max_length=64)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='search_terms')
+    weight = models.FloatField()
+    doc_length = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['term', 'product'], name='unique_search_term_product'),
+        ]
+
+    def __str__(self):
+        return f"{self.term} -> {self.product_id}"
+
+
+class ProductRatingSummary(models.Model):
+    """Star histogram per product, maintained incrementally by add_rating/remove_rating."""
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='rating_summary')
+    count_1 = models.PositiveIntegerField(default=0)
+    count_2 = models.PositiveIntegerField(default=0)
+    count_3 = models.PositiveIntegerField(default=0)
+    count_4 = models.PositiveIntegerField(default=0)
+    count_5 = models.PositiveIntegerField(default=0)
+    review_count = models.PositiveIntegerField(default=0)
+    rating_total = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"Rating summary for product #{self.product_id}"
+
+    @classmethod
+    def from_reviews(cls, product_id):
+        """An unsaved summary computed from the product's active reviews."""
+        summary = cls(product_id=product_id)
+        rows = Review.objects.filter(product_id=product_id, is_deleted=False).values('rating').annotate(count=models.Count('id'))
+        for row in rows:
+            setattr(summary, f"count_{row['rating']}", row['count'])
+            summary.review_count += row['count']
+            summary.rating_total += row['count'] * row['rating']
+        return summary
+
+    @classmethod
+    def _apply(cls, product_id, rating, delta):
+        # Callers change the review first. A product without a summary yet is seeded from its
+        # reviews, which already include that change, so the delta is not applied on top.
+        seed = cls.from_reviews(product_id)
+        defaults = {field.attname: getattr(seed, field.attname) for field in cls._meta.concrete_fields if not field.primary_key}
+        _, created = cls.objects.get_or_create(product_id=product_id, defaults=defaults)
+        if created:
+            return
+        rows = cls.objects.filter(product_id=product_id)
+        if delta < 0:
+            # Never below zero, even if the summary drifted from the reviews
+            rows = rows.filter(**{f'count_{rating}__gt': 0})
+        rows.update(**{
+            f'count_{rating}': models.F(f'count_{rating}') + delta,
+            'review_count': models.F('review_count') + delta,
+            'rating_total': models.F('rating_total') + delta * rating,
+        })
+
+    @classmethod
+    def add_rating(cls, product_id, rating):
+        cls._apply(product_id, rating, 1)
+
+    @classmethod
+    def remove_rating(cls, product_id, rating):
+        cls._apply(product_id, rating, -1)
+
+    @property
+    def average(self):
+        return self.rating_total / self.review_count if self.review_count else 0
+
+    @property
+    def counts(self):
+        return {star: getattr(self, f'count_{star}') for star in range(5, 0, -1)}
+
+
+class CategoryPriceStats(models.Model):
+    """
+    Price statistics over the active variants of one category's active products (category=None
+    holds uncategorized products). Recomputed per category on variant and product writes, so
+    catalog-wide bounds are a fold over a handful of rows rather than a scan of the variant table.
+    """
+    # Fixed-width histogram buckets; the last one is open-ended
+    HISTOGRAM_BUCKET_WIDTH = 500
+    HISTOGRAM_BUCKETS = 40
+
+    category = models.OneToOneField(Category, on_delete=models.CASCADE, null=True, related_name='price_stats')
+    min_price = models.DecimalField(max_digits=10, decimal_places=2, null=True)
+    max_price = models.DecimalField(max_digits=10, decimal_places=2, null=True)
+    variant_count = models.PositiveIntegerField(default=0)
+    # Variant count per bucket, HISTOGRAM_BUCKETS entries
+    histogram = models.JSONField(default=list)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Price stats for {self.category or 'uncategorized products'}"
+
+
+class OutboundEmail(models.Model):
+    """A message waiting for, or done with, the mail worker, see store/mail.py."""
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    )
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=255, blank=True)
+    to = models.JSONField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    claim = models.CharField(max_length=32, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    send_after = models.DateTimeField()
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # The worker's scan: due pending rows, oldest first
+            models.Index(fields=['status', 'send_after'], name='outbound_email_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} to {', '.join(self.to)} ({self.status})"
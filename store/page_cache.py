@@ -0,0 +1,88 @@
+import hashlib
+import time
+from functools import wraps
+
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+
+from cart.guest import GUEST_CART_COOKIE
+
+CATALOG_VERSION_KEY = 'catalog_version'
+PAGE_CACHE_TIMEOUT = 60 * 15
+
+# Rendered in place of the CSRF token while a page is being cached, swapped for a fresh token on every hit
+CSRF_PLACEHOLDER = '__CATALOG_PAGE_CSRF_TOKEN__'
+
+# Query parameters that never change what a catalog page renders
+IGNORED_PARAMS = {'utm_source', 'utm_medium', 'utm_campaign', 'utm_term', 'utm_content', 'fbclid', 'gclid'}
+
+
+def get_catalog_version():
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        # Seeded from the clock so an evicted counter never rewinds onto old cached pages
+        cache.add(CATALOG_VERSION_KEY, int(time.time()), None)
+        version = cache.get(CATALOG_VERSION_KEY)
+    return version
+
+
+def bump_catalog_version():
+    """Invalidates every cached catalog page by moving all keys to a new version. Returns the new version."""
+    try:
+        return cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        return get_catalog_version()
+
+
+def _page_cache_key(request, view_name, kwargs):
+    params = sorted(
+        (key, value)
+        for key, values in request.GET.lists() if key not in IGNORED_PARAMS
+        for value in values if value
+    )
+    raw = f"{view_name}|{sorted(kwargs.items())}|{params}"
+    return f"page:{get_catalog_version()}:{hashlib.md5(raw.encode()).hexdigest()}"
+
+
+def _is_cacheable_request(request):
+    if request.method not in ('GET', 'HEAD') or request.user.is_authenticated:
+        return False
+    # A guest with a bag sees their own mini cart in the menubar
+    if GUEST_CART_COOKIE in request.COOKIES:
+        return False
+    # Pages carrying a flash message are one-offs
+    return not len(get_messages(request))
+
+
+def cache_catalog_page(view_func):
+    """
+    Serves anonymous GETs of a catalog view from the cache, keyed by the normalized query string
+    and the catalog version. Any catalog write bumps the version, so a cached page is never stale.
+    """
+    @wraps(view_func)
+    def wrapper_func(request, *args, **kwargs):
+        if not _is_cacheable_request(request):
+            return view_func(request, *args, **kwargs)
+
+        key = _page_cache_key(request, view_func.__name__, kwargs)
+        cached = cache.get(key)
+        if cached is not None:
+            content, content_type = cached
+            response = HttpResponse(content.replace(CSRF_PLACEHOLDER, get_token(request)), content_type=content_type)
+            response['X-Page-Cache'] = 'hit'
+            return response
+
+        request.caching_catalog_page = True
+        response = view_func(request, *args, **kwargs)
+        if response.status_code == 200 and not response.streaming:
+            content = response.content.decode(response.charset)
+            # A view that rendered stale parts (see store.fragments) opts this response out
+            if not response.cookies and not getattr(request, 'skip_page_cache', False):
+                cache.set(key, (content, response['Content-Type']), PAGE_CACHE_TIMEOUT)
+                response['X-Page-Cache'] = 'miss'
+            if CSRF_PLACEHOLDER in content:
+                response.content = content.replace(CSRF_PLACEHOLDER, get_token(request))
+        return response
+    return wrapper_func
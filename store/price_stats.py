@@ -0,0 +1,113 @@
+import math
+
+from django.core.cache import cache
+from django.db.models import Count, F, Max, Min
+from django.db.models.functions import Floor
+
+from .models import CategoryPriceStats, ProductVariant
+
+PRICE_STATS_CACHE_KEY = 'price_stats'
+
+# Slider fallback when there is nothing to measure
+DEFAULT_SLIDER_MAX = 10000
+
+WIDTH = CategoryPriceStats.HISTOGRAM_BUCKET_WIDTH
+BUCKETS = CategoryPriceStats.HISTOGRAM_BUCKETS
+
+
+def _active_variants():
+    return ProductVariant.objects.filter(is_deleted=False, product__is_deleted=False)
+
+
+def _histogram(variants):
+    histogram = [0] * BUCKETS
+    rows = variants.annotate(bucket=Floor(F('price') / WIDTH)).values('bucket').annotate(n=Count('pk'))
+    for row in rows:
+        histogram[min(int(row['bucket']), BUCKETS - 1)] += row['n']
+    return histogram
+
+
+def refresh_category_price_stats(category_ids):
+    """Recomputes the stats rows of the given categories (None for uncategorized products)."""
+    for category_id in set(category_ids):
+        variants = _active_variants().filter(product__category_id=category_id)
+        stats = variants.aggregate(low=Min('price'), high=Max('price'), count=Count('pk'))
+        if not stats['count']:
+            CategoryPriceStats.objects.filter(category_id=category_id).delete()
+            continue
+        CategoryPriceStats.objects.update_or_create(category_id=category_id, defaults={
+            'min_price': stats['low'],
+            'max_price': stats['high'],
+            'variant_count': stats['count'],
+            'histogram': _histogram(variants),
+        })
+    cache.delete(PRICE_STATS_CACHE_KEY)
+
+
+def rebuild_price_stats():
+    """Rebuilds every stats row from two grouped queries. Returns the number of rows written."""
+    variants = _active_variants()
+    rows = {
+        row['product__category_id']: CategoryPriceStats(
+            category_id=row['product__category_id'],
+            min_price=row['low'], max_price=row['high'], variant_count=row['count'],
+            histogram=[0] * BUCKETS,
+        )
+        for row in variants.values('product__category_id').annotate(low=Min('price'), high=Max('price'), count=Count('pk'))
+    }
+    buckets = variants.annotate(bucket=Floor(F('price') / WIDTH)).values('product__category_id', 'bucket').annotate(n=Count('pk'))
+    for row in buckets:
+        rows[row['product__category_id']].histogram[min(int(row['bucket']), BUCKETS - 1)] += row['n']
+
+    CategoryPriceStats.objects.all().delete()
+    CategoryPriceStats.objects.bulk_create(rows.values())
+    cache.delete(PRICE_STATS_CACHE_KEY)
+    return len(rows)
+
+
+def _load():
+    stats = cache.get(PRICE_STATS_CACHE_KEY)
+    if stats is None:
+        stats = {
+            row.category_id: (row.min_price, row.max_price, row.variant_count, row.histogram)
+            for row in CategoryPriceStats.objects.all()
+        }
+        cache.set(PRICE_STATS_CACHE_KEY, stats, None)
+    return stats
+
+
+def get_price_stats(category_ids=None):
+    """
+    Folds the per-category rows into bounds and a histogram for the given categories
+    (all of them by default). Served from the cache, so a page view costs no query.
+    """
+    rows = _load()
+    if category_ids is not None:
+        category_ids = set(category_ids)
+        rows = {cid: row for cid, row in rows.items() if cid in category_ids}
+
+    lows = [row[0] for row in rows.values()]
+    highs = [row[1] for row in rows.values()]
+    histogram = [sum(counts) for counts in zip(*(row[3] for row in rows.values()))] or [0] * BUCKETS
+    max_price = max(highs) if highs else None
+    return {
+        'min': min(lows) if lows else None,
+        'max': max_price,
+        'count': sum(row[2] for row in rows.values()),
+        'histogram': histogram,
+        # Ceiling to nearest 100 for cleaner UI
+        'slider_max': math.ceil(float(max_price) / 100) * 100 if max_price else DEFAULT_SLIDER_MAX,
+    }
+
+
+def histogram_bars(stats):
+    """Histogram buckets up to the slider's upper bound, each with a bar height in percent."""
+    used = min(BUCKETS, max(1, math.ceil(stats['slider_max'] / WIDTH)))
+    counts = stats['histogram'][:used]
+    # Everything past the slider range belongs to its last bar
+    counts[-1] += sum(stats['histogram'][used:])
+    peak = max(counts) or 1
+    return [
+        {'min': index * WIDTH, 'max': (index + 1) * WIDTH, 'count': count, 'height': round(count * 100 / peak)}
+        for index, count in enumerate(counts)
+    ]
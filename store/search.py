@@ -0,0 +1,163 @@
+import heapq
+import math
+import re
+from collections import Counter, defaultdict
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Avg, Count
+
+from .models import Product, SearchDocument, SearchTerm
+
+# Field weights: a hit in the product name counts more than one buried in the description
+FIELD_WEIGHTS = (
+    ('name', 3.0),
+    ('category', 2.0),
+    ('vendor', 2.0),
+    ('description', 1.0),
+)
+
+STOP_WORDS = {'a', 'an', 'and', 'are', 'for', 'in', 'is', 'of', 'on', 'or', 'the', 'to', 'with'}
+
+# BM25 tuning
+K1 = 1.2
+B = 0.75
+
+STATS_CACHE_KEY = 'search_index_stats'
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+MAX_TERM_LENGTH = 64
+# A shorter last token is matched exactly; expanding "a" would pull in most of the index
+MIN_PREFIX_LENGTH = 3
+# The prefix expands into at most this many terms, the ones in the most documents
+MAX_PREFIX_TERMS = 20
+
+
+def tokenize(text, keep_stop_words=False):
+    """Lowercases and splits text into index terms, dropping stop words unless asked not to."""
+    if not text:
+        return []
+    return [t[:MAX_TERM_LENGTH] for t in TOKEN_RE.findall(text.lower()) if keep_stop_words or t not in STOP_WORDS]
+
+
+def _document_fields(product):
+    return {
+        'name': product.name,
+        'category': product.category.name if product.category else '',
+        'vendor': product.vendor.shopName if product.vendor else '',
+        'description': product.description,
+    }
+
+
+def _build_postings(product):
+    """Returns (document length, [SearchTerm]) for a product."""
+    fields = _document_fields(product)
+    weights = Counter()
+    length = 0
+    for field, field_weight in FIELD_WEIGHTS:
+        tokens = tokenize(fields[field])
+        length += len(tokens)
+        for token in tokens:
+            weights[token] += field_weight
+
+    postings = [
+        SearchTerm(term=term, product_id=product.pk, weight=weight, doc_length=length)
+        for term, weight in weights.items()
+    ]
+    return length, postings
+
+
+def index_product(product_id):
+    """(Re)indexes a single product, or drops it from the index if it is gone or soft-deleted."""
+    product = Product.objects.select_related('category', 'vendor').filter(pk=product_id, is_deleted=False).first()
+
+    with transaction.atomic():
+        SearchTerm.objects.filter(product_id=product_id).delete()
+        if product is None:
+            SearchDocument.objects.filter(product_id=product_id).delete()
+        else:
+            length, postings = _build_postings(product)
+            SearchDocument.objects.update_or_create(product_id=product_id, defaults={'length': length})
+            SearchTerm.objects.bulk_create(postings)
+    cache.delete(STATS_CACHE_KEY)
+
+
+def rebuild_search_index():
+    """Rebuilds the whole inverted index. Returns the number of indexed products."""
+    documents = []
+    postings = []
+    for product in Product.objects.filter(is_deleted=False).select_related('category', 'vendor').iterator(chunk_size=500):
+        length, product_postings = _build_postings(product)
+        documents.append(SearchDocument(product_id=product.pk, length=length))
+        postings.extend(product_postings)
+
+    with transaction.atomic():
+        SearchTerm.objects.all().delete()
+        SearchDocument.objects.all().delete()
+        SearchDocument.objects.bulk_create(documents, batch_size=1000)
+        SearchTerm.objects.bulk_create(postings, batch_size=1000)
+    cache.delete(STATS_CACHE_KEY)
+    return len(documents)
+
+
+def _index_stats():
+    stats = cache.get(STATS_CACHE_KEY)
+    if stats is None:
+        row = SearchDocument.objects.aggregate(count=Count('pk'), avg_length=Avg('length'))
+        stats = (row['count'] or 0, row['avg_length'] or 1.0)
+        cache.set(STATS_CACHE_KEY, stats, 300)
+    return stats
+
+
+def search_product_ids(query, limit=10):
+    """
+    Returns up to `limit` product ids ranked by BM25 for the query.
+    The last query token is matched as a prefix so results follow the user while typing.
+    """
+    # A query of only stop words ("the", "for") falls back to its raw words. Stop words are never
+    # indexed, so these can only match as the prefix of a longer term.
+    tokens = tokenize(query) or tokenize(query, keep_stop_words=True)
+    if not tokens:
+        return []
+
+    exact_terms = set(tokens[:-1])
+    prefix = tokens[-1]
+    if len(prefix) < MIN_PREFIX_LENGTH or prefix in exact_terms:
+        # A repeated token ("air max air") is already typed out in full; expanding it as well
+        # would count its postings twice
+        exact_terms.add(prefix)
+        expansions = set()
+    else:
+        # Pick the expansions by document frequency first, so only their postings are fetched
+        expansions = set(
+            SearchTerm.objects.filter(term__startswith=prefix).values('term')
+            .annotate(df=Count('pk')).order_by('-df', 'term').values_list('term', flat=True)[:MAX_PREFIX_TERMS]
+        )
+    rows = list(
+        SearchTerm.objects.filter(term__in=exact_terms | expansions)
+        .values_list('term', 'product_id', 'weight', 'doc_length')
+    )
+    if not rows:
+        return []
+
+    doc_count, avg_length = _index_stats()
+
+    # Group postings per query token (the prefix token may expand into several terms)
+    per_token = defaultdict(list)
+    for term, product_id, weight, doc_length in rows:
+        if term in exact_terms:
+            per_token[term].append((product_id, weight, doc_length))
+        if term in expansions:
+            per_token[prefix].append((product_id, weight, doc_length))
+
+    scores = defaultdict(float)
+    for token in set(tokens):
+        matches = per_token.get(token, [])
+        df = len({product_id for product_id, _, _ in matches})
+        if not df:
+            continue
+        idf = math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+        for product_id, weight, doc_length in matches:
+            norm = K1 * (1 - B + B * doc_length / avg_length)
+            scores[product_id] += idf * weight * (K1 + 1) / (weight + norm)
+
+    return [product_id for product_id, _ in heapq.nlargest(limit, scores.items(), key=lambda item: item[1])]
@@ -0,0 +1,116 @@
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from vendor.models import Vendor
+from .models import User, Customer, Category, Color, Size, Product, ProductVariant, Review, ProductListing
+from .account_status import invalidate_account_status
+from .listing import refresh_product_listing
+from . import autocomplete
+from .facets import FacetIndex
+from .page_cache import bump_catalog_version
+from .fragments import refresh_fragments
+from .search import index_product
+from .price_stats import refresh_category_price_stats
+
+
+def _schedule_refresh(product_id):
+    # Deferred to commit so cascaded deletes never resurrect a listing row mid-transaction
+    def refresh():
+        listing = refresh_product_listing(product_id)
+        FacetIndex.invalidate()
+        autocomplete.index.update_product(product_id, listing)
+    transaction.on_commit(refresh)
+
+
+def _schedule_reindex(product_ids):
+    def reindex():
+        for product_id in product_ids:
+            index_product(product_id)
+    transaction.on_commit(reindex)
+
+
+def _schedule_price_stats(category_ids=(), product_id=None):
+    def refresh():
+        ids = set(category_ids)
+        if product_id is not None:
+            ids.update(Product.objects.filter(pk=product_id).values_list('category_id', flat=True))
+        refresh_category_price_stats(ids)
+    transaction.on_commit(refresh)
+
+
+@receiver(pre_save, sender=Product)
+def product_about_to_change(sender, instance, **kwargs):
+    # Remember the current category so a move refreshes the price stats of both categories
+    if instance.pk:
+        instance._previous_category_id = Product.objects.filter(pk=instance.pk).values_list('category_id', flat=True).first()
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def product_changed(sender, instance, **kwargs):
+    _schedule_refresh(instance.pk)
+    _schedule_reindex([instance.pk])
+    _schedule_price_stats({instance.category_id, getattr(instance, '_previous_category_id', instance.category_id)})
+
+
+@receiver(post_save, sender=ProductVariant)
+@receiver(post_delete, sender=ProductVariant)
+def variant_changed(sender, instance, **kwargs):
+    _schedule_price_stats(product_id=instance.product_id)
+
+
+@receiver(post_save, sender=ProductVariant)
+@receiver(post_delete, sender=ProductVariant)
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def product_child_changed(sender, instance, **kwargs):
+    _schedule_refresh(instance.product_id)
+
+
+@receiver(post_save, sender=Category)
+def category_changed(sender, instance, **kwargs):
+    ProductListing.objects.filter(category=instance).update(category_name=instance.name)
+    _schedule_reindex(list(Product.objects.filter(category=instance, is_deleted=False).values_list('pk', flat=True)))
+
+
+@receiver(post_save, sender=Vendor)
+def vendor_changed(sender, instance, **kwargs):
+    # Shop names are part of the search document
+    _schedule_reindex(list(Product.objects.filter(vendor=instance, is_deleted=False).values_list('pk', flat=True)))
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=ProductVariant)
+@receiver(post_delete, sender=ProductVariant)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+@receiver(post_save, sender=Vendor)
+# Color and size names are printed on product pages and in the shop filters
+@receiver(post_save, sender=Color)
+@receiver(post_delete, sender=Color)
+@receiver(post_save, sender=Size)
+@receiver(post_delete, sender=Size)
+def catalog_changed(sender, instance, **kwargs):
+    # Bumped after commit so no request can cache a pre-commit render under the new version
+    def bump():
+        version = bump_catalog_version()
+        # Product-level changes were already applied to this process's autocomplete index by
+        # _schedule_refresh; anything else leaves it behind so it rebuilds on the next lookup
+        if sender in (Product, ProductVariant, Review):
+            autocomplete.index.advance_version(version)
+        refresh_fragments()
+    transaction.on_commit(bump)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=Customer)
+@receiver(post_save, sender=Vendor)
+@receiver(post_delete, sender=Customer)
+@receiver(post_delete, sender=Vendor)
+def account_changed(sender, instance, **kwargs):
+    # Role, blocked and deleted flags are cached in sessions; admin edits and deletes land here
+    invalidate_account_status(instance.pk if sender is User else instance.user_id)
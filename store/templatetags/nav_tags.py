@@ -1,57 +1,45 @@
 from django import template
 from django.urls import reverse, NoReverseMatch
 from store.models import Category
-from cart.models import Cart, CartItem
-from django.db.models import Sum
+from cart.summary import get_cart_summary
+from cart.guest import get_guest_cart_summary
+from cart.wishlist import get_wishlist as load_wishlist
 
 
 register = template.Library()
 
 @register.simple_tag
 def get_categories():
-    """Returns all non-deleted categories."""
-    return Category.objects.filter(is_deleted=False)
+    """Returns all non-deleted categories in tree order (parents before their children)."""
+    return Category.objects.filter(is_deleted=False).order_by('path')
 
 @register.simple_tag
 def get_cart_count(request):
     """Returns the total number of items in the user's cart."""
     if not request.user.is_authenticated:
-        return 0
-        
-    try:
-        # Assuming one active cart per customer
-        customer = request.user.customer_profile
-        cart = Cart.objects.filter(customer=customer, is_deleted=False).first()
-        if cart:
-            count = cart.items.filter(is_deleted=False).aggregate(total=Sum('quantity'))['total']
-            return count if count else 0
-    except:
-        pass
-    return 0
+        return get_guest_cart_summary(request)['count']
+    return get_cart_summary(request.user)['count']
 
 @register.simple_tag
 def get_cart_items(request):
-    """Returns the items in the user's cart."""
+    """Returns snapshots of the lines in the user's cart."""
     if not request.user.is_authenticated:
-        return []
-    try:
-        customer = request.user.customer_profile
-        cart = Cart.objects.filter(customer=customer, is_deleted=False).first()
-        if cart:
-            return cart.items.filter(is_deleted=False).select_related('product_variant__product', 'product_variant__color', 'product_variant__size')
-    except:
-        pass
-    return []
+        return get_guest_cart_summary(request)['items']
+    return get_cart_summary(request.user)['items']
 
 @register.simple_tag
 def get_cart_total(request):
     """Returns the total price of items in the cart."""
-    items = get_cart_items(request)
-    total = 0
-    for item in items:
-        total += item.product_variant.price * item.quantity
-    return total
+    if not request.user.is_authenticated:
+        return get_guest_cart_summary(request)['total']
+    return get_cart_summary(request.user)['total']
+
 
+@register.simple_tag
+def get_wishlist(request):
+    """Returns the ids the user has wishlisted, as sorted lists ready for json_script."""
+    membership = load_wishlist(request)
+    return {'variants': sorted(membership['variants']), 'products': sorted(membership['products'])}
 
 @register.simple_tag
 def is_active(request, url_pattern, **kwargs):
@@ -76,12 +64,13 @@ def is_active(request, url_pattern, **kwargs):
 
 @register.simple_tag
 def get_max_price():
-    """Returns the maximum price among all product variants."""
-    from store.models import ProductVariant
-    from django.db.models import Max
-    import math
-    max_price = ProductVariant.objects.aggregate(Max('price'))['price__max']
-    if max_price:
-        # Ceiling to nearest 100 or 1000 for cleaner UI
-        return math.ceil(float(max_price) / 100) * 100
-    return 10000 # Default fallback
+    """Returns the slider's upper bound: the highest active variant price, ceiled to 100."""
+    from store import price_stats
+    return price_stats.get_price_stats()['slider_max']
+
+
+@register.simple_tag
+def get_price_stats(category_ids=None):
+    """Returns precomputed price bounds and histogram for the given categories (all by default)."""
+    from store import price_stats
+    return price_stats.get_price_stats(category_ids)
@@ -1,3 +1,327 @@
-from django.test import TestCase
+import datetime
+import io
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
 
-# Create your tests here.
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+from contextlib import redirect_stdout
+from decimal import Decimal
+
+from django.core import mail as outbox
+from django.core.cache import cache
+from django.db.models import Min, Q
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from firebase_admin import auth
+from google.auth import crypt, jwt
+
+from utils.testing import STATIC_STORAGES, create_variants, create_vendor
+from . import firebase, fragments, mail
+from .facets import PRICE_BUCKETS, FacetIndex, bucket_max_price
+from .listing import rebuild_product_listings
+from .models import Category, Color, OutboundEmail, Product, ProductVariant, Size
+
+
+@override_settings(STORAGES=STATIC_STORAGES)
+class CatalogPageCacheTests(TestCase):
+    """A catalog change must never leave an old render cached under the new catalog version."""
+
+    def setUp(self):
+        cache.clear()
+        # Background rebuilds are run by hand; a thread cannot see the test transaction
+        patcher = mock.patch.object(fragments, '_refresh_in_background')
+        self.refresh_in_background = patcher.start()
+        self.addCleanup(patcher.stop)
+        with self.captureOnCommitCallbacks(execute=True):
+            variant, = create_variants(category=Category.objects.create(name='Running', slug='running'))
+            self.product = variant.product
+            self.product.name = 'Old Runner'
+            self.product.save()
+
+    def test_home_page_is_not_cached_with_stale_fragments(self):
+        response = self.client.get(reverse('home'))
+        self.assertEqual(response['X-Page-Cache'], 'miss')
+        self.assertContains(response, 'Old Runner')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.name = 'New Runner'
+            self.product.save()
+        self.assertTrue(self.refresh_in_background.called)
+
+        # The fragments still hold the old name until their rebuild lands: shown, but not cached
+        response = self.client.get(reverse('home'))
+        self.assertContains(response, 'Old Runner')
+        self.assertNotIn('X-Page-Cache', response)
+
+        # What the background rebuild does
+        for name in fragments.FRAGMENTS:
+            fragments.build_fragment(name)
+
+        response = self.client.get(reverse('home'))
+        self.assertEqual(response['X-Page-Cache'], 'miss')
+        self.assertContains(response, 'New Runner')
+        response = self.client.get(reverse('home'))
+        self.assertEqual(response['X-Page-Cache'], 'hit')
+        self.assertContains(response, 'New Runner')
+        self.assertNotContains(response, 'Old Runner')
+
+
+class FacetIndexTests(TestCase):
+    """Facet bitmaps must select and count the same products as filtering the catalog itself."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.categories = [Category.objects.create(name=name, slug=name.lower()) for name in ('Running', 'Court')]
+        cls.sizes = [Size.objects.create(size_label=label) for label in ('UK 7', 'UK 8')]
+        cls.colors = [Color.objects.create(name=name, hex_code=code) for name, code in (('Blue', '#0000ff'), ('Black', '#000000'))]
+        # Prices on both sides of the bucket edges
+        prices = ['999', '2499.99', '2500', '7000', '25000']
+        for i, price in enumerate(prices):
+            create_variants(
+                category=cls.categories[i % 2], size=cls.sizes[i % 2], color=cls.colors[i // 3], price=Decimal(price),
+            )
+        # A product sold in a second size and colour, and a cheaper variant that was deleted
+        variant, = create_variants(category=cls.categories[0], size=cls.sizes[0], color=cls.colors[0], price=3000)
+        ProductVariant.objects.create(product=variant.product, size=cls.sizes[1], color=cls.colors[1], price=12000, stock=1, image='variant.png')
+        ProductVariant.objects.create(product=variant.product, size=cls.sizes[1], color=cls.colors[1], price=10, stock=1, image='variant.png', is_deleted=True)
+        # Listings follow the catalog on commit, which never comes inside a test
+        rebuild_product_listings()
+
+    def setUp(self):
+        cache.clear()
+        self.index = FacetIndex.load()
+        self.products = Product.objects.filter(is_deleted=False).annotate(
+            low=Min('productvariant__price', filter=Q(productvariant__is_deleted=False)),
+        )
+
+    def product_ids(self, mask):
+        return {pk for pk, pos in self.index.positions.items() if mask >> pos & 1}
+
+    def variant_filter(self, **lookups):
+        return Q(**{f'productvariant__{name}': value for name, value in lookups.items()}, productvariant__is_deleted=False)
+
+    def orm_ids(self, *filters):
+        queryset = self.products
+        for condition in filters:
+            queryset = queryset.filter(condition)
+        return set(queryset.values_list('pk', flat=True))
+
+    def test_masks_match_orm_filters(self):
+        for category in self.categories:
+            with self.subTest(category=category.name):
+                self.assertEqual(self.product_ids(self.index.values_mask('category', [category.id])), self.orm_ids(Q(category=category)))
+        for size in self.sizes:
+            with self.subTest(size=size.size_label):
+                self.assertEqual(self.product_ids(self.index.values_mask('size', [size.id])), self.orm_ids(self.variant_filter(size=size)))
+        for color in self.colors:
+            with self.subTest(color=color.name):
+                self.assertEqual(self.product_ids(self.index.values_mask('color', [color.id])), self.orm_ids(self.variant_filter(color=color)))
+        for low, high in PRICE_BUCKETS:
+            high = bucket_max_price(high)
+            with self.subTest(price=(low, high)):
+                condition = Q(low__gte=low) & (Q(low__lte=high) if high is not None else Q())
+                self.assertEqual(self.product_ids(self.index.price_mask(low, high)), self.orm_ids(condition))
+
+    def test_counts_match_orm_counts(self):
+        blue, black = self.colors
+        filters = {
+            'category': self.index.values_mask('category', [self.categories[0].id]),
+            'color': self.index.values_mask('color', [blue.id]),
+            'price': self.index.price_mask(Decimal('1000'), None),
+        }
+        counts = self.index.counts(filters)
+        category, color, price = Q(category=self.categories[0]), self.variant_filter(color=blue), Q(low__gte=1000)
+
+        # Each facet is counted under every filter but its own
+        for size in self.sizes:
+            self.assertEqual(counts['size'][size.id], len(self.orm_ids(category, color, price, self.variant_filter(size=size))))
+        for option in self.colors:
+            self.assertEqual(counts['color'][option.id], len(self.orm_ids(category, price, self.variant_filter(color=option))))
+        for option in self.categories:
+            self.assertEqual(counts['category'][option.id], len(self.orm_ids(color, price, Q(category=option))))
+        for i, (low, high) in enumerate(PRICE_BUCKETS):
+            bucket = Q(low__gte=low) & (Q(low__lt=high) if high is not None else Q())
+            self.assertEqual(counts['price'].get(i, 0), len(self.orm_ids(category, color, bucket)))
+
+    @override_settings(STORAGES=STATIC_STORAGES)
+    def test_shop_ignores_price_bounds_that_are_not_numbers(self):
+        response = self.client.get(reverse('shop'), {'min_price': 'abc', 'max_price': 'NaN'})
+        self.assertEqual(len(response.context['products']), len(self.orm_ids()))
+        response = self.client.get(reverse('shop'), {'min_price': 'abc', 'max_price': '2500'})
+        self.assertEqual({listing.pk for listing in response.context['products']}, self.orm_ids(Q(low__lte=2500)))
+
+
+class MailQueueTests(TestCase):
+    """Queued mail is sent by the worker, retried on the RETRY_DELAYS schedule, then given up."""
+
+    def test_due_messages_are_sent_once(self):
+        mail.enqueue('Hello', 'Body', ['one@example.com'])
+        mail.enqueue('Hello again', 'Body', ['two@example.com'])
+        self.assertEqual(mail.send_batch(), 2)
+        self.assertEqual(sorted(message.to[0] for message in outbox.outbox), ['one@example.com', 'two@example.com'])
+        self.assertEqual(set(OutboundEmail.objects.values_list('status', flat=True)), {'sent'})
+        self.assertEqual(mail.send_batch(), 0)
+
+    def test_failed_send_is_retried_later(self):
+        email = mail.enqueue('Hello', 'Body', ['one@example.com'])
+        with mock.patch.object(mail.EmailMessage, 'send', side_effect=OSError('mailbox unavailable')):
+            mail.send_batch()
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts, email.last_error), ('pending', 1, 'mailbox unavailable'))
+        # Not due yet
+        self.assertEqual(mail.send_batch(), 0)
+
+        OutboundEmail.objects.update(send_after=email.send_after - mail.RETRY_DELAYS[0])
+        self.assertEqual(mail.send_batch(), 1)
+        email.refresh_from_db()
+        self.assertEqual((email.status, len(outbox.outbox)), ('sent', 1))
+
+    def test_retries_stop_within_a_day(self):
+        email = mail.enqueue('Hello', 'Body', ['one@example.com'])
+        clock = email.send_after
+        connection = mock.Mock(**{'open.side_effect': OSError('relay down')})
+        with mock.patch.object(mail, 'get_connection', return_value=connection), mock.patch.object(mail.timezone, 'now') as now:
+            # Each run happens the moment the message comes due again
+            for delay in mail.RETRY_DELAYS:
+                now.return_value = clock
+                mail.send_batch()
+                email.refresh_from_db()
+                self.assertEqual((email.status, email.send_after), ('pending', clock + delay))
+                clock = email.send_after
+            now.return_value = clock
+            mail.send_batch()
+            email.refresh_from_db()
+            self.assertEqual((email.status, email.attempts), ('failed', mail.MAX_ATTEMPTS))
+            self.assertLess(clock - email.created_at, datetime.timedelta(days=1))
+            # A failed message is never claimed again
+            now.return_value = clock + datetime.timedelta(days=1)
+            self.assertEqual(mail.send_batch(), 0)
+
+    def test_password_reset_queues_mail_without_logging_the_address(self):
+        user = create_vendor().user
+        output = io.StringIO()
+        with redirect_stdout(output):
+            self.client.post(reverse('vendor_forgot_password'), {'email': user.email})
+        self.assertNotIn(user.email, output.getvalue())
+        self.assertEqual(OutboundEmail.objects.get().to, [user.email])
+
+
+class FakeKeyServer(ThreadingHTTPServer):
+    """Serves one signing certificate the way Google's key endpoint does, counting the fetches."""
+
+    def __init__(self, certificates):
+        self.body = json.dumps(certificates).encode()
+        self.fetches = 0
+        super().__init__(('127.0.0.1', 0), FakeKeyHandler)
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_port}/certs'
+
+
+class FakeKeyHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.fetches += 1
+        self.send_response(200)
+        self.send_header('Cache-Control', 'public, max-age=3600')
+        self.send_header('Content-Length', str(len(self.server.body)))
+        self.end_headers()
+        self.wfile.write(self.server.body)
+
+    def log_message(self, *args):
+        pass
+
+
+@override_settings(FIREBASE_PROJECT_ID='footfront-test')
+class FirebaseTokenTests(SimpleTestCase):
+    """verify_id_token against a locally signed token and a fake key server."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, 'footfront-test')])
+        now = datetime.datetime.now(datetime.timezone.utc)
+        certificate = (
+            x509.CertificateBuilder().subject_name(name).issuer_name(name).public_key(key.public_key())
+            .serial_number(1).not_valid_before(now - datetime.timedelta(days=1)).not_valid_after(now + datetime.timedelta(days=1))
+            .sign(key, hashes.SHA256())
+        )
+        cls.server = FakeKeyServer({'key-1': certificate.public_bytes(serialization.Encoding.PEM).decode()})
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        private_pem = key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption())
+        cls.signer = crypt.RSASigner.from_string(private_pem.decode(), 'key-1')
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.server.fetches = 0
+        # A fresh key ring and claims cache per test; the background refresher is not under test
+        for name, value in (('keys', firebase.KeyRing(self.server.url)), ('claims_cache', firebase.ClaimsCache())):
+            patcher = mock.patch.object(firebase, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(firebase.KeyRing, 'start')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def token(self, **claims):
+        now = int(time.time())
+        payload = {
+            'iss': 'https://securetoken.google.com/footfront-test', 'aud': 'footfront-test',
+            'sub': 'firebase-uid', 'iat': now, 'exp': now + 3600, 'auth_time': now, 'email': 'customer@example.com',
+            **claims,
+        }
+        return jwt.encode(self.signer, payload).decode()
+
+    def test_valid_token_is_verified_with_one_key_fetch(self):
+        token = self.token()
+        claims = firebase.verify_id_token(token)
+        self.assertEqual((claims['uid'], claims['email']), ('firebase-uid', 'customer@example.com'))
+        with mock.patch.object(firebase.google_id_token, 'verify_token') as verify_token:
+            self.assertEqual(firebase.verify_id_token(token), claims)
+        verify_token.assert_not_called()
+        # A second token is checked against the keys already in memory
+        firebase.verify_id_token(self.token(sub='other-uid'))
+        self.assertEqual(self.server.fetches, 1)
+
+    def test_rejected_tokens(self):
+        now = int(time.time())
+        cases = [
+            (self.token(iat=now - 7200, exp=now - 3600), auth.ExpiredIdTokenError),
+            (self.token(aud='another-project'), auth.InvalidIdTokenError),
+            (self.token(iss='https://securetoken.google.com/another-project'), auth.InvalidIdTokenError),
+            (self.token(sub=''), auth.InvalidIdTokenError),
+            (self.token()[:-4] + 'AAAA', auth.InvalidIdTokenError),
+        ]
+        for token, error in cases:
+            with self.subTest(error=error.__name__), self.assertRaises(error):
+                firebase.verify_id_token(token)
+        self.assertEqual(firebase.claims_cache.entries, {})
+
+    def test_cached_claims_expire_with_the_token(self):
+        token = self.token()
+        claims = firebase.verify_id_token(token)
+        self.assertEqual(firebase.claims_cache.get(token), claims)
+        with mock.patch.object(firebase.time, 'time', return_value=claims['exp']):
+            self.assertIsNone(firebase.claims_cache.get(token))
+        # The expired entry was dropped, not just skipped
+        self.assertIsNone(firebase.claims_cache.get(token))
+
+    def test_claims_cache_is_bounded(self):
+        cache = firebase.ClaimsCache(max_size=2)
+        tokens = [self.token(sub=f'uid-{i}') for i in range(3)]
+        for token in tokens:
+            cache.put(token, firebase.verify_id_token(token))
+        self.assertIsNone(cache.get(tokens[0]))
+        self.assertIsNotNone(cache.get(tokens[2]))
@@ -36,6 +36,7 @@ urlpatterns = [
     path('profile/change-password/', views.change_password, name='change_password'),
     path('profile/reviews/', views.my_reviews, name='my_reviews'),
     path('api/search/', views.api_search, name='api_search'),
+    path('api/autocomplete/', views.api_autocomplete, name='api_autocomplete'),
     path('api/wishlist/toggle/', views.toggle_wishlist, name='toggle_wishlist'),
     path('reset/<uidb64>/<token>/', auth_views.PasswordResetConfirmView.as_view(template_name='password_reset_confirm.html'), name='password_reset_confirm'),
     path('reset/done/', auth_views.PasswordResetCompleteView.as_view(template_name='password_reset_complete.html'), name='password_reset_complete'),
@@ -6,12 +6,13 @@ from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 import json
 import os
-import firebase_admin
-from firebase_admin import credentials, auth
+from firebase_admin import auth
 import mimetypes
 from django.conf import settings
 from .models import User, Customer, Category, Product, Color, Size
 from .decorators import redirect_special_users
+from .page_cache import cache_catalog_page
+from .firebase import verify_id_token
 from django.db.models import Min, Q
 from django.db import models
 from django.contrib.auth.forms import PasswordResetForm
@@ -20,12 +21,20 @@ from django.db.models.query_utils import Q
 from django.utils.http import urlsafe_base64_encode
 from django.contrib.auth.tokens import default_token_generator
 from django.utils.encoding import force_bytes
-from django.core.mail import send_mail, BadHeaderError
+from . import mail
 from django.http import HttpResponse
 from .forms import ComplaintForm, UserUpdateForm, ShippingAddressForm
-from .models import User, Customer, Category, Product, Color, Size, ShippingAddress, Review, ProductVariant, Complaint
+from .models import User, Customer, Category, Product, Color, Size, ShippingAddress, Review, ProductVariant, Complaint, ProductListing, ProductRatingSummary
 from cart.models import Order
+from cart.guest import merge_guest_cart
 from utils.error_parser import parse_firebase_error
+from .search import search_product_ids
+from .facets import FacetIndex, PRICE_BUCKETS, bucket_max_price
+from .price_stats import get_price_stats, histogram_bars
+from utils.pagination import KeysetPaginator
+from django.db.models.functions import Coalesce
+from decimal import Decimal
+from collections import defaultdict
 
 
 
@@ -78,38 +87,24 @@ def password_reset_request(request, template_name, role_check):
         password_reset_form = PasswordResetForm(request.POST)
         if password_reset_form.is_valid():
             data = password_reset_form.cleaned_data['email']
-            print(f"DEBUG: Attempting password reset for email: {data} with role: {role_check}")
             associated_users = User.objects.filter(Q(email=data) & Q(role=role_check))
             if associated_users.exists():
-                print(f"DEBUG: Found {associated_users.count()} user(s).")
                 for user in associated_users:
-                    print(f"DEBUG: Preparing email for user: {user.email}")
-                    subject = "Password Reset Requested"
-                    email_template_name = "password_reset_email.txt"
                     c = {
                         "email": user.email,
-                        'domain': request.META['HTTP_HOST'],
+                        'domain': request.get_host(),
                         'site_name': 'FootFront',
                         "uid": urlsafe_base64_encode(force_bytes(user.pk)),
                         "user": user,
                         'token': default_token_generator.make_token(user),
                         'protocol': 'http',
                     }
-                    email = render_to_string(email_template_name, c)
-                    try:
-                        print("DEBUG: Calling send_mail...")
-                        send_mail(subject, email, settings.DEFAULT_FROM_EMAIL, [user.email], fail_silently=False)
-                        print("DEBUG: send_mail called successfully")
-                    except BadHeaderError:
-                        print("DEBUG: BadHeaderError")
-                        return HttpResponse('Invalid header found.')
-                    except Exception as e:
-                         print(f"DEBUG: Error sending email: {e}")
-                
+                    # Sent by the mail worker, see store/mail.py
+                    mail.enqueue_template("Password Reset Requested", "password_reset_email.txt", c, [user.email])
+
                 messages.success(request, 'A message with reset instructions has been sent to your inbox.')
                 return redirect(request.path)
             else:
-                 print(f"DEBUG: No user found with email {data} and role {role_check}")
                  messages.error(request, 'This email is not registered as a ' + role_check + '.')
     return render(request, template_name)
 
@@ -122,40 +117,14 @@ def vendor_forgot_password(request):
     return password_reset_request(request, 'vendor_forgot_password.html', 'vendor')
 
 
-def initialize_firebase():
-    try:
-        firebase_admin.get_app()
-    except ValueError:
-        # Check for environment variable first
-        firebase_config_json = os.environ.get('FIREBASE_SERVICE_ACCOUNT')
-        
-        if firebase_config_json:
-            import json
-            cred_dict = json.loads(firebase_config_json)
-            cred = credentials.Certificate(cred_dict)
-        else:
-            # Fallback to file (will fail in production if file missing)
-            cred = credentials.Certificate(settings.FIREBASE_ADMIN_CONFIG)
-            
-        firebase_admin.initialize_app(cred)
-
 # Create your views here.
 @redirect_special_users
 @redirect_special_users
+@cache_catalog_page
 def index(request):
-    categories = Category.objects.filter(is_deleted=False)
-    trending_products = Product.objects.filter(is_deleted=False, is_trending=True).annotate(price=Min('productvariant__price'))[:10]
-    all_products = Product.objects.filter(is_deleted=False).annotate(price=Min('productvariant__price')).order_by('-created_at')[:10]
-    
-    # Homepage Reviews (Top rated, latest 5)
-    featured_reviews = Review.objects.filter(is_deleted=False, rating__gte=4).order_by('-created_at')[:5]
-
-    context = {
-        'categories': categories,
-        'trending_products': trending_products,
-        'all_products': all_products,
-        'featured_reviews': featured_reviews,
-    }
+    # Each section is a separately cached fragment, see store/fragments.py
+    from .fragments import FRAGMENTS, get_fragment
+    context = {name: get_fragment(name, request) for name in FRAGMENTS}
     return render(request, 'index.html', context)
 
 @csrf_exempt
@@ -166,7 +135,6 @@ def login_view(request):
 
     if request.method == 'POST':
         try:
-            initialize_firebase()
             body = json.loads(request.body)
             id_token = body.get('idToken')
             
@@ -174,7 +142,7 @@ def login_view(request):
                 return JsonResponse({'status': 'error', 'message': 'ID token is required.'}, status=400)
 
             # Verify the ID token
-            decoded_token = auth.verify_id_token(id_token)
+            decoded_token = verify_id_token(id_token)
             uid = decoded_token['uid']
             email = decoded_token['email']
 
@@ -200,7 +168,9 @@ def login_view(request):
                             return JsonResponse({'status': 'error', 'message': 'Vendor account deleted.'}, status=403)
                
                login(request, user)
-               return JsonResponse({'status': 'success', 'redirect_url': '/'})
+               response = JsonResponse({'status': 'success', 'redirect_url': '/'})
+               merge_guest_cart(request, response, user)
+               return response
             else:
                  # No user found with this email
                  return JsonResponse({'status': 'error', 'message': 'User not registered.'}, status=404)
@@ -228,7 +198,6 @@ def registration_view(request):
 
     if request.method == 'POST':
         try:
-            initialize_firebase()
             body = json.loads(request.body)
             id_token = body.get('idToken')
             first_name = body.get('firstName')
@@ -242,7 +211,7 @@ def registration_view(request):
             # print(f"DEBUG: Verifying token for registration...") 
             
             try:
-                decoded_token = auth.verify_id_token(id_token)
+                decoded_token = verify_id_token(id_token)
             except Exception as token_error:
                 print(f"DEBUG: Token Verification Failed: {token_error}")
                 raise token_error # Re-raise to be caught below
@@ -268,7 +237,9 @@ def registration_view(request):
                         existing_user.save()
                         
                         login(request, existing_user)
-                        return JsonResponse({'status': 'success', 'redirect_url': '/'})
+                        response = JsonResponse({'status': 'success', 'redirect_url': '/'})
+                        merge_guest_cart(request, response, existing_user)
+                        return response
                     else:
                         return JsonResponse({'status': 'error', 'message': 'A user with this email already exists.'}, status=409)
                 except Customer.DoesNotExist:
@@ -287,7 +258,9 @@ def registration_view(request):
             Customer.objects.create(user=user, phone=phone, firebase_uid=uid)
             login(request, user)
 
-            return JsonResponse({'status': 'success', 'redirect_url': '/'})
+            response = JsonResponse({'status': 'success', 'redirect_url': '/'})
+            merge_guest_cart(request, response, user)
+            return response
 
         except auth.ExpiredIdTokenError:
             return JsonResponse({'status': 'error', 'message': 'Registration session expired. Please try again.'}, status=401)
@@ -488,74 +461,143 @@ def order_detail(request, order_id):
 
 from django.db.models import Min, Q
 
+
+def _parse_price(value):
+    """A price filter bound from the query string, or None when missing or not a finite number."""
+    try:
+        price = Decimal(value)
+    except (TypeError, ArithmeticError):
+        return None
+    return price if price.is_finite() else None
+
+
+@cache_catalog_page
 def shop(request):
-    products = Product.objects.filter(is_deleted=False).select_related('category')
-    categories = Category.objects.filter(is_deleted=False)
+    # Listing rows already carry min price, color/size sets and category name: no joins, no GROUP BY
+    products = ProductListing.objects.all()
+    # Tree order (depth first) straight from the materialized path
+    categories = Category.objects.filter(is_deleted=False).order_by('path')
     colors = Color.objects.all()
     sizes = Size.objects.all()
-    
-    # Annotate with minimum price (assuming product has variants)
-    # We use 'productvariant__price' to access the price field in the related ProductVariant model
-    products = products.annotate(price=Min('productvariant__price'))
+
+    # Facet bitmaps: every filter below also contributes a mask so sidebar counts cost no queries
+    facet_index = FacetIndex.load()
+    facet_filters = {}
 
     # --- Filtering ---
-    # Category
+    # Category (a parent matches its whole subtree)
     category_slug = request.GET.get('category')
     if category_slug:
-        products = products.filter(category__slug=category_slug)
+        selected = next((c for c in categories if c.slug == category_slug), None)
+        category_ids = [c.id for c in categories if selected and c.path.startswith(selected.path)]
+        products = products.filter(category_id__in=category_ids)
+        facet_filters['category'] = facet_index.values_mask('category', category_ids)
+
+    # Slider bounds and density histogram for the category in view, precomputed per category
+    price_stats = get_price_stats(category_ids if category_slug else None)
         
-    # Search
+    # Search (ranked ids from the inverted index)
     query = request.GET.get('q')
+    ranked_ids = []
     if query:
-        products = products.filter(name__icontains=query)
-
-    # Price Range
-    min_price = request.GET.get('min_price')
-    max_price = request.GET.get('max_price')
-    if min_price:
-        products = products.filter(price__gte=min_price)
-    if max_price:
-        products = products.filter(price__lte=max_price)
+        ranked_ids = search_product_ids(query, limit=500)
+        products = products.filter(pk__in=ranked_ids)
+        facet_filters['ids'] = facet_index.ids_mask(ranked_ids)
+
+    # Price Range (a bound that is not a number is ignored)
+    min_price = _parse_price(request.GET.get('min_price'))
+    max_price = _parse_price(request.GET.get('max_price'))
+    if min_price is not None:
+        products = products.filter(min_price__gte=min_price)
+    if max_price is not None:
+        products = products.filter(min_price__lte=max_price)
+    if min_price is not None or max_price is not None:
+        facet_filters['price'] = facet_index.price_mask(min_price, max_price)
 
     # Color
     color_name = request.GET.get('color')
     if color_name:
-        products = products.filter(productvariant__color__name=color_name).distinct()
+        color_id = next((c.id for c in colors if c.name == color_name), 0)
+        products = products.filter(color_ids__contains=f',{color_id},')
+        facet_filters['color'] = facet_index.values_mask('color', [color_id])
 
     # Size
     size_label = request.GET.get('size')
     if size_label:
-        products = products.filter(productvariant__size__size_label=size_label).distinct()
+        size_id = next((s.id for s in sizes if s.size_label == size_label), 0)
+        products = products.filter(size_ids__contains=f',{size_id},')
+        facet_filters['size'] = facet_index.values_mask('size', [size_id])
 
     # Gender
     gender_code = request.GET.get('gender')
     if gender_code:
         products = products.filter(gender=gender_code)
+        facet_filters['gender'] = facet_index.values_mask('gender', [gender_code])
+
+    # --- Facet Counts ---
+    # Options with no matching product are hidden unless they are the active selection
+    facet_counts = facet_index.counts(facet_filters)
+    # A category counts its own products plus those of every descendant
+    subtree_counts = defaultdict(int)
+    for cat in categories:
+        count = facet_counts['category'].get(cat.id, 0)
+        segments = cat.path.split('/')[:-1]
+        for depth in range(1, len(segments) + 1):
+            subtree_counts['/'.join(segments[:depth]) + '/'] += count
+    categories = [c for c in categories if subtree_counts[c.path] or c.slug == category_slug]
+    for cat in categories:
+        cat.facet_count = subtree_counts[cat.path]
+    colors = [c for c in colors if facet_counts['color'].get(c.id) or c.name == color_name]
+    for color in colors:
+        color.facet_count = facet_counts['color'].get(color.id, 0)
+    sizes = [s for s in sizes if facet_counts['size'].get(s.id) or s.size_label == size_label]
+    for size in sizes:
+        size.facet_count = facet_counts['size'].get(size.id, 0)
+    genders = [
+        (code, name, facet_counts['gender'].get(code, 0))
+        for code, name in Product.GENDER_CHOICES
+        if facet_counts['gender'].get(code) or code == gender_code
+    ]
+    # The links filter on max_price, which is inclusive like the slider's, so they stop one paisa
+    # short of the bucket's exclusive upper bound and agree with the counts
+    price_buckets = [
+        {'min': low, 'max': high, 'max_price': bucket_max_price(high), 'count': facet_counts['price'].get(index, 0)}
+        for index, (low, high) in enumerate(PRICE_BUCKETS)
+    ]
 
     # --- Sorting ---
+    # Every ordering ends in pk so it is a total order usable as a keyset
     sort_by = request.GET.get('sort')
-    if sort_by == 'price_asc':
-        products = products.order_by('price')
-    elif sort_by == 'price_desc':
-        products = products.order_by('-price')
+    if sort_by in ('price_asc', 'price_desc'):
+        products = products.annotate(sort_price=Coalesce('min_price', models.Value(Decimal('0')), output_field=models.DecimalField()))
+        ordering = ('sort_price', 'pk') if sort_by == 'price_asc' else ('-sort_price', '-pk')
     elif sort_by == 'newest':
-        products = products.order_by('-created_at')
+        ordering = ('-created_at', '-pk')
+    elif ranked_ids:
+        # Default sort for searches: relevance
+        products = products.annotate(search_rank=models.Case(
+            *[models.When(pk=pk, then=rank) for rank, pk in enumerate(ranked_ids)],
+            output_field=models.IntegerField(),
+        ))
+        ordering = ('search_rank', 'pk')
     else:
         # Default sort
-        products = products.order_by('-created_at')
+        ordering = ('-created_at', '-pk')
 
     # --- Pagination ---
-    from django.core.paginator import Paginator
-    paginator = Paginator(products, 10) # 1 product per page as requested
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Cursor based: deep pages cost the same as page 1 and no COUNT(*) is issued
+    paginator = KeysetPaginator(products, ordering, 10)
+    page_obj = paginator.page(request.GET.get('cursor'))
 
     context = {
         'products': page_obj, # This is now the page object, but template can iterate it same way
         'categories': categories,
         'colors': colors,
         'sizes': sizes,
-        'genders': Product.GENDER_CHOICES,
+        'genders': genders,
+        'price_buckets': price_buckets,
+        'price_stats': price_stats,
+        'price_histogram': histogram_bars(price_stats),
     }
     return render(request, 'shop.html', context)
 
@@ -564,24 +606,29 @@ def api_search(request):
     if not query:
         return JsonResponse({'products': []})
     
-    products = Product.objects.filter(
-        Q(name__icontains=query) | Q(description__icontains=query),
-        is_deleted=False
-    ).select_related('category').annotate(min_price=Min('productvariant__price'))[:5]
+    ranked_ids = search_product_ids(query, limit=5)
+    listings = ProductListing.objects.in_bulk(ranked_ids)
+    products = [listings[pk] for pk in ranked_ids if pk in listings]
     
     results = []
     for product in products:
         results.append({
-            'id': product.id,
+            'id': product.product_id,
             'name': product.name,
             'price': float(product.min_price) if product.min_price else 0,
-            'image': product.product_image.url if product.product_image else '/static/images/placeholder-shoe.png',
-            'category': product.category.name if product.category else 'Sneakers',
+            'image': product.image_url or '/static/images/placeholder-shoe.png',
+            'category': product.category_name or 'Sneakers',
             'url': f"/product/{product.slug}/"
         })
     
     return JsonResponse({'products': results})
 
+def api_autocomplete(request):
+    # Served from the in-process prefix index, no database round trip on a warm index
+    from .autocomplete import suggest
+    query = request.GET.get('q', '').strip()
+    return JsonResponse({'suggestions': suggest(query) if query else []})
+
 from django.contrib.auth.forms import PasswordChangeForm
 from django.contrib.auth import update_session_auth_hash
 
@@ -618,9 +665,10 @@ def my_reviews(request):
         
     return render(request, 'my_reviews.html', {'reviews': reviews})
 
+@cache_catalog_page
 def product_detail(request, slug):
     try:
-        product = Product.objects.annotate(price=Min('productvariant__price')).get(slug=slug, is_deleted=False)
+        product = Product.objects.select_related('rating_summary').annotate(price=Min('productvariant__price')).get(slug=slug, is_deleted=False)
         variants = product.productvariant_set.filter(is_deleted=False)
         
         # Get unique colors and sizes available for this product
@@ -629,17 +677,15 @@ def product_detail(request, slug):
         
         # Reviews
         reviews = Review.objects.filter(product=product, is_deleted=False).order_by('-created_at')
-        avg_rating = reviews.aggregate(models.Avg('rating'))['rating__avg'] or 0
-        review_count = reviews.count()
-        
-        # Rating Breakdown
-        rating_counts = {
-            5: reviews.filter(rating=5).count(),
-            4: reviews.filter(rating=4).count(),
-            3: reviews.filter(rating=3).count(),
-            2: reviews.filter(rating=2).count(),
-            1: reviews.filter(rating=1).count(),
-        }
+
+        # Rating Breakdown (precomputed histogram, see ProductRatingSummary)
+        try:
+            summary = product.rating_summary
+        except ProductRatingSummary.DoesNotExist:
+            summary = ProductRatingSummary(product=product)
+        avg_rating = summary.average
+        review_count = summary.review_count
+        rating_counts = summary.counts
         rating_percentages = {
             star: int((count / review_count) * 100) if review_count > 0 else 0
             for star, count in rating_counts.items()
@@ -681,6 +727,7 @@ def add_review(request, product_id):
                 review.product = product
                 review.customer = customer
                 review.save()
+                ProductRatingSummary.add_rating(product.id, review.rating)
                 
                 # Handle Media
                 files = request.FILES.getlist('media')
@@ -811,24 +858,21 @@ def vendor_shop(request):
     except (Vendor.DoesNotExist, ValueError):
         return redirect('shop')
         
-    products = Product.objects.filter(vendor=vendor, is_deleted=False).select_related('category')
+    products = ProductListing.objects.filter(vendor=vendor)
     
     # Calculate Stats
-    products_count = products.count()
+    stats = products.aggregate(count=models.Count('pk'), reviews=models.Sum('review_count'), rating_total=models.Sum(models.F('avg_rating') * models.F('review_count')))
+    products_count = stats['count']
     # Mock data for now, real orders require complex aggregation
     sold_count = 120 # Placeholder or aggregate OrderItems
-    rating_avg = 4.9 # Placeholder or aggregate Reviews
-    
-    # Filtering/Sorting Logic (Reuse from shop view)
-    from django.db.models import Min
-    products = products.annotate(price=Min('productvariant__price'))
+    rating_avg = round(stats['rating_total'] / stats['reviews'], 1) if stats['reviews'] else 0
     
     # Sort
     sort_by = request.GET.get('sort')
     if sort_by == 'price_asc':
-        products = products.order_by('price')
+        products = products.order_by('min_price')
     elif sort_by == 'price_desc':
-        products = products.order_by('-price')
+        products = products.order_by('-min_price')
     else: # Default: Newest
         products = products.order_by('-created_at')
 
@@ -844,7 +888,7 @@ def vendor_shop(request):
 def toggle_wishlist(request):
     import json
     from django.http import JsonResponse
-    from cart.models import Wishlist
+    from cart.wishlist import toggle_wishlist as toggle
     
     if not request.user.is_authenticated:
         return JsonResponse({'success': False, 'message': 'login_required'})
@@ -856,17 +900,8 @@ def toggle_wishlist(request):
             variant = get_object_or_404(ProductVariant, id=variant_id)
             customer = request.user.customer_profile
             
-            wishlist_item, created = Wishlist.objects.get_or_create(
-                customer=customer,
-                product_variant=variant
-            )
-            
-            if not created:
-                # If it already exists, remove it (toggle)
-                wishlist_item.delete()
-                action = 'removed'
-            else:
-                action = 'added'
+            # A soft-delete toggle, so the row is revived rather than recreated
+            action = toggle(customer, variant.pk)
                 
             return JsonResponse({'success': True, 'action': action})
         except Exception as e:
@@ -3,16 +3,21 @@ from utils import panel_messages
 def panel_messages_processor(request):
     """
     Context processor to add admin_messages and vendor_messages to the context.
-    Reading these will clear them from the session.
+    Both are lazy: the cookie is only read, and the messages cleared, when a panel template
+    uses them, so storefront renders leave them alone.
     """
-    # Only fetch if we are in admin or vendor paths to minimize session writes on other pages?
-    # Actually, the get_messages function clears the messages. 
-    # If we run this on every request, we might clear messages intended for a redirect if we don't display them?
-    # But usually, context processors run when rendering a template.
-    # If a view redirects, it doesn't render a template, so this won't run.
-    # So it is safe to just return them.
-    
     return {
-        'admin_messages': panel_messages.get_admin_messages(request),
-        'vendor_messages': panel_messages.get_vendor_messages(request),
+        'admin_messages': panel_messages.LazyMessages(request, panel_messages.ADMIN),
+        'vendor_messages': panel_messages.LazyMessages(request, panel_messages.VENDOR),
     }
+
+
+def catalog_page_csrf(request):
+    """
+    While a catalog page is rendered for the shared page cache, emit a placeholder instead of
+    this visitor's CSRF token. store.page_cache swaps in a fresh token whenever the page is served.
+    """
+    if getattr(request, 'caching_catalog_page', False):
+        from store.page_cache import CSRF_PLACEHOLDER
+        return {'csrf_token': CSRF_PLACEHOLDER}
+    return {}
@@ -0,0 +1,30 @@
+from django.contrib.sessions import middleware as django_sessions
+
+from utils import panel_messages
+
+
+class PanelMessagesMiddleware:
+    """Persists panel flash messages to their cookie, on responses where they were added or shown."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        store = getattr(request, '_panel_messages', None)
+        if store is not None and store.changed:
+            store.update(response)
+        return response
+
+
+class SessionMiddleware(django_sessions.SessionMiddleware):
+    """
+    Django's SessionMiddleware, except that a session whose contents end up as they were loaded
+    is neither saved nor has its cookie re-sent. Needs a utils.sessions engine.
+    """
+
+    def process_response(self, request, response):
+        session = getattr(request, 'session', None)
+        if session is not None and session.modified and getattr(session, 'is_unchanged', lambda: False)():
+            session.modified = False
+        return super().process_response(request, response)
@@ -0,0 +1,141 @@
+import hashlib
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.core import signing
+from django.core.cache import cache
+from django.db.models import Q
+
+CURSOR_SALT = 'utils.pagination.cursor'
+APPROXIMATE_COUNT_TIMEOUT = 300
+
+
+def _dump_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def approximate_count(queryset, timeout=APPROXIMATE_COUNT_TIMEOUT):
+    """
+    Returns a COUNT(*) for the queryset that may be up to `timeout` seconds stale.
+    Keyed by the compiled SQL so each filter combination is counted at most once per window.
+    """
+    key = 'approx_count:' + hashlib.md5(str(queryset.query).encode()).hexdigest()
+    count = cache.get(key)
+    if count is None:
+        count = queryset.count()
+        cache.set(key, count, timeout)
+    return count
+
+
+class KeysetPage:
+    """A page of results plus opaque cursors to its neighbours. Mirrors the parts of Django's Page templates use."""
+
+    def __init__(self, object_list, next_cursor, previous_cursor, count_func=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self._count_func = count_func
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    @property
+    def count(self):
+        """Approximate total across all pages, or None when the paginator was built without counting."""
+        return self._count_func() if self._count_func else None
+
+
+class KeysetPaginator:
+    """
+    Cursor (seek) pagination: instead of OFFSET, each page continues from the sort key of the
+    last row seen, so page 50 costs the same indexed range scan as page 1 and no COUNT is needed.
+
+    `ordering` must be a total order over non-null values and end in a unique field, e.g.
+    ('-created_at', '-pk') or ('price', 'pk'). Annotated fields may be used.
+    """
+
+    def __init__(self, queryset, ordering, per_page, approximate_count=False):
+        self.queryset = queryset
+        self.ordering = [(field.lstrip('-'), field.startswith('-')) for field in ordering]
+        self.per_page = per_page
+        self.approximate_count = approximate_count
+
+    def _encode(self, row, direction):
+        values = [_dump_value(getattr(row, field)) for field, _ in self.ordering]
+        return signing.dumps({'v': values, 'd': direction, 'o': self._ordering_key()}, salt=CURSOR_SALT, compress=True)
+
+    def _ordering_key(self):
+        return ','.join(('-' if descending else '') + field for field, descending in self.ordering)
+
+    def _decode(self, cursor):
+        if not cursor:
+            return None, 'next'
+        try:
+            data = signing.loads(cursor, salt=CURSOR_SALT)
+            values, direction, ordering = data['v'], data['d'], data['o']
+        except (signing.BadSignature, KeyError, TypeError):
+            return None, 'next'
+        # A cursor minted under another sort is meaningless here: restart from the first page
+        if ordering != self._ordering_key() or len(values) != len(self.ordering) or direction not in ('next', 'prev'):
+            return None, 'next'
+        return values, direction
+
+    def _seek(self, values, forward):
+        # Row-value comparison (a, b) > (x, y) expanded as a > x OR (a = x AND b > y)
+        condition = Q()
+        for index, (field, descending) in enumerate(self.ordering):
+            lookup = 'lt' if descending == forward else 'gt'
+            clause = Q(**{f'{field}__{lookup}': values[index]})
+            for prev_index, (prev_field, _) in enumerate(self.ordering[:index]):
+                clause &= Q(**{prev_field: values[prev_index]})
+            condition |= clause
+        return condition
+
+    def page(self, cursor=None):
+        values, direction = self._decode(cursor)
+        forward = direction == 'next'
+
+        queryset = self.queryset
+        if values is not None:
+            queryset = queryset.filter(self._seek(values, forward))
+        order_by = [
+            ('-' if descending == forward else '') + field
+            for field, descending in self.ordering
+        ]
+        rows = list(queryset.order_by(*order_by)[:self.per_page + 1])
+
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if not forward:
+            rows.reverse()
+
+        # Arriving via a cursor means there is always a page on the side we came from
+        has_next = has_more if forward else values is not None
+        has_previous = values is not None if forward else has_more
+
+        count_func = None
+        if self.approximate_count:
+            count_func = lambda: approximate_count(self.queryset)
+
+        return KeysetPage(
+            rows,
+            next_cursor=self._encode(rows[-1], 'next') if rows and has_next else None,
+            previous_cursor=self._encode(rows[0], 'prev') if rows and has_previous else None,
+            count_func=count_func,
+        )
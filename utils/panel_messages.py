@@ -1,41 +1,122 @@
+"""
+Flash messages for the admin and vendor panels.
+
+Messages are kept in a signed cookie rather than the session, so adding or showing one never
+writes the session row. Reading is lazy: the context processor hands templates an object that
+only decodes the cookie when a panel template actually tests or iterates it, and
+PanelMessagesMiddleware (utils.middleware) rewrites or clears the cookie only on responses
+where messages were added or shown. Storefront renders never touch it.
+"""
 from django.conf import settings
+from django.core import signing
+
+COOKIE_NAME = 'panel_messages'
+COOKIE_SALT = 'utils.panel_messages'
+# Browsers reject cookies past 4096 bytes; older messages are dropped to stay under this
+MAX_COOKIE_SIZE = 2048
+
+ADMIN = 'admin'
+VENDOR = 'vendor'
+
+
+class PanelMessageStore:
+    """One request's view of the cookie. Loaded on first use."""
+
+    def __init__(self, request):
+        self.request = request
+        self._messages = None
+        self.changed = False
+
+    @property
+    def messages(self):
+        if self._messages is None:
+            try:
+                self._messages = signing.loads(self.request.COOKIES.get(COOKIE_NAME, ''), salt=COOKIE_SALT)
+            except signing.BadSignature:
+                self._messages = {}
+        return self._messages
+
+    def add(self, channel, level, message):
+        self.messages.setdefault(channel, []).append([level, str(message)])
+        self.changed = True
+
+    def pop(self, channel):
+        messages = self.messages.pop(channel, [])
+        if messages:
+            self.changed = True
+        return [{'level': level, 'message': message} for level, message in messages]
+
+    def update(self, response):
+        """Writes what is left back to the cookie, or deletes it. Only called when changed."""
+        messages = {channel: queued for channel, queued in self.messages.items() if queued}
+        if not messages:
+            response.delete_cookie(COOKIE_NAME)
+            return
+        value = signing.dumps(messages, salt=COOKIE_SALT, compress=True)
+        while len(value) > MAX_COOKIE_SIZE and any(messages.values()):
+            oldest = max(messages, key=lambda channel: len(messages[channel]))
+            messages[oldest].pop(0)
+            value = signing.dumps(messages, salt=COOKIE_SALT, compress=True)
+        response.set_cookie(
+            COOKIE_NAME, value, httponly=True, samesite='Lax',
+            secure=settings.SESSION_COOKIE_SECURE,
+        )
+
+
+class LazyMessages:
+    """What templates see as admin_messages / vendor_messages. Taking the messages clears them."""
+
+    def __init__(self, request, channel):
+        self.request = request
+        self.channel = channel
+        self._messages = None
+
+    def _load(self):
+        if self._messages is None:
+            self._messages = get_store(self.request).pop(self.channel)
+        return self._messages
+
+    def __iter__(self):
+        return iter(self._load())
+
+    def __len__(self):
+        return len(self._load())
+
+    def __bool__(self):
+        return bool(self._load())
+
+
+def get_store(request):
+    if not hasattr(request, '_panel_messages'):
+        request._panel_messages = PanelMessageStore(request)
+    return request._panel_messages
 
-# Keys for session storage
-ADMIN_MESSAGES_SESSION_KEY = 'admin_messages'
-VENDOR_MESSAGES_SESSION_KEY = 'vendor_messages'
 
-def add_message(request, session_key, level, message):
+def add_message(request, channel, level, message):
     """
-    Add a message to the specified session key.
+    Add a message to the given panel's channel.
     Level can be 'success', 'error', 'warning', 'info'.
     """
-    messages = request.session.get(session_key, [])
-    messages.append({'level': level, 'message': message})
-    request.session[session_key] = messages
-    request.session.modified = True
+    get_store(request).add(channel, level, message)
 
-def get_messages(request, session_key):
+def get_messages(request, channel):
     """
-    Retrieve and clear messages from the specified session key.
+    Retrieve and clear messages from the given panel's channel.
     """
-    messages = request.session.get(session_key, [])
-    if messages:
-        request.session[session_key] = []
-        request.session.modified = True
-    return messages
+    return get_store(request).pop(channel)
 
 # --- Admin Helpers ---
 
 def add_admin_message(request, level, message):
-    add_message(request, ADMIN_MESSAGES_SESSION_KEY, level, message)
+    add_message(request, ADMIN, level, message)
 
 def get_admin_messages(request):
-    return get_messages(request, ADMIN_MESSAGES_SESSION_KEY)
+    return get_messages(request, ADMIN)
 
 # --- Vendor Helpers ---
 
 def add_vendor_message(request, level, message):
-    add_message(request, VENDOR_MESSAGES_SESSION_KEY, level, message)
+    add_message(request, VENDOR, level, message)
 
 def get_vendor_messages(request):
-    return get_messages(request, VENDOR_MESSAGES_SESSION_KEY)
+    return get_messages(request, VENDOR)
@@ -0,0 +1,42 @@
+"""
+Session engines for SESSION_ENGINE, all skipping saves that would not change anything:
+
+- utils.sessions.db: Django's database sessions.
+- utils.sessions.cache_db: served from the cache, written to the database behind it at most
+  once per SESSION_WRITE_BEHIND_SECONDS per session.
+- utils.sessions.signed_cookies: the whole session in a signed cookie; no server state.
+
+Django's SessionMiddleware already folds every change made during a request into one save at
+the response. utils.middleware.SessionMiddleware adds the other half: a session marked modified
+whose contents end up as they were loaded (a flash message added and shown in one request, a
+value set to what it already was) is not saved, and its cookie is not re-sent.
+"""
+
+
+class SkipUnchangedMixin:
+    """Remembers the session as loaded, so is_unchanged() can tell a real change from a touch."""
+
+    _loaded_key = None
+    _loaded_payload = None
+
+    def _payload(self, session):
+        return self.serializer().dumps(session)
+
+    def _get_session(self, no_load=False):
+        loaded = hasattr(self, '_session_cache')
+        session = super()._get_session(no_load=no_load)
+        if not loaded and not no_load:
+            self._loaded_key = self.session_key
+            self._loaded_payload = self._payload(session)
+        return session
+
+    # SessionBase binds the property to its own _get_session
+    _session = property(_get_session)
+
+    def is_unchanged(self):
+        # cycle_key() and flush() keep or empty the data under a new key, so the key must match too
+        return (
+            self._loaded_payload is not None
+            and self.session_key == self._loaded_key
+            and self._payload(self._session) == self._loaded_payload
+        )
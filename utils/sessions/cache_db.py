@@ -0,0 +1,89 @@
+"""
+Cache-first sessions with the database written behind.
+
+Reads come from the cache, as with Django's cached_db engine. A new session is written to the
+database at once, but after that a session reaches the database at most once per
+SESSION_WRITE_BEHIND_SECONDS: later saves in that window only update the cache, and a
+background thread in each process writes the latest copy when the window is over. A session
+evicted from the cache in between falls back to the last copy written, at most one window old.
+"""
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.sessions.backends import cached_db, db
+from django.db import connections
+
+from . import SkipUnchangedMixin
+
+WRITTEN_PREFIX = 'session_written:'
+
+logger = logging.getLogger(__name__)
+
+_pending = set()
+_lock = threading.Lock()
+_flusher = None
+
+
+class SessionStore(SkipUnchangedMixin, cached_db.SessionStore):
+
+    def save(self, must_create=False):
+        if self.session_key is None or must_create:
+            super().save(must_create)
+            self._cache.set(WRITTEN_PREFIX + self.session_key, True, settings.SESSION_WRITE_BEHIND_SECONDS)
+            return
+        # Whichever process wins the add() writes through; the rest of the window is deferred
+        if self._cache.add(WRITTEN_PREFIX + self.session_key, True, settings.SESSION_WRITE_BEHIND_SECONDS):
+            super().save()
+            return
+        self._cache.set(self.cache_key, self._session, self.get_expiry_age())
+        with _lock:
+            _pending.add(self.session_key)
+        _start_flusher()
+
+    def delete(self, session_key=None):
+        with _lock:
+            _pending.discard(session_key or self.session_key)
+        super().delete(session_key)
+
+
+def flush_pending():
+    """Writes every deferred session to the database now. Returns how many were written."""
+    with _lock:
+        keys = list(_pending)
+        _pending.clear()
+    written = 0
+    for key in keys:
+        store = SessionStore(key)
+        data = store._cache.get(store.cache_key)
+        if data is None:
+            continue
+        store._session_cache = data
+        db.SessionStore.save(store)
+        written += 1
+    return written
+
+
+def _flush_forever():
+    while True:
+        time.sleep(settings.SESSION_WRITE_BEHIND_SECONDS)
+        try:
+            flush_pending()
+        except Exception:
+            logger.exception('Session write-behind failed')
+        finally:
+            connections.close_all()
+
+
+def _start_flusher():
+    global _flusher
+    if _flusher is not None:
+        return
+    with _lock:
+        if _flusher is None:
+            _flusher = threading.Thread(target=_flush_forever, name='session-write-behind', daemon=True)
+            _flusher.start()
+            # Deferred writes are not lost on a clean shutdown
+            atexit.register(flush_pending)
@@ -0,0 +1,70 @@
+"""
+Fixtures and helpers shared by the apps' test modules.
+"""
+import itertools
+import threading
+import time
+
+from django.db import OperationalError, connections
+
+from store.models import Color, Customer, Product, ProductVariant, Size, User
+from vendor.models import Vendor
+
+# Pages render {% static %}; the manifest storage would need collectstatic first
+STATIC_STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+_sequence = itertools.count(1)
+
+
+def create_vendor():
+    number = next(_sequence)
+    user = User.objects.create_user(email=f'vendor{number}@example.com', password='pass', role='vendor')
+    return Vendor.objects.create(user=user, shopName=f'Shop {number}', shopAddress='Street', business_phone=str(number))
+
+
+def create_customer():
+    number = next(_sequence)
+    user = User.objects.create_user(email=f'customer{number}@example.com', password='pass', role='user')
+    return Customer.objects.create(user=user, phone=f'9{number:09d}')
+
+
+def create_variants(count=1, vendor=None, category=None, size=None, color=None, price=100, stock=10):
+    """`count` products with one variant each, all sold by one vendor."""
+    vendor = vendor or create_vendor()
+    size = size or Size.objects.get_or_create(size_label='US 9')[0]
+    color = color or Color.objects.get_or_create(name='Red', defaults={'hex_code': '#ff0000'})[0]
+    return [
+        ProductVariant.objects.create(
+            product=Product.objects.create(name=f'Runner {next(_sequence)}', vendor=vendor, category=category),
+            size=size, color=color, price=price, stock=stock, image='variant.png',
+        )
+        for _ in range(count)
+    ]
+
+
+def race(calls):
+    """
+    Runs the callables in threads released at the same moment. SQLite refuses a write while
+    another connection holds the table lock, so a call that hits that is retried, as a client would.
+    """
+    gate = threading.Barrier(len(calls))
+
+    def run(call):
+        try:
+            gate.wait()
+            for _ in range(100):
+                try:
+                    return call()
+                except OperationalError:
+                    time.sleep(0.01)
+        finally:
+            connections.close_all()
+
+    threads = [threading.Thread(target=run, args=(call,)) for call in calls]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
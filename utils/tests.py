@@ -0,0 +1,161 @@
+from unittest import mock
+
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+
+from store.models import ProductVariant
+from .middleware import SessionMiddleware
+from .pagination import KeysetPaginator
+from .sessions import cache_db, db
+from .testing import create_variants
+
+
+@override_settings(SESSION_ENGINE='utils.sessions.db')
+class SkipUnchangedSessionTests(TestCase):
+    """A session marked modified but holding what it was loaded with is not saved."""
+
+    def setUp(self):
+        session = db.SessionStore()
+        session['cart_count'] = 2
+        session.create()
+        self.session_key = session.session_key
+
+    def respond(self, view):
+        request = RequestFactory().get('/')
+        request.COOKIES['sessionid'] = self.session_key
+
+        def handler(request):
+            view(request.session)
+            return HttpResponse()
+
+        with mock.patch.object(db.SessionStore, 'save', autospec=True, side_effect=db.SessionStore.save) as save:
+            response = SessionMiddleware(handler)(request)
+        return response, save.call_count
+
+    def test_is_unchanged(self):
+        session = db.SessionStore(self.session_key)
+        session['cart_count'] = 2
+        self.assertTrue(session.modified)
+        self.assertTrue(session.is_unchanged())
+        session['cart_count'] = 3
+        self.assertFalse(session.is_unchanged())
+
+    def test_cycle_key_is_a_change(self):
+        session = db.SessionStore(self.session_key)
+        self.assertEqual(session['cart_count'], 2)
+        session.cycle_key()
+        self.assertFalse(session.is_unchanged())
+
+    def test_unchanged_session_is_not_saved(self):
+        def touch(session):
+            session['flash'] = 'Saved'
+            del session['flash']
+
+        response, saves = self.respond(touch)
+        self.assertEqual(saves, 0)
+        self.assertNotIn('sessionid', response.cookies)
+
+    def test_changed_session_is_saved(self):
+        def change(session):
+            session['cart_count'] = 3
+
+        response, saves = self.respond(change)
+        self.assertEqual(saves, 1)
+        self.assertIn('sessionid', response.cookies)
+        self.assertEqual(db.SessionStore(self.session_key)['cart_count'], 3)
+
+
+@mock.patch.object(cache_db, '_start_flusher')
+class WriteBehindSessionTests(TestCase):
+    """cache_db writes a session through once per window and defers the rest to flush_pending()."""
+
+    def setUp(self):
+        cache.clear()
+        cache_db._pending.clear()
+
+    def stored(self, session_key):
+        return db.SessionStore().decode(Session.objects.get(session_key=session_key).session_data)
+
+    def test_saves_within_the_window_are_deferred_then_flushed(self, start_flusher):
+        session = cache_db.SessionStore()
+        session['step'] = 1
+        session.save()
+        self.assertEqual(self.stored(session.session_key), {'step': 1})
+
+        session = cache_db.SessionStore(session.session_key)
+        session['step'] = 2
+        session.save()
+        # Served from the cache straight away, but the database still has the first copy
+        self.assertEqual(cache_db.SessionStore(session.session_key)['step'], 2)
+        self.assertEqual(self.stored(session.session_key), {'step': 1})
+        start_flusher.assert_called_once()
+
+        self.assertEqual(cache_db.flush_pending(), 1)
+        self.assertEqual(self.stored(session.session_key), {'step': 2})
+        self.assertEqual(cache_db.flush_pending(), 0)
+
+    def test_deleted_session_is_not_flushed(self, start_flusher):
+        session = cache_db.SessionStore()
+        session['step'] = 1
+        session.save()
+        session['step'] = 2
+        session.save()
+        session.delete()
+        self.assertEqual(cache_db.flush_pending(), 0)
+        self.assertFalse(Session.objects.filter(session_key=session.session_key).exists())
+
+
+class KeysetPaginatorTests(TestCase):
+    """Cursors walk a sort key with ties in both directions, and a bad cursor is just the first page."""
+
+    @classmethod
+    def setUpTestData(cls):
+        # Runs of equal prices, so a page boundary falls inside a tie
+        for price in (100, 100, 100, 200, 200, 300, 300):
+            create_variants(price=price)
+
+    def paginator(self, ordering):
+        return KeysetPaginator(ProductVariant.objects.all(), ordering, per_page=2)
+
+    def walk_forward(self, paginator):
+        pages = [paginator.page()]
+        while pages[-1].has_next():
+            pages.append(paginator.page(pages[-1].next_cursor))
+        return pages
+
+    def test_cursors_walk_ties_both_ways(self):
+        for ordering in (('price', 'pk'), ('-price', '-pk')):
+            with self.subTest(ordering=ordering):
+                paginator = self.paginator(ordering)
+                expected = list(ProductVariant.objects.order_by(*ordering).values_list('pk', flat=True))
+                pages = self.walk_forward(paginator)
+                self.assertEqual([variant.pk for page in pages for variant in page], expected)
+                self.assertEqual([len(page) for page in pages], [2, 2, 2, 1])
+
+                # Back from the last page, page by page, to the first
+                backward = [pages[-1]]
+                while backward[-1].has_previous():
+                    backward.append(paginator.page(backward[-1].previous_cursor))
+                self.assertEqual(
+                    [[variant.pk for variant in page] for page in reversed(backward)],
+                    [[variant.pk for variant in page] for page in pages],
+                )
+                self.assertIsNone(backward[-1].previous_cursor)
+
+    def test_last_page_has_no_next_cursor(self):
+        last = self.walk_forward(self.paginator(('price', 'pk')))[-1]
+        self.assertIsNone(last.next_cursor)
+        self.assertFalse(last.has_next())
+        self.assertTrue(last.has_previous())
+
+    def test_bad_cursor_is_the_first_page(self):
+        paginator = self.paginator(('price', 'pk'))
+        first = [variant.pk for variant in paginator.page()]
+        cursor = paginator.page().next_cursor
+        for bad in (cursor[:-3] + 'abc', 'not-a-cursor', self.paginator(('-price', '-pk')).page().next_cursor):
+            with self.subTest(cursor=bad):
+                page = paginator.page(bad)
+                self.assertEqual([variant.pk for variant in page], first)
+                self.assertFalse(page.has_previous())
@@ -0,0 +1,16 @@
+from django.db import connection
+
+
+def upsert_sql(table, columns, conflict, update_mysql, update_other, returning=None, rows=1):
+    """
+    INSERT ... ON DUPLICATE KEY UPDATE on MySQL, ON CONFLICT ... DO UPDATE elsewhere. The MySQL
+    update refers to the proposed row as `new` (the row alias of MySQL 8.0.19+, which replaces the
+    deprecated VALUES(col)); the other backends call it `excluded`.
+    """
+    quote = connection.ops.quote_name
+    placeholders = ', '.join([f"({', '.join(['%s'] * len(columns))})"] * rows)
+    sql = f"INSERT INTO {quote(table)} ({', '.join(quote(c) for c in columns)}) VALUES {placeholders}"
+    if connection.vendor == 'mysql':
+        return f"{sql} AS new ON DUPLICATE KEY UPDATE {update_mysql}"
+    sql = f"{sql} ON CONFLICT ({', '.join(quote(c) for c in conflict)}) DO UPDATE SET {update_other}"
+    return f"{sql} RETURNING {quote(returning)}" if returning else sql